@@ -1,16 +1,116 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
+from src.batch import BatchDownloader
 from src.downloader import Downloader
+from src.asset_renderer import RENDERERS
+from src.text_extractor import OUTPUT_FORMATS
+from src.browser_handler import LOAD_STRATEGIES
+from src.browser_pool import BrowserPool
+from src.checkpoint import CheckpointStore
+from src.compression import DEFAULT_PROFILE, shared_compression_service, validate_profile
+from src.governor import ConcurrencyGovernor
+from src.metadata_fetcher import create_session
+from src.metrics import registry as METRICS
+from src.network import BLOCKED_DOMAINS, AssetCache, NetworkPolicy
+from src.result_cache import ResultCache
+from src.scheduler import DEFAULT_JOB_PAGES, JobScheduler, QueueFull, estimate_pages
 from src.logger import setup_logger
+import atexit
+import multiprocessing
 import os
 
+# Worker processes of blank page detection and the pipeline (forkserver, see
+# process_pool_context) import this module again; they skip the installs and
+# the governor thread below.
+MAIN_PROCESS = multiprocessing.parent_process() is None
+
 # Install dependencies
-os.system("apt-get update && apt-get install -y libnss3 libnspr4 libatk1.0-0 libatk-bridge2.0-0 libcups2 libdbus-1-3 libdrm2 libxkbcommon0 libxcomposite1 libxdamage1 libxfixes3 libxrandr2 libgbm1 libasound2 ghostscript")
-os.system("pip install playwright")
-os.system("playwright install --with-deps")
+if MAIN_PROCESS:
+    os.system("apt-get update && apt-get install -y libnss3 libnspr4 libatk1.0-0 libatk-bridge2.0-0 libcups2 libdbus-1-3 libdrm2 libxkbcommon0 libxcomposite1 libxdamage1 libxfixes3 libxrandr2 libgbm1 libasound2 ghostscript")
+    os.system("pip install playwright")
+    os.system("playwright install --with-deps")
 
 app = Flask(__name__)
-logger = setup_logger(level="INFO")
+logger = setup_logger(level="INFO", json_format=os.environ.get('LOG_FORMAT') == 'json')
 DOWNLOAD_FOLDER = 'downloads'
+# Per-job Chrome traces requested with 'trace': true.
+TRACE_FOLDER = os.environ.get('TRACE_DIR', os.path.join(DOWNLOAD_FOLDER, '.traces'))
+CLEAN_WORKERS = int(os.environ.get('CLEAN_WORKERS', 1))
+RENDER_CHUNK_SIZE = int(os.environ.get('RENDER_CHUNK_SIZE', 0)) or None
+RENDER_TABS = int(os.environ.get('RENDER_TABS', 1))
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', 500))
+
+# Warm browsers shared by all requests; tune per host through the environment.
+BROWSER_POOL = BrowserPool(
+    logger,
+    size=int(os.environ.get('BROWSER_POOL_SIZE', 2)),
+    max_documents_per_browser=int(os.environ.get('BROWSER_MAX_DOCUMENTS', 25)),
+    max_memory_mb=int(os.environ.get('BROWSER_MAX_MEMORY_MB', 2048))
+)
+atexit.register(BROWSER_POOL.close)
+
+# One keep-alive HTTP session for all metadata requests.
+HTTP_SESSION = create_session(pool_size=BROWSER_POOL.size * 2)
+
+# Ghostscript processes shared by all compressing downloads.
+COMPRESSION = shared_compression_service(logger, workers=int(os.environ.get('GS_WORKERS', 0)) or None)
+
+# Downloads run in the background so a slow document never holds a request thread.
+# Short documents go first, and the pages rendered at once are capped so a
+# burst of long documents cannot exhaust the host; beyond the queue limits
+# requests are turned away with a Retry-After.
+JOB_QUEUE = JobScheduler(
+    logger,
+    workers=int(os.environ.get('DOWNLOAD_WORKERS', 2)),
+    max_workers=int(os.environ.get('MAX_DOWNLOAD_WORKERS', 0)) or None,
+    max_pages_in_flight=int(os.environ.get('MAX_PAGES_IN_FLIGHT', 1500)),
+    max_queued=int(os.environ.get('QUEUE_MAX_JOBS', 50)),
+    max_queued_pages=int(os.environ.get('QUEUE_MAX_PAGES', 20000))
+)
+atexit.register(JOB_QUEUE.shutdown)
+
+# Lowers the concurrent renders and post-processing workers under memory or CPU
+# pressure (pausing new renders and recycling the heaviest browser when memory
+# runs out) and raises them again when the container has room.
+GOVERNOR = ConcurrencyGovernor(
+    logger,
+    JOB_QUEUE,
+    browser_pool=BROWSER_POOL,
+    compression=COMPRESSION,
+    interval=float(os.environ.get('GOVERNOR_INTERVAL', 5)),
+    memory_high=float(os.environ.get('GOVERNOR_MEMORY_HIGH', 0.8)),
+    memory_critical=float(os.environ.get('GOVERNOR_MEMORY_CRITICAL', 0.9))
+).start() if MAIN_PROCESS and os.environ.get('GOVERNOR', '1') != '0' else None
+if GOVERNOR:
+    atexit.register(GOVERNOR.stop)
+
+# Finished PDFs keyed by document id and options; repeated requests skip rendering.
+RESULT_CACHE = ResultCache(
+    os.environ.get('RESULT_CACHE_DIR', os.path.join('.cache', 'results')),
+    logger,
+    max_size_mb=int(os.environ.get('RESULT_CACHE_MAX_MB', 2048)),
+    ttl_seconds=int(os.environ.get('RESULT_CACHE_TTL_HOURS', 168)) * 3600
+)
+
+# Per-document work directories; a retried download resumes from its last finished chunk or stage.
+CHECKPOINTS = CheckpointStore(
+    os.environ.get('CHECKPOINT_DIR', os.path.join(DOWNLOAD_FOLDER, '.checkpoints')),
+    logger,
+    max_age_hours=float(os.environ.get('CHECKPOINT_MAX_AGE_HOURS', 24)),
+    max_size_mb=int(os.environ.get('CHECKPOINT_MAX_MB', 4096))
+)
+
+# Trackers and ads are blocked; the viewer's scripts, styles and fonts are cached across jobs.
+NETWORK = NetworkPolicy(
+    logger,
+    blocked_domains=BLOCKED_DOMAINS + tuple(
+        domain.strip() for domain in os.environ.get('BLOCKED_DOMAINS', '').split(',') if domain.strip()
+    ),
+    asset_cache=AssetCache(
+        os.environ.get('ASSET_CACHE_DIR', os.path.join('.cache', 'assets')),
+        logger,
+        max_size_mb=int(os.environ.get('ASSET_CACHE_MAX_MB', 256))
+    )
+) if os.environ.get('REQUEST_FILTER', '1') != '0' else None
 
 if not os.path.exists(DOWNLOAD_FOLDER):
     os.makedirs(DOWNLOAD_FOLDER)
@@ -20,40 +120,217 @@ def index():
     """Serves the main user interface."""
     return render_template('index.html')
 
+def parse_download_options(data):
+    """
+    Validates the optional download parameters of an API payload.
+
+    Returns:
+        tuple: (options dict, error message or None).
+    """
+    options = {
+        "compress": data.get('compress', False),
+        "clean": data.get('clean', True),
+        "load_strategy": data.get('load_strategy', 'events'),
+        "renderer": data.get('renderer', 'print'),
+        "compress_profile": data.get('compress_profile', DEFAULT_PROFILE),
+        "image_dpi": data.get('image_dpi'),
+        "output_format": data.get('format', 'pdf'),
+    }
+    if options["load_strategy"] not in LOAD_STRATEGIES:
+        return options, f"'load_strategy' must be one of {list(LOAD_STRATEGIES)}."
+    if options["renderer"] not in RENDERERS:
+        return options, f"'renderer' must be one of {list(RENDERERS)}."
+    if options["output_format"] not in OUTPUT_FORMATS:
+        return options, f"'format' must be one of {list(OUTPUT_FORMATS)}."
+    if options["image_dpi"] is not None and (isinstance(options["image_dpi"], bool)
+                                            or not isinstance(options["image_dpi"], int)):
+        return options, "'image_dpi' must be an integer."
+    try:
+        validate_profile(options["compress_profile"], options["image_dpi"])
+    except ValueError as e:
+        return options, str(e)
+    return options, None
+
+def clean_workers():
+    """Processes detecting blank pages, at most the governor's post-processing workers."""
+    return min(CLEAN_WORKERS, GOVERNOR.post_workers) if GOVERNOR else CLEAN_WORKERS
+
+def build_downloader(url_or_id, progress_callback=None, **options):
+    """Creates a Downloader wired to the shared browser pool and result cache."""
+    return Downloader(
+        url_or_id=url_or_id,
+        logger=logger,
+        output_dir=DOWNLOAD_FOLDER,
+        browser_pool=BROWSER_POOL,
+        progress_callback=progress_callback,
+        cache=RESULT_CACHE,
+        session=HTTP_SESSION,
+        checkpoints=CHECKPOINTS,
+        network=NETWORK,
+        clean_workers=clean_workers(),
+        chunk_size=RENDER_CHUNK_SIZE,
+        tabs=RENDER_TABS,
+        **options
+    )
+
+def run_download_job(job, url_or_id, trace=False, **options):
+    """Runs one queued download and returns its result link."""
+    def progress(stage=None, **counters):
+        if counters.get("page_count"):
+            JOB_QUEUE.refine_cost(job, counters["page_count"])
+        job.update(stage, **counters)
+
+    downloader = build_downloader(
+        url_or_id, progress_callback=progress, trace_dir=TRACE_FOLDER if trace else None, **options
+    )
+    file_path = downloader.run()
+    if not file_path or not os.path.exists(file_path):
+        raise RuntimeError("Download failed. Please check the logs.")
+    result = {
+        "download_link": f"/downloads/{os.path.basename(file_path)}",
+        "stages": downloader.stage_stats
+    }
+    if downloader.trace_path:
+        result["trace_file"] = downloader.trace_path
+    return result
+
+def queue_full_response(error):
+    """503 reply for a request the scheduler turned away, telling the client when to retry."""
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
 @app.route('/api/download', methods=['POST'])
 def download_document():
     """
     API endpoint to download a Scribd document.
     Expects a JSON payload with 'url_or_id'.
-    Optional parameters: 'compress' and 'clean'.
+    Optional parameters: 'compress', 'clean', 'load_strategy', 'renderer',
+    'compress_profile' ("screen", "ebook" or "printer"), 'image_dpi' and
+    'format' ("pdf", or "text", "json" or "markdown" for the text layers only).
+    With 'trace': true, a Chrome trace of the job's stages is written and its
+    path returned in the job result.
+    Cached documents are returned at once; anything else is queued and the
+    job id is returned, poll '/api/jobs/<job_id>' for progress. When the
+    queue is full the reply is 503 with a Retry-After header.
     """
     data = request.get_json()
     if not data or 'url_or_id' not in data:
         return jsonify({"error": "Missing 'url_or_id' in request."}), 400
+    options, error = parse_download_options(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    url_or_id = data['url_or_id']
-    compress = data.get('compress', False)
-    clean = data.get('clean', True)
+    cached_path = build_downloader(data['url_or_id'], **options).from_cache()
+    if cached_path:
+        return jsonify({
+            "message": "Download successful!",
+            "download_link": f"/downloads/{os.path.basename(cached_path)}"
+        })
 
     try:
-        downloader = Downloader(
-            url_or_id=url_or_id,
-            compress=compress,
-            clean=clean,
-            logger=logger,
-            output_dir=DOWNLOAD_FOLDER
+        job = JOB_QUEUE.submit(
+            run_download_job,
+            cost=estimate_pages(data['url_or_id']),
+            url_or_id=data['url_or_id'],
+            trace=bool(data.get('trace')),
+            **options
         )
-        file_path = downloader.run()
-        if file_path and os.path.exists(file_path):
-            return jsonify({
-                "message": "Download successful!",
-                "download_link": f"/downloads/{os.path.basename(file_path)}"
-            })
-        else:
-            return jsonify({"error": "Download failed. Please check the logs."}), 500
-    except Exception as e:
-        logger.error(f"An error occurred during download: {e}")
-        return jsonify({"error": str(e)}), 500
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify({
+        "message": "Download queued.",
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+def run_batch_job(job, ids, **options):
+    """Runs one queued batch over the shared pool and returns its summary."""
+    batch = BatchDownloader(
+        logger,
+        output_dir=DOWNLOAD_FOLDER,
+        concurrency=BROWSER_POOL.size,
+        browser_pool=BROWSER_POOL,
+        session=HTTP_SESSION,
+        cache=RESULT_CACHE,
+        checkpoints=CHECKPOINTS,
+        network=NETWORK,
+        progress_callback=job.update,
+        clean_workers=clean_workers(),
+        chunk_size=RENDER_CHUNK_SIZE,
+        tabs=RENDER_TABS,
+        **options
+    )
+    summary = batch.run(ids)
+    for record in summary["documents"]:
+        if record["file"]:
+            record["download_link"] = f"/downloads/{record['file']}"
+    return summary
+
+@app.route('/api/batch', methods=['POST'])
+def download_batch():
+    """
+    Bulk variant of '/api/download'.
+    Expects a JSON payload with 'ids', a list of Scribd URLs or ids, and the
+    same optional parameters. The whole batch runs as one job; poll
+    '/api/jobs/<job_id>' for progress and the per-document summary.
+    """
+    data = request.get_json()
+    ids = data.get('ids') if data else None
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "'ids' must be a non-empty list."}), 400
+    if len(ids) > BATCH_MAX_DOCUMENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_DOCUMENTS} documents per batch."}), 400
+    options, error = parse_download_options(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Fetching the metadata of every document up front would hold the request, so
+    # a batch is costed at the default page count per document. Past the page
+    # budget it runs alone anyway, so it is costed at most at that budget and is
+    # not turned away by the queue's page limit whenever another job waits.
+    cost = min(len(ids) * DEFAULT_JOB_PAGES, JOB_QUEUE.max_pages_in_flight)
+    try:
+        job = JOB_QUEUE.submit(run_batch_job, cost=cost, ids=[str(i) for i in ids], **options)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify({
+        "message": "Batch queued.",
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Reports the status, progress and result link of a queued download."""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/pool')
+def browser_pool_status():
+    """Reports health and utilisation counters of the browser pool."""
+    stats = BROWSER_POOL.stats()
+    stats["jobs"] = JOB_QUEUE.stats()
+    if GOVERNOR:
+        stats["governor"] = GOVERNOR.stats()
+    return jsonify(stats), (200 if stats["healthy"] else 503)
+
+@app.route('/metrics')
+def metrics():
+    """Stage histograms and counters, plus pool and queue gauges, in the Prometheus text format."""
+    pool = BROWSER_POOL.stats()
+    METRICS.set_gauge("sdp_browser_pool_busy", pool["busy"], "Browsers rendering a document.")
+    METRICS.set_gauge("sdp_browser_pool_utilisation", pool["utilisation"], "Share of pool time spent rendering.")
+    METRICS.set_gauge("sdp_browser_pool_launches", pool["launches"], "Browser launches since start.")
+    jobs = JOB_QUEUE.stats()
+    for status, count in jobs["jobs"].items():
+        METRICS.set_gauge("sdp_jobs", count, "Download jobs per status.", status=status)
+    METRICS.set_gauge("sdp_pages_in_flight", jobs["pages_in_flight"], "Pages of the downloads running now.")
+    METRICS.set_gauge("sdp_queued_pages", jobs["queued_pages"], "Pages of the downloads waiting to start.")
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/downloads/<filename>')
 def downloaded_file(filename):
@@ -0,0 +1,94 @@
+"""
+Times the print renderer against the asset renderer on the fixture document
+in scan mode, where every page is one JPEG image, as in scanned documents.
+
+    python benchmarks/bench_asset_render.py --pages 100 --delay 50
+"""
+import argparse
+import functools
+import http.server
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw
+from PyPDF2 import PdfReader
+from bench_page_loading import QuietHandler
+from src.asset_renderer import AssetRenderer
+from src.browser_handler import BrowserHandler
+from src.logger import setup_logger
+
+
+def build_page_image(width=1632, height=2112):
+    """A scan-like page: gray text lines on white, saved as JPEG."""
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(120, height - 120, 36):
+        draw.rectangle([120, y, width - 120 - (y * 7) % 400, y + 14], fill=60)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def serve_fixtures_with_scan(page_image):
+    """Serves benchmarks/fixtures plus /scan.jpg on an ephemeral localhost port."""
+    directory = os.path.join(ROOT, "benchmarks", "fixtures")
+
+    class Handler(QuietHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/scan.jpg":
+                return super().do_GET()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(page_image)))
+            self.end_headers()
+            self.wfile.write(page_image)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_render(handler, url):
+    """Renders the fixture and returns (seconds, pages, MB)."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        output_path = os.path.join(work_dir, "document.pdf")
+        started = time.perf_counter()
+        result = handler.get_pdf_from_url(url, output_path=output_path)
+        elapsed = time.perf_counter() - started
+        if not result:
+            return elapsed, 0, 0.0
+        return elapsed, len(PdfReader(result).pages), os.path.getsize(result) / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100, help="Pages in the fixture document.")
+    parser.add_argument("--delay", type=int, default=50, help="Simulated per-page load latency (ms).")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logger = setup_logger(level="DEBUG" if args.verbose else "WARNING")
+    server = serve_fixtures_with_scan(build_page_image())
+    url = (f"http://127.0.0.1:{server.server_port}/lazy_document.html"
+           f"?pages={args.pages}&delay={args.delay}&scan=/scan.jpg")
+
+    print(f"{'renderer':<10} {'seconds':>9} {'pages':>6} {'MB':>8}")
+    for label, handler in (
+        ("print", BrowserHandler(logger, page_count=args.pages)),
+        ("assets", AssetRenderer(logger, page_count=args.pages)),
+    ):
+        seconds, pages, size_mb = time_render(handler, url)
+        print(f"{label:<10} {seconds:>9.1f} {pages:>6} {size_mb:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compares the legacy per-page blank detector (one PdfWriter + pdfplumber
+round-trip per page) with PDFProcessor.find_blank_pages on a generated
+corpus, and checks that both produce identical results. With --workers,
+the process-pool mode is timed too and checked for page-order correctness.
+
+    python benchmarks/bench_blank_pages.py --pages 1000
+    python benchmarks/bench_blank_pages.py --pages 5000 --skip-legacy --workers 2 4 8
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyPDF2 import PdfReader
+from pdf_corpus import build_pdf, random_kinds, expected_mask
+from src.logger import setup_logger
+from src.pdf_processor import PDFProcessor, available_cpus
+
+
+def legacy_mask(processor, pdf_bytes):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return [processor.is_page_blank(page, i) for i, page in enumerate(reader.pages)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000, help="Pages in the generated document.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the page-kind mix.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the fast detector.")
+    parser.add_argument("--workers", type=int, nargs="*", default=[], help="Process counts to time in parallel mode.")
+    args = parser.parse_args()
+
+    processor = PDFProcessor(setup_logger(level="WARNING"))
+    kinds = random_kinds(args.pages, args.seed)
+    pdf_bytes = build_pdf(kinds)
+    expected = expected_mask(kinds)
+
+    started = time.perf_counter()
+    fast = processor.find_blank_pages(pdf_bytes)
+    fast_seconds = time.perf_counter() - started
+    print(f"find_blank_pages: {fast_seconds:.2f}s ({args.pages / fast_seconds:.0f} pages/s)")
+    if fast != expected:
+        wrong = [i + 1 for i, (a, b) in enumerate(zip(fast, expected)) if a != b]
+        sys.exit(f"find_blank_pages disagrees with the corpus on pages {wrong[:20]}")
+
+    if not args.skip_legacy:
+        started = time.perf_counter()
+        legacy = legacy_mask(processor, pdf_bytes)
+        legacy_seconds = time.perf_counter() - started
+        print(f"legacy:           {legacy_seconds:.2f}s ({args.pages / legacy_seconds:.0f} pages/s)")
+        if legacy != fast:
+            wrong = [i + 1 for i, (a, b) in enumerate(zip(legacy, fast)) if a != b]
+            sys.exit(f"Detectors disagree on pages {wrong[:20]}")
+        print(f"speedup: {legacy_seconds / fast_seconds:.1f}x, results identical")
+
+    if args.workers:
+        print(f"available CPUs:    {available_cpus()} (worker counts above this are capped)")
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+            f.write(pdf_bytes)
+            f.flush()
+            for workers in args.workers:
+                parallel = PDFProcessor(processor.logger, workers=workers)
+                started = time.perf_counter()
+                mask = parallel.find_blank_pages_parallel(f.name, args.pages)
+                seconds = time.perf_counter() - started
+                if mask != fast:
+                    sys.exit(f"Parallel mode with {workers} workers returned pages out of order")
+                print(f"{parallel.effective_workers} workers:{'':<5} {seconds:.2f}s ({fast_seconds / seconds:.1f}x vs single process), order ok")
+
+
+if __name__ == "__main__":
+    main()
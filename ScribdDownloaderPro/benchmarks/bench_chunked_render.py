@@ -0,0 +1,82 @@
+"""
+Compares browser memory of printing the fixture document in one go with
+chunked rendering, for growing document lengths. The peak RSS of all
+browser processes is sampled while each render runs.
+
+    python benchmarks/bench_chunked_render.py --pages 100 400 1000 --chunk-size 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyPDF2 import PdfReader
+from bench_page_loading import serve_fixtures
+from src import sysinfo
+from src.browser_handler import BrowserHandler
+from src.logger import setup_logger
+
+
+class PeakSampler:
+    """Samples the RSS of this process's children (driver and browsers) in the background."""
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        own_pid = os.getpid()
+        while not self._stop.wait(self.interval):
+            total = sum(sysinfo.process_tree_rss(pid) or 0 for pid in sysinfo.child_pids(own_pid))
+            self.peak = max(self.peak, total)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def render(url, pages, chunk_size, logger):
+    """Renders the fixture and returns (peak browser RSS in MB, printed pages)."""
+    handler = BrowserHandler(logger, page_count=pages, chunk_size=chunk_size)
+    with tempfile.TemporaryDirectory() as work_dir:
+        output_path = os.path.join(work_dir, "document.pdf")
+        with PeakSampler() as sampler:
+            result = handler.get_pdf_from_url(url, output_path=output_path)
+        printed = len(PdfReader(result).pages) if result else 0
+    return sampler.peak / (1024 * 1024), printed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 400], help="Document lengths to render.")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Pages per chunk in chunked mode.")
+    parser.add_argument("--delay", type=int, default=20, help="Simulated per-page load latency (ms).")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not sysinfo.is_supported():
+        sys.exit("Memory sampling needs /proc")
+    logger = setup_logger(level="DEBUG" if args.verbose else "WARNING")
+    server = serve_fixtures()
+
+    print(f"{'pages':>6} {'mode':<10} {'peak MB':>10} {'printed':>8}")
+    for pages in args.pages:
+        url = f"http://127.0.0.1:{server.server_port}/lazy_document.html?pages={pages}&delay={args.delay}"
+        for label, chunk_size in (("single", None), (f"chunk={args.chunk_size}", args.chunk_size)):
+            peak_mb, printed = render(url, pages, chunk_size, logger)
+            print(f"{pages:>6} {label:<10} {peak_mb:>10.0f} {printed:>8}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
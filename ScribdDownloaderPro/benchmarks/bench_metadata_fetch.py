@@ -0,0 +1,132 @@
+"""
+Measures metadata fetch latency against a local stand-in for the Scribd
+embed page:
+
+    cold    a new connection per document and no cache (plain requests.get)
+    pooled  the shared keep-alive session, no cache
+    warm    the shared session with the metadata cache already filled
+
+The stand-in speaks plain HTTP, so "pooled" only saves the TCP connect
+here; against Scribd it also saves a TLS handshake per document. Also
+times the old two-regex parse against the one-pass scan on the same HTML.
+
+    python benchmarks/bench_metadata_fetch.py --documents 50 --html-kb 400 --latency 20
+"""
+import argparse
+import http.server
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+from src.logger import setup_logger
+from src.metadata_fetcher import MetadataCache, MetadataFetcher, create_session, parse_metadata
+
+
+def build_embed_html(doc_id, size_kb):
+    """An embed-like page: the metadata sits in a script after `size_kb` of markup."""
+    filler = "<div class='page_filler'>" + "x" * 1000 + "</div>\n"
+    body = filler * max(1, size_kb)
+    script = f'<script>window.doc = {{"id": {doc_id}, "title": "Document {doc_id}", "page_count": 42}};</script>'
+    return f"<html><body>{body}{script}{filler}</body></html>".encode("utf-8")
+
+
+def serve_embeds(html_kb, latency_ms):
+    """Serves /embeds/<id>/content on an ephemeral localhost port, with keep-alive."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 3 or parts[0] != "embeds":
+                self.send_error(404)
+                return
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            payload = build_embed_html(parts[1], html_kb)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ColdSession:
+    """The old behaviour: module-level requests.get, one connection per call."""
+    def get(self, *args, **kwargs):
+        return requests.get(*args, **kwargs)
+
+
+def time_fetches(doc_ids, logger, base_url, session, cache):
+    """Returns per-document fetch latencies in ms."""
+    latencies = []
+    for doc_id in doc_ids:
+        fetcher = MetadataFetcher(doc_id, logger, session=session, cache=cache, base_url=base_url)
+        started = time.perf_counter()
+        metadata = fetcher.fetch()
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert metadata.get("page_count") == "42", metadata
+    return latencies
+
+
+def two_regex_parse(content):
+    title = re.search(r'"title"\s*:\s*"(.*?)"', content)
+    page_count = re.search(r'"page_count"\s*:\s*(\d+)', content)
+    return title.group(1) if title else None, page_count.group(1) if page_count else None
+
+
+def time_parse(func, content, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50, help="Documents fetched per mode.")
+    parser.add_argument("--html-kb", type=int, default=400, help="Size of the stand-in embed page.")
+    parser.add_argument("--latency", type=int, default=20, help="Simulated server latency (ms).")
+    args = parser.parse_args()
+
+    logger = setup_logger(level="ERROR")
+    server = serve_embeds(args.html_kb, args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    doc_ids = [str(100000 + i) for i in range(args.documents)]
+
+    session = create_session()
+    warm_cache = MetadataCache()
+    time_fetches(doc_ids, logger, base_url, session, warm_cache)
+
+    results = {
+        "cold": time_fetches(doc_ids, logger, base_url, ColdSession(), False),
+        "pooled": time_fetches(doc_ids, logger, base_url, session, False),
+        "warm": time_fetches(doc_ids, logger, base_url, session, warm_cache),
+    }
+    server.shutdown()
+
+    print(f"{args.documents} documents, {args.html_kb} KB pages, {args.latency} ms server latency")
+    print(f"{'mode':<8} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+    for mode, latencies in results.items():
+        print(f"{mode:<8} {statistics.mean(latencies):>9.2f} {statistics.median(latencies):>9.2f} {max(latencies):>9.2f}")
+
+    content = build_embed_html(1, args.html_kb).decode("utf-8")
+    print(f"parse: two regexes {time_parse(two_regex_parse, content, 20):.2f} ms, "
+          f"one pass {time_parse(lambda c: parse_metadata(c, logger), content, 20):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
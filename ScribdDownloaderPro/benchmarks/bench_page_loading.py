@@ -0,0 +1,112 @@
+"""
+Compares the legacy sleep-based page loader with the event-driven loader on
+a local fixture document. With --tabs, the full render (load and print)
+is also timed in one tab against several tabs.
+
+    python benchmarks/bench_page_loading.py --pages 20 --delay 250
+    python benchmarks/bench_page_loading.py --pages 400 --delay 100 --strategies events --tabs 4
+"""
+import argparse
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from playwright.sync_api import sync_playwright
+from PyPDF2 import PdfReader
+from src.browser_handler import BrowserHandler, BROWSER_LAUNCH_ARGS, LOAD_STRATEGIES
+from src.logger import setup_logger
+from src.page_scripts import PAGE_TRACKER_JS
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures():
+    """Serves benchmarks/fixtures on an ephemeral localhost port."""
+    directory = os.path.join(ROOT, "benchmarks", "fixtures")
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_loader(browser, url, strategy, page_count, logger):
+    """Loads the fixture with one strategy and returns (seconds, rendered pages)."""
+    handler = BrowserHandler(logger, page_count=page_count, load_strategy=strategy)
+    context = browser.new_context(viewport={"width": 1280, "height": 720})
+    page = context.new_page()
+    try:
+        page.goto(url, wait_until="networkidle")
+        page.wait_for_selector("[class*='page']")
+        started = time.perf_counter()
+        handler._load_all_pages_completely(page)
+        elapsed = time.perf_counter() - started
+        page.evaluate(PAGE_TRACKER_JS)
+        rendered = page.evaluate("() => window.__sdpTracker.snapshot().rendered")
+        return elapsed, rendered
+    finally:
+        context.close()
+
+
+def time_full_render(url, tabs, page_count, logger):
+    """Loads and prints the fixture with `tabs` tabs and returns (seconds, printed pages)."""
+    handler = BrowserHandler(logger, page_count=page_count, tabs=tabs)
+    with tempfile.TemporaryDirectory() as work_dir:
+        started = time.perf_counter()
+        result = handler.get_pdf_from_url(url, output_path=os.path.join(work_dir, "document.pdf"))
+        elapsed = time.perf_counter() - started
+        return elapsed, len(PdfReader(result).pages) if result else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the fixture document.")
+    parser.add_argument("--delay", type=int, default=250, help="Simulated per-page load latency (ms).")
+    parser.add_argument("--strategies", nargs="+", choices=LOAD_STRATEGIES, default=list(LOAD_STRATEGIES))
+    parser.add_argument("--tabs", type=int, default=0, help="Also time a full render in this many tabs.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logger = setup_logger(level="DEBUG" if args.verbose else "WARNING")
+    server = serve_fixtures()
+    url = f"http://127.0.0.1:{server.server_port}/lazy_document.html?pages={args.pages}&delay={args.delay}"
+
+    results = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        try:
+            for strategy in args.strategies:
+                results[strategy] = time_loader(browser, url, strategy, args.pages, logger)
+        finally:
+            browser.close()
+    renders = {}
+    if args.tabs > 1:
+        for tabs in (1, args.tabs):
+            renders[tabs] = time_full_render(url, tabs, args.pages, logger)
+    server.shutdown()
+
+    print(f"{'strategy':<10} {'seconds':>10} {'rendered':>10}")
+    for strategy, (elapsed, rendered) in results.items():
+        print(f"{strategy:<10} {elapsed:>10.2f} {rendered:>7}/{args.pages}")
+    if "scroll" in results and "events" in results and results["events"][0] > 0:
+        print(f"speedup: {results['scroll'][0] / results['events'][0]:.1f}x")
+
+    if renders:
+        print(f"\n{'tabs':<10} {'seconds':>10} {'printed':>10}")
+        for tabs, (elapsed, printed) in renders.items():
+            print(f"{tabs:<10} {elapsed:>10.2f} {printed:>7}/{args.pages}")
+        print(f"speedup: {renders[1][0] / renders[args.tabs][0]:.1f}x with {args.tabs} tabs")
+
+
+if __name__ == "__main__":
+    main()
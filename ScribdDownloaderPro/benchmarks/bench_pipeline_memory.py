@@ -0,0 +1,96 @@
+"""
+Measures peak memory of the post-processing pipeline (clean, compress, save)
+when the document is passed around as bytes versus as files, on a generated
+scan-like document. Each mode runs in a fresh process so their peaks do not
+mix.
+
+    python benchmarks/bench_pipeline_memory.py --pages 400 --image-kb 256
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("bytes", "file")
+
+
+def run_bytes_pipeline(processor, compression, source, work_dir):
+    """
+    The previous pipeline: the rendered PDF is one bytes object from start to
+    finish, written out only for the compression service.
+    """
+    with open(source, "rb") as f:
+        pdf_bytes = f.read()
+    pdf_bytes = processor.remove_blank_pages(pdf_bytes)
+    cleaned = os.path.join(work_dir, "cleaned.pdf")
+    processor.save_pdf(pdf_bytes, cleaned)
+    current, _ = compression.compress_file(cleaned, os.path.join(work_dir, "compressed.pdf"))
+    with open(current, "rb") as f:
+        pdf_bytes = f.read()
+    processor.save_pdf(pdf_bytes, os.path.join(work_dir, "output.pdf"))
+
+
+def run_file_pipeline(processor, compression, source, work_dir):
+    """The file-backed pipeline used by Downloader."""
+    current = processor.remove_blank_pages_file(source, os.path.join(work_dir, "cleaned.pdf"))
+    current, _ = compression.compress_file(current, os.path.join(work_dir, "compressed.pdf"))
+    os.replace(current, os.path.join(work_dir, "output.pdf"))
+
+
+def child(mode, source):
+    from src import sysinfo
+    from src.compression import CompressionService
+    from src.logger import setup_logger
+    from src.pdf_processor import PDFProcessor
+
+    logger = setup_logger(level="ERROR")
+    processor = PDFProcessor(logger)
+    compression = CompressionService(logger)
+    baseline = sysinfo.peak_rss()
+    work_dir = tempfile.mkdtemp()
+    try:
+        pipeline = run_bytes_pipeline if mode == "bytes" else run_file_pipeline
+        pipeline(processor, compression, source, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print((sysinfo.peak_rss() - baseline) / (1024 * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400, help="Pages in the generated document.")
+    parser.add_argument("--image-kb", type=int, default=256, help="Uncompressed image size per page.")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    from pdf_corpus import build_scanned_pdf
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(build_scanned_pdf(args.pages, args.image_kb))
+        f.flush()
+        size_mb = os.path.getsize(f.name) / (1024 * 1024)
+        print(f"document: {args.pages} pages, {size_mb:.0f} MB")
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, f.name],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = float(output.strip().splitlines()[-1])
+            print(f"{mode:<6} peak RSS above baseline: {results[mode]:8.1f} MB ({results[mode] / size_mb:.1f}x document size)")
+    if results["file"] > 0:
+        print(f"reduction: {results['bytes'] / results['file']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark suite: runs every stage of the download workflow, separately and
+end to end, against the local stand-in server (standin_server.py) and
+compares the results with a saved baseline.
+
+    metadata  MetadataFetcher on the stand-in embed page
+    render    BrowserHandler.get_pdf_from_url on the stand-in document
+    clean     PDFProcessor.remove_blank_pages_file on a generated scan-like PDF
+    compress  CompressionService.compress_file on the same PDF
+    full      Downloader.run with clean and compress
+
+Every scenario runs in a fresh process so peak memory readings do not mix.
+Peak memory covers the process and its children (Chromium, Ghostscript);
+the stand-in server runs in the parent and is not counted.
+
+    python benchmarks/bench_suite.py --pages 10,100 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --pages 10,100 --baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --pages 1000,5000 --scenarios clean compress --image-kb 16
+
+With --baseline, the exit status is 1 when a scenario got slower or used
+more memory than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_corpus import build_scanned_pdf
+from standin_server import document_id, serve_standin
+from src import sysinfo
+from src.browser_handler import BrowserHandler
+from src.compression import CompressionService
+from src.downloader import Downloader
+from src.logger import setup_logger
+from src.metadata_fetcher import MetadataFetcher, embed_url_for
+from src.pdf_processor import PDFProcessor, count_pdf_pages
+
+SCENARIOS = ("metadata", "render", "clean", "compress", "full")
+
+# Scenarios that read the generated PDF instead of the stand-in server.
+FILE_SCENARIOS = ("clean", "compress")
+
+# Metrics compared with the baseline; higher is worse for both.
+COMPARED = ("seconds", "peak_mb")
+
+
+class PeakSampler:
+    """Samples the resident memory of this process and its children in a thread."""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, sysinfo.process_tree_rss(os.getpid()) or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_scenario(scenario, pages, base_url, input_path, work_dir):
+    """Runs one scenario and returns the number of pages it produced or processed."""
+    logger = setup_logger(level="ERROR")
+    doc_id = str(document_id(pages))
+    if scenario == "metadata":
+        return int(MetadataFetcher(doc_id, logger, base_url=base_url).fetch().get("page_count") or 0)
+    if scenario == "render":
+        result = BrowserHandler(logger, page_count=pages).get_pdf_from_url(
+            embed_url_for(doc_id, base_url), output_path=os.path.join(work_dir, "rendered.pdf")
+        )
+        return count_pdf_pages(result) if result else 0
+    if scenario == "clean":
+        PDFProcessor(logger).remove_blank_pages_file(input_path, os.path.join(work_dir, "cleaned.pdf"))
+        return count_pdf_pages(input_path)
+    if scenario == "compress":
+        CompressionService(logger).compress_file(input_path, os.path.join(work_dir, "compressed.pdf"))
+        return count_pdf_pages(input_path)
+    result = Downloader(doc_id, compress=True, clean=True, logger=logger, output_dir=work_dir, base_url=base_url).run()
+    return pages if result else 0
+
+
+def child(scenario, pages, base_url, input_path):
+    work_dir = tempfile.mkdtemp()
+    try:
+        with PeakSampler() as sampler:
+            started = time.perf_counter()
+            processed = run_scenario(scenario, pages, base_url, input_path, work_dir)
+            seconds = time.perf_counter() - started
+        peak = max(sampler.peak, sysinfo.peak_rss() or 0)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(json.dumps({
+        "seconds": round(seconds, 3),
+        "peak_mb": round(peak / (1024 * 1024), 1),
+        "pages": processed,
+        "pages_per_sec": round(processed / seconds, 1) if seconds else 0.0,
+    }))
+
+
+def run_child(scenario, pages, base_url, input_path):
+    """Runs one scenario in a fresh process and returns its result, or None if it failed."""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario, str(pages), base_url, input_path or ""],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        errors = [line for line in lines if "Error" in line]
+        error = (errors or lines or ["unknown error"])[-1]
+        print(f"  {scenario}/{pages} failed: {error}")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Prints every result next to its baseline and returns the regressed keys."""
+    regressions = []
+    print(f"{'scenario':<16}{'seconds':>10}{'peak MB':>10}{'pages/s':>10}   vs baseline")
+    for key, result in results.items():
+        reference = baseline.get(key)
+        notes = []
+        for metric in COMPARED:
+            if not reference or not reference.get(metric):
+                continue
+            change = result[metric] / reference[metric] - 1
+            notes.append(f"{metric} {change:+.0%}")
+            if change > tolerance:
+                regressions.append(key)
+        print(f"{key:<16}{result['seconds']:>10.2f}{result['peak_mb']:>10.1f}{result['pages_per_sec']:>10.1f}   "
+              + (", ".join(notes) if notes else "-"))
+    return sorted(set(regressions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--pages", default="10,100", help="Comma-separated page counts, e.g. 10,100,1000,5000.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--delay", type=int, default=20, help="Simulated per-page load latency (ms).")
+    parser.add_argument("--image-kb", type=int, default=32, help="Uncompressed image size per page of the generated PDF.")
+    parser.add_argument("--baseline", help="Compare with the results saved in this file.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save the results as a baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown or memory growth over the baseline (0.2 = 20%%).")
+    parser.add_argument("--child", nargs=4, metavar=("SCENARIO", "PAGES", "BASE_URL", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        scenario, pages, base_url, input_path = args.child
+        child(scenario, int(pages), base_url, input_path or None)
+        return
+
+    server = serve_standin(delay_ms=args.delay)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    results = {}
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for pages in (int(count) for count in args.pages.split(",")):
+            input_path = None
+            if set(args.scenarios) & set(FILE_SCENARIOS):
+                input_path = os.path.join(corpus_dir, f"scan-{pages}.pdf")
+                with open(input_path, "wb") as f:
+                    f.write(build_scanned_pdf(pages, args.image_kb))
+            for scenario in args.scenarios:
+                print(f"running {scenario} on {pages} pages...")
+                result = run_child(scenario, pages, base_url, input_path if scenario in FILE_SCENARIOS else None)
+                if result:
+                    results[f"{scenario}/{pages}"] = result
+    server.shutdown()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "delay_ms": args.delay,
+                       "image_kb": args.image_kb, "results": results}, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if regressions:
+        print(f"regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
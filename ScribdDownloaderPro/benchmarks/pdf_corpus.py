@@ -0,0 +1,134 @@
+"""
+Generates synthetic PDFs that mix blank, text-only, image-only and
+vector-only pages, for benchmarking blank-page detection.
+"""
+import random
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+# Content stream of each page kind. Pages marked blank are blank for the
+# legacy pdfplumber-based detector too (white background rectangles and
+# whitespace-only text are not content).
+PAGE_KINDS = {
+    "empty": ("", True),
+    "white_background": ("1 1 1 rg 0 0 595 842 re f", True),
+    "whitespace_text": ("BT /F1 12 Tf 72 720 Td (   ) Tj ET", True),
+    "text": ("BT /F1 12 Tf 72 720 Td (Synthetic page {index}) Tj ET", False),
+    "text_on_background": ("1 1 1 rg 0 0 595 842 re f 0 g BT /F1 12 Tf 72 720 Td [(Page) -250 ({index})] TJ ET", False),
+    "image": ("q 200 0 0 100 72 600 cm /Im1 Do Q", False),
+    "form_image": ("q /Fm1 Do Q", False),
+    "line": ("0 g 2 w 72 400 m 500 400 l S", False),
+    "curve": ("0 g 72 300 m 100 350 200 350 250 300 c S", False),
+    "rotated_rect": ("q 0.7071 0.7071 -0.7071 0.7071 300 300 cm 0 0 100 100 re f Q", False),
+}
+
+
+def _serialize(objects, catalog):
+    """Writes numbered objects (1-based) and the xref table of a PDF."""
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def build_pdf(kinds):
+    """
+    Builds a PDF with one page per entry of `kinds`.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pixels = bytes([40, 120, 200]) * 64
+    image = add(
+        b"<< /Type /XObject /Subtype /Image /Width 8 /Height 8 /ColorSpace /DeviceRGB "
+        b"/BitsPerComponent 8 /Length %d >>\nstream\n" % len(pixels) + pixels + b"\nendstream"
+    )
+    form_stream = b"q 120 0 0 60 72 500 cm /Im1 Do Q"
+    form = add(
+        b"<< /Type /XObject /Subtype /Form /BBox [0 0 595 842] "
+        b"/Resources << /XObject << /Im1 %d 0 R >> >> /Length %d >>\nstream\n" % (image, len(form_stream))
+        + form_stream + b"\nendstream"
+    )
+    resources = b"<< /Font << /F1 %d 0 R >> /XObject << /Im1 %d 0 R /Fm1 %d 0 R >> >>" % (font, image, form)
+
+    pages_id = len(objects) + 2 * len(kinds) + 1
+    page_ids = []
+    for index, kind in enumerate(kinds):
+        stream = PAGE_KINDS[kind][0].format(index=index + 1).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, resources, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    return _serialize(objects, catalog)
+
+
+def random_kinds(page_count, seed=0):
+    """Returns a reproducible mix of page kinds."""
+    rng = random.Random(seed)
+    names = sorted(PAGE_KINDS)
+    return [rng.choice(names) for _ in range(page_count)]
+
+
+def expected_mask(kinds):
+    """Returns the blank/not-blank mask the detector should produce."""
+    return [PAGE_KINDS[kind][1] for kind in kinds]
+
+
+def build_scanned_pdf(page_count, image_kb=256, blank_every=5):
+    """
+    Builds a scan-like PDF: every page draws its own uncompressed image of
+    `image_kb` KiB, except every `blank_every`-th page which is empty. Used to
+    measure memory use on documents whose size is dominated by page images.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    side = int((image_kb * 1024 // 3) ** 0.5)
+    pixels = bytes([180, 180, 180]) * (side * side)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    pages_id = 3 * page_count + 1
+    page_ids = []
+    for index in range(page_count):
+        if blank_every and index % blank_every == blank_every - 1:
+            stream, resources = b"", b"<< >>"
+        else:
+            image = add(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, len(pixels)) + pixels + b"\nendstream"
+            )
+            stream = b"q 595 0 0 842 0 0 cm /Im1 Do Q"
+            resources = b"<< /XObject << /Im1 %d 0 R >> >>" % image
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, resources, content)
+        ))
+    while len(objects) < pages_id - 1:
+        add(b"null")
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    return _serialize(objects, catalog)
@@ -0,0 +1,155 @@
+"""
+A local stand-in for the Scribd embed endpoint, so the whole download
+workflow can be benchmarked without touching scribd.com.
+
+    GET /embeds/<id>/content   the lazy fixture viewer (fixtures/lazy_document.html)
+                               with the metadata JSON MetadataFetcher parses
+    GET /assets/page.png       the picture on every text page
+    GET /assets/scan.jpg       the page image of scanned documents
+
+The document shape is encoded in its id (see document_id), so Downloader
+can be pointed at the server with `base_url` and nothing else:
+
+    1_000_000 + pages   text pages with a text layer and a picture
+    2_000_000 + pages   scanned pages, one JPEG per page
+
+Run it on its own to browse a document:
+
+    python benchmarks/standin_server.py --port 8000 --delay 50
+    # http://127.0.0.1:8000/embeds/1000100/content
+"""
+import argparse
+import http.server
+import io
+import json
+import os
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_PATH = os.path.join(ROOT, "benchmarks", "fixtures", "lazy_document.html")
+
+TEXT_DOCUMENT = 1_000_000
+SCANNED_DOCUMENT = 2_000_000
+MAX_PAGES = 999_999
+
+
+def document_id(pages, scanned=False):
+    """The stand-in document id of a document with `pages` pages."""
+    if not 1 <= pages <= MAX_PAGES:
+        raise ValueError(f"Page count must be between 1 and {MAX_PAGES}")
+    return (SCANNED_DOCUMENT if scanned else TEXT_DOCUMENT) + pages
+
+
+def parse_document_id(doc_id):
+    """Returns `(pages, scanned)` of a stand-in document id, or None for an unknown id."""
+    kind, pages = divmod(int(doc_id), 1_000_000)
+    if kind * 1_000_000 not in (TEXT_DOCUMENT, SCANNED_DOCUMENT) or not pages:
+        return None
+    return pages, kind * 1_000_000 == SCANNED_DOCUMENT
+
+
+def _encode(image, fmt, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def build_assets():
+    """The page picture (PNG) and the scanned page (JPEG) served under /assets."""
+    picture = Image.new("RGB", (320, 180), (68, 170, 119))
+    ImageDraw.Draw(picture).ellipse([100, 30, 220, 150], fill=(250, 220, 90))
+    scan = Image.new("L", (1632, 2112), 255)
+    draw = ImageDraw.Draw(scan)
+    for y in range(120, 2112 - 120, 36):
+        draw.rectangle([120, y, 1632 - 120 - (y * 7) % 400, y + 14], fill=60)
+    return {
+        "/assets/page.png": ("image/png", _encode(picture, "PNG")),
+        "/assets/scan.jpg": ("image/jpeg", _encode(scan, "JPEG", quality=80)),
+    }
+
+
+def build_embed_html(doc_id, delay_ms):
+    """The fixture viewer for one stand-in document, or None for an unknown id."""
+    parsed = parse_document_id(doc_id)
+    if parsed is None:
+        return None
+    pages, scanned = parsed
+    options = {"pages": pages, "delay": delay_ms}
+    options["scan" if scanned else "image"] = "/assets/scan.jpg" if scanned else "/assets/page.png"
+    metadata = {"id": int(doc_id), "title": f"Stand-in document {doc_id}", "page_count": pages}
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        html = f.read()
+    head = (
+        f"<script>window.FIXTURE_OPTIONS = {json.dumps(options)};</script>\n"
+        f"<script>window.doc = {json.dumps(metadata)};</script>\n</head>"
+    )
+    return html.replace("</head>", head, 1).encode("utf-8")
+
+
+def serve_standin(delay_ms=50, latency_ms=0, port=0):
+    """
+    Starts the stand-in on localhost in a daemon thread.
+
+    Args:
+        delay_ms (int, optional): Time a page takes to fill once it nears the viewport.
+        latency_ms (int, optional): Added to every HTTP response.
+        port (int, optional): Port to listen on; 0 picks a free one.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is
+        `f"http://127.0.0.1:{server.server_port}"`.
+    """
+    assets = build_assets()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            parts = path.strip("/").split("/")
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if path in assets:
+                content_type, payload = assets[path]
+            elif len(parts) == 3 and parts[0] == "embeds" and parts[1].isdigit() and parts[2] == "content":
+                content_type, payload = "text/html; charset=utf-8", build_embed_html(parts[1], delay_ms)
+            else:
+                payload = None
+            if payload is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("Cache-Control", "max-age=3600")
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=int, default=50, help="Simulated per-page load latency (ms).")
+    parser.add_argument("--latency", type=int, default=0, help="Added to every HTTP response (ms).")
+    args = parser.parse_args()
+
+    server = serve_standin(args.delay, args.latency, args.port)
+    print(f"Serving on http://127.0.0.1:{server.server_port}/embeds/{document_id(100)}/content (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
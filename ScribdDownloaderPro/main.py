@@ -1,6 +1,15 @@
 import argparse
+import os
 import sys
+from src.batch import BatchDownloader, read_batch_file
+from src.checkpoint import CheckpointStore
+from src.compression import (
+    COMPRESSION_PROFILES, DEFAULT_PROFILE, MAX_IMAGE_DPI, MIN_IMAGE_DPI, shared_compression_service
+)
 from src.downloader import Downloader
+from src.network import BLOCKED_DOMAINS, AssetCache, NetworkPolicy
+from src.result_cache import ResultCache
+from src.text_extractor import OUTPUT_FORMATS
 from src.logger import setup_logger
 
 def main():
@@ -13,7 +22,48 @@ def main():
 
     parser.add_argument(
         "url_or_id",
-        help="The full URL or ID of the Scribd document to download."
+        nargs="*",
+        help="The full URL or ID of the Scribd document to download.\n"
+             "Several values run a batch download."
+    )
+
+    parser.add_argument(
+        "--batch-file",
+        help="Text file with one URL or ID per line ('-' reads stdin); runs a batch download."
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=2,
+        help="Batch mode: documents downloaded at the same time (default: 2)."
+    )
+
+    parser.add_argument(
+        "--summary",
+        help="Batch mode: path of the JSON summary (default: downloads/batch_summary_<time>.json)."
+    )
+
+    parser.add_argument(
+        "--force",
+        dest="skip_existing",
+        action="store_false",
+        help="Batch mode: download documents again even if an earlier batch already saved them."
+    )
+
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Batch mode: give every stage (metadata, render, clean, compress) its own\n"
+             "workers so one document renders while another is compressed. --concurrency\n"
+             "sets the number of browsers."
+    )
+
+    parser.add_argument(
+        "--post-workers",
+        type=int,
+        default=1,
+        help="Pipeline mode: processes of the clean stage and of the compress stage (default: 1)."
     )
 
     parser.add_argument(
@@ -22,6 +72,29 @@ def main():
         help="Enable PDF compression after downloading (requires Ghostscript)."
     )
 
+    parser.add_argument(
+        "--compress-profile",
+        choices=list(COMPRESSION_PROFILES),
+        default=DEFAULT_PROFILE,
+        help="Ghostscript quality preset used by --compress: 'screen' (smallest),\n"
+             "'ebook' (default) or 'printer' (largest, best image quality)."
+    )
+
+    parser.add_argument(
+        "--image-dpi",
+        type=int,
+        help="With --compress: downsample color and gray images to this resolution\n"
+             f"({MIN_IMAGE_DPI}-{MAX_IMAGE_DPI}) instead of the profile's."
+    )
+
+    parser.add_argument(
+        "--gs-workers",
+        type=int,
+        default=0,
+        help="Ghostscript processes running at the same time; long documents are\n"
+             "compressed as page ranges in parallel (default: number of CPUs)."
+    )
+
     parser.add_argument(
         "--no-clean",
         dest="clean",
@@ -29,6 +102,146 @@ def main():
         help="Disable the feature to remove blank pages from the PDF."
     )
 
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=0,
+        help="Render and print this many pages at a time, then merge them. Keeps browser "
+             "memory flat on very long documents and resumes after a crash (default: off)."
+    )
+
+    parser.add_argument(
+        "--tabs",
+        type=int,
+        default=1,
+        help="Load and print the document in this many browser tabs, each taking its own "
+             "page range (default: 1)."
+    )
+
+    parser.add_argument(
+        "--clean-workers",
+        type=int,
+        default=1,
+        help="Number of processes used to detect blank pages (default: 1)."
+    )
+
+    parser.add_argument(
+        "--load-strategy",
+        choices=["events", "index", "scroll"],
+        default="events",
+        help="How pages are loaded in the browser: 'events' waits for in-page\n"
+             "render/network signals (default), 'index' visits only the page slots\n"
+             "that are still empty, in batches, 'scroll' uses the legacy fixed sleeps."
+    )
+
+    parser.add_argument(
+        "--renderer",
+        choices=["print", "assets"],
+        default="print",
+        help="'print' lays the document out in the browser and prints it (default).\n"
+             "'assets' builds the PDF from the page images the viewer downloads, one page\n"
+             "per image, and prints only pages without one. Much faster for scanned documents."
+    )
+
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=list(OUTPUT_FORMATS),
+        default="pdf",
+        help="'pdf' prints the document (default). 'text', 'json' and 'markdown' read the\n"
+             "text layers straight from the viewer and write them page by page, without\n"
+             "printing; 'json' adds page sizes and the position of every text span.\n"
+             "Scanned pages have no text layer. --compress and --no-clean do not apply."
+    )
+
+    parser.add_argument(
+        "--engine",
+        choices=["sync", "async"],
+        default="sync",
+        help="'sync' runs one thread and browser per document (default). 'async' drives\n"
+             "all documents from one event loop sharing one browser; it supports the\n"
+             "'events' load strategy only, without --chunk-size or --tabs."
+    )
+
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Keep render chunks and the output of every finished stage in\n"
+             "downloads/.checkpoints, so rerunning a document that failed resumes from\n"
+             "its last finished chunk or stage instead of starting over."
+    )
+
+    parser.add_argument(
+        "--checkpoint-max-age",
+        type=float,
+        default=24,
+        help="Hours after which an unused checkpoint is deleted (default: 24)."
+    )
+
+    parser.add_argument(
+        "--checkpoint-max-mb",
+        type=int,
+        default=4096,
+        help="Total size of all checkpoints before the oldest are deleted (default: 4096)."
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("RESULT_CACHE_DIR", os.path.join(".cache", "results")),
+        help="Directory of the finished-download cache (default: .cache/results)."
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Always render the document, neither reading nor filling the cache."
+    )
+
+    parser.add_argument(
+        "--no-request-filter",
+        dest="request_filter",
+        action="store_false",
+        help="Let the viewer load everything, including trackers and ads, and do not\n"
+             "use the asset cache."
+    )
+
+    parser.add_argument(
+        "--block-domain",
+        action="append",
+        default=[],
+        metavar="DOMAIN",
+        help="Also block requests to this domain and its subdomains (repeatable)."
+    )
+
+    parser.add_argument(
+        "--asset-cache-dir",
+        default=os.environ.get("ASSET_CACHE_DIR", os.path.join(".cache", "assets")),
+        help="Directory of the viewer's scripts, stylesheets and fonts, shared by all\n"
+             "downloads (default: .cache/assets)."
+    )
+
+    parser.add_argument(
+        "--asset-cache-max-mb",
+        type=int,
+        default=256,
+        help="Size of the asset cache before the least recently used assets are deleted\n"
+             "(default: 256)."
+    )
+
+    parser.add_argument(
+        "--trace-dir",
+        help="Write a Chrome trace (chrome://tracing, ui.perfetto.dev) of every download's\n"
+             "stages into this directory."
+    )
+
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Log one JSON object per line; stage spans carry duration, pages, bytes,\n"
+             "peak RSS and browser round trips."
+    )
+
     parser.add_argument(
         "-v", "--verbose",
         action="store_true",
@@ -36,16 +249,93 @@ def main():
     )
 
     args = parser.parse_args()
+    if not args.url_or_id and not args.batch_file:
+        parser.error("give a URL or ID, or --batch-file")
+    if args.image_dpi is not None and not MIN_IMAGE_DPI <= args.image_dpi <= MAX_IMAGE_DPI:
+        parser.error(f"--image-dpi must be between {MIN_IMAGE_DPI} and {MAX_IMAGE_DPI}")
+    if args.engine == "async" and (args.chunk_size or args.tabs > 1 or args.load_strategy != "events"
+                                   or args.renderer != "print" or args.checkpoint or args.output_format != "pdf"):
+        parser.error("--engine async supports neither --chunk-size, --tabs, --renderer assets, "
+                     "--checkpoint, --format nor a --load-strategy other than events")
 
     log_level = "DEBUG" if args.verbose else "INFO"
-    logger = setup_logger(level=log_level)
+    logger = setup_logger(level=log_level, json_format=args.log_json)
+    shared_compression_service(logger, workers=args.gs_workers or None)
+
+    network = NetworkPolicy(
+        logger,
+        blocked_domains=BLOCKED_DOMAINS + tuple(args.block_domain),
+        asset_cache=AssetCache(args.asset_cache_dir, logger, max_size_mb=args.asset_cache_max_mb)
+    ) if args.request_filter else None
+
+    download_options = dict(
+        compress=args.compress,
+        clean=args.clean,
+        load_strategy=args.load_strategy,
+        clean_workers=args.clean_workers,
+        chunk_size=args.chunk_size or None,
+        tabs=args.tabs,
+        renderer=args.renderer,
+        compress_profile=args.compress_profile,
+        image_dpi=args.image_dpi,
+        trace_dir=args.trace_dir,
+        network=network,
+        output_format=args.output_format
+    )
 
     try:
+        cache = ResultCache(args.cache_dir, logger) if args.use_cache else None
+        checkpoints = CheckpointStore(
+            os.path.join("downloads", ".checkpoints"),
+            logger,
+            max_age_hours=args.checkpoint_max_age,
+            max_size_mb=args.checkpoint_max_mb
+        ) if args.checkpoint else None
+        if args.engine == "async":
+            # Imported here so the sync CLI does not need playwright.async_api.
+            from src.async_downloader import AsyncDownloader, download_many
+
+            entries = list(args.url_or_id)
+            if args.batch_file:
+                entries.extend(read_batch_file(args.batch_file))
+            del download_options["chunk_size"], download_options["tabs"], download_options["renderer"]
+            del download_options["network"], download_options["output_format"]
+            if len(entries) == 1:
+                if not AsyncDownloader(url_or_id=entries[0], logger=logger, cache=cache, **download_options).run():
+                    sys.exit(1)
+                return
+            paths = download_many(entries, logger, concurrency=args.concurrency, cache=cache, **download_options)
+            failed = sum(1 for path in paths if not path)
+            logger.info(f"Downloaded {len(paths) - failed}/{len(paths)} documents")
+            if failed:
+                sys.exit(1)
+            return
+
+        if args.batch_file or len(args.url_or_id) > 1:
+            entries = list(args.url_or_id)
+            if args.batch_file:
+                entries.extend(read_batch_file(args.batch_file))
+            batch = BatchDownloader(
+                logger,
+                concurrency=args.concurrency,
+                cache=cache,
+                skip_existing=args.skip_existing,
+                pipeline=args.pipeline,
+                stage_workers=dict(clean_processes=args.post_workers, compress_processes=args.post_workers),
+                checkpoints=checkpoints,
+                **download_options
+            )
+            summary = batch.run(entries, summary_path=args.summary)
+            if summary["counts"].get("failed"):
+                sys.exit(1)
+            return
+
         downloader = Downloader(
-            url_or_id=args.url_or_id,
-            compress=args.compress,
-            clean=args.clean,
-            logger=logger
+            url_or_id=args.url_or_id[0],
+            logger=logger,
+            cache=cache,
+            checkpoints=checkpoints,
+            **download_options
         )
         downloader.run()
     except Exception as e:
@@ -0,0 +1,332 @@
+import os
+import shutil
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image
+from playwright.sync_api import sync_playwright
+from .browser_handler import BrowserHandler, BROWSER_LAUNCH_ARGS, CONTEXT_OPTIONS, CSS_PIXELS_PER_INCH, PRINT_CSS
+from .metadata_fetcher import DEFAULT_TIMEOUT, shared_session
+from .metrics import traced
+from .page_scripts import PAGE_TRACKER_JS, PAGE_WINDOW_CSS, PAGE_ASSETS_JS
+
+# "print" lays the document out in Chromium and prints it; "assets" builds the
+# PDF from the page images the viewer downloads (see AssetRenderer).
+RENDERERS = ("print", "assets")
+
+# A page is taken from its image only when one image covers at least this
+# share of the page and there is no text layer on top of it.
+MIN_ASSET_COVERAGE = 0.9
+
+# Pages loaded between two scans for page images.
+ASSET_WINDOW = 20
+
+# File signatures of the image formats a page asset may have.
+ASSET_SIGNATURES = {b"\xff\xd8\xff": ".jpg", b"\x89PNG": ".png"}
+
+# Page images without a layout size or a usable resolution are taken as CSS pixels.
+DEFAULT_IMAGE_DPI = CSS_PIXELS_PER_INCH
+
+_JPEG_COLORSPACES = {"L": "DeviceGray", "RGB": "DeviceRGB", "CMYK": "DeviceCMYK"}
+
+
+def _image_dpi(image):
+    dpi = image.info.get("dpi")
+    if isinstance(dpi, tuple) and dpi and dpi[0] and dpi[0] >= 50:
+        return float(dpi[0])
+    return DEFAULT_IMAGE_DPI
+
+
+def _flatten(image):
+    """Converts an image to 8-bit gray or RGB, painting transparency onto white."""
+    if image.mode in ("L", "RGB"):
+        return image
+    if image.mode in ("RGBA", "LA", "P", "PA") or "transparency" in image.info:
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def layout_page_size(info):
+    """
+    Size in points of the page the viewer laid out, from PAGE_ASSETS_JS; the
+    same size its printed neighbours get. None when the page was not measured.
+    """
+    if not info.get("width") or not info.get("height"):
+        return None
+    scale = 72 / CSS_PIXELS_PER_INCH
+    return info["width"] * scale, info["height"] * scale
+
+
+def write_image_pdf(image_paths, output_path, page_sizes=None):
+    """
+    Writes a PDF with one page per image.
+
+    Each page takes its size in points from `page_sizes` (see
+    layout_page_size), so image pages match the printed pages they are
+    merged with; without one, the image's resolution decides, or 96 dpi
+    when it has none.
+
+    JPEG files are embedded unchanged (DCTDecode), so they are neither decoded
+    nor re-compressed; other formats are decoded with Pillow and stored
+    Flate-compressed. JPEG data is copied from disk in chunks, so memory does
+    not grow with the number of pages.
+    """
+    offsets = {}
+    with open(output_path, "wb") as out:
+        def begin(number):
+            offsets[number] = out.tell()
+            out.write(f"{number} 0 obj\n".encode())
+
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        begin(1)
+        out.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        kids = []
+        for index, path in enumerate(image_paths):
+            page_size = page_sizes[index] if page_sizes else None
+            page_id, content_id, image_id = 3 + 3 * index, 4 + 3 * index, 5 + 3 * index
+            kids.append(f"{page_id} 0 R")
+            with Image.open(path) as image:
+                width_px, height_px = image.size
+                scale = 72 / _image_dpi(image)
+                if image.format == "JPEG" and image.mode in _JPEG_COLORSPACES:
+                    colorspace = _JPEG_COLORSPACES[image.mode]
+                    image_filter = "DCTDecode"
+                    # Adobe CMYK JPEGs store inverted components.
+                    decode = " /Decode [1 0 1 0 1 0 1 0]" if image.mode == "CMYK" and "adobe" in image.info else ""
+                    data = None
+                    length = os.path.getsize(path)
+                else:
+                    flat = _flatten(image)
+                    colorspace = "DeviceGray" if flat.mode == "L" else "DeviceRGB"
+                    image_filter = "FlateDecode"
+                    decode = ""
+                    data = zlib.compress(flat.tobytes(), 6)
+                    length = len(data)
+            width, height = page_size or (width_px * scale, height_px * scale)
+
+            begin(page_id)
+            out.write(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+                f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>\nendobj\n".encode()
+            )
+            content = f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q".encode()
+            begin(content_id)
+            out.write(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream\nendobj\n")
+            begin(image_id)
+            out.write(
+                f"<< /Type /XObject /Subtype /Image /Width {width_px} /Height {height_px} "
+                f"/ColorSpace /{colorspace} /BitsPerComponent 8 /Filter /{image_filter}{decode} "
+                f"/Length {length} >>\nstream\n".encode()
+            )
+            if data is None:
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, out)
+            else:
+                out.write(data)
+            out.write(b"\nendstream\nendobj\n")
+
+        begin(2)
+        out.write(f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>\nendobj\n".encode())
+
+        size = 3 + 3 * len(kids)
+        xref = out.tell()
+        out.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for number in range(1, size):
+            out.write(f"{offsets[number]:010d} 00000 n \n".encode())
+        out.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+class AssetRenderer(BrowserHandler):
+    """
+    Builds the PDF from the page images the viewer downloads instead of
+    printing the laid-out document.
+
+    The viewer is still opened and scrolled so it requests every page, but
+    instead of printing, the image URLs it requested are captured from the
+    network and fetched concurrently over a pooled HTTP session. Each
+    image becomes one page at its native size. Pages that are not a single
+    image (text layers, vector content, tiled images) and images that cannot
+    be fetched are printed with the regular print path and merged in place.
+    """
+    def __init__(self, logger, page_count=None, browser_pool=None, progress_callback=None,
+                 session=None, fetch_workers=8, tracer=None, request_filter=None):
+        """
+        Args:
+            session (requests.Session, optional): Pooled session for the image
+                downloads. Defaults to the shared metadata session.
+            fetch_workers (int, optional): Images downloaded at the same time.
+        """
+        super().__init__(logger, page_count=page_count, browser_pool=browser_pool,
+                         progress_callback=progress_callback, tracer=tracer, request_filter=request_filter)
+        self.session = session or shared_session()
+        self.fetch_workers = max(1, int(fetch_workers))
+
+    def get_pdf_from_url(self, url, output_path=None):
+        """
+        Builds the PDF of the document at `url` into `output_path`.
+
+        Returns:
+            str: `output_path`, or None on failure.
+        """
+        if not output_path:
+            raise ValueError("The asset renderer writes to a file, pass output_path")
+
+        if self.browser_pool is not None:
+            try:
+                return self.browser_pool.run(self._render_assets_with_browser, url, output_path)
+            except Exception as e:
+                self.logger.error(f"Error in browser process: {e}")
+                return None
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+            try:
+                return self._render_assets_with_browser(browser, url, output_path)
+            finally:
+                browser.close()
+
+    def _render_assets_with_browser(self, browser, url, output_path):
+        """Captures, fetches and assembles the page images; prints the pages without one."""
+        asset_dir = output_path + ".assets"
+        os.makedirs(asset_dir, exist_ok=True)
+        requested = set()
+        context = self._new_context(browser)
+        page = self.tracer.instrument_page(context.new_page())
+        page.on("response", lambda response: self._capture(response, requested))
+        try:
+            if not self._open_document(page, url):
+                return None
+            page.evaluate(PAGE_TRACKER_JS)
+            page.add_style_tag(content=PAGE_WINDOW_CSS)
+            page.add_style_tag(content=PRINT_CSS)
+            total = self._document_page_total(page)
+            if not total:
+                self.logger.error("No page slots found in the viewer")
+                return None
+
+            # Images are downloaded while the viewer keeps loading later pages.
+            fetches = {}
+            page_sizes = {}
+            with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="asset-fetch") as fetcher:
+                start = 0
+                while start < total:
+                    stop = min(start + ASSET_WINDOW, total)
+                    self._load_page_window(page, start, stop)
+                    cookies = self._cookie_jar(context.cookies())
+                    for info in page.evaluate(PAGE_ASSETS_JS, [start, stop]):
+                        if self._is_asset_page(info, requested):
+                            page_sizes[info["index"]] = layout_page_size(info)
+                            fetches[info["index"]] = fetcher.submit(
+                                self._fetch_asset, info["src"], url, cookies,
+                                os.path.join(asset_dir, f"page_{info['index']:06d}")
+                            )
+                    start = stop
+                    total = max(total, self._document_page_total(page))
+                with self.tracer.span("fetch_assets") as span:
+                    assets = {index: future.result() for index, future in fetches.items()}
+                    assets = {index: path for index, path in assets.items() if path}
+                    span.set(pages=len(assets), bytes_in=sum(os.path.getsize(path) for path in assets.values()))
+
+            self._report_progress("fetching", assets_fetched=len(assets))
+            self.logger.info(
+                f"{len(assets)} of {total} pages taken from their images, "
+                f"{total - len(assets)} printed"
+            )
+            self._assemble(page, total, assets, page_sizes, asset_dir, output_path)
+            return output_path
+        except Exception as e:
+            self.logger.error(f"Error in browser process: {e}")
+            return None
+        finally:
+            context.close()
+            shutil.rmtree(asset_dir, ignore_errors=True)
+
+    @staticmethod
+    def _capture(response, requested):
+        """Records the URL of every image the viewer downloaded successfully."""
+        try:
+            if response.request.resource_type == "image" and response.ok:
+                requested.add(response.url)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_asset_page(info, requested):
+        return (
+            info["src"] in requested
+            and info["images"] == 1
+            and not info["has_text"]
+            and info["coverage"] >= MIN_ASSET_COVERAGE
+        )
+
+    @staticmethod
+    def _cookie_jar(cookies):
+        """Turns the browser context's cookies into a jar for requests."""
+        jar = requests.cookies.RequestsCookieJar()
+        for cookie in cookies:
+            jar.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+        return jar
+
+    def _fetch_asset(self, src, referer, cookies, base_path):
+        """
+        Downloads one page image next to `base_path`, adding the extension of
+        its format. Returns the file path, or None if the download failed or
+        is not a JPEG or PNG image.
+        """
+        part_path = base_path + ".part"
+        headers = {"User-Agent": CONTEXT_OPTIONS["user_agent"], "Referer": referer}
+        try:
+            with self.session.get(src, headers=headers, cookies=cookies, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+                response.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+        except (requests.RequestException, OSError) as e:
+            self.logger.debug(f"Could not fetch page image {src}: {e}")
+            return None
+
+        with open(part_path, "rb") as f:
+            signature = f.read(4)
+        extension = next((ext for magic, ext in ASSET_SIGNATURES.items() if signature.startswith(magic)), None)
+        if extension is None:
+            self.logger.debug(f"Page image {src} is neither JPEG nor PNG, printing the page instead")
+            os.remove(part_path)
+            return None
+        os.replace(part_path, base_path + extension)
+        return base_path + extension
+
+    @traced("assemble")
+    def _assemble(self, page, total, assets, page_sizes, asset_dir, output_path):
+        """
+        Writes runs of image pages with write_image_pdf, at the layout size of
+        their pages, and prints the runs in between, then merges the parts in
+        page order.
+        """
+        runs = []
+        for index in range(total):
+            is_asset = index in assets
+            if runs and runs[-1][0] == is_asset:
+                runs[-1][2] = index + 1
+            else:
+                runs.append([is_asset, index, index + 1])
+
+        if len(runs) == 1 and runs[0][0]:
+            write_image_pdf([assets[index] for index in range(total)], output_path,
+                            [page_sizes.get(index) for index in range(total)])
+            return
+
+        parts = []
+        for number, (is_asset, start, stop) in enumerate(runs):
+            part_path = os.path.join(asset_dir, f"part_{number:05d}.pdf")
+            if is_asset:
+                write_image_pdf([assets[index] for index in range(start, stop)], part_path,
+                                [page_sizes.get(index) for index in range(start, stop)])
+            else:
+                self._load_page_window(page, start, stop)
+                self._print_page_window(page, start, stop, part_path)
+            parts.append(part_path)
+        self._merge_pdfs(parts, output_path)
@@ -0,0 +1,170 @@
+import asyncio
+import base64
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from .browser_handler import (
+    CONTEXT_OPTIONS, PDF_STREAM_CHUNK_SIZE, PRINT_CSS, normalize_page_sizes, pdf_options_for, print_params_for
+)
+from .page_scripts import (
+    PAGE_TRACKER_JS, TRACKER_SNAPSHOT_JS, LOAD_STEP_JS, WAIT_FOR_PROGRESS_JS, WAIT_FOR_SETTLED_JS,
+    UI_CLEANUP_SCRIPTS, PAGE_GEOMETRY_JS, SET_PAGE_SIZE_JS
+)
+
+
+class AsyncBrowserHandler:
+    """
+    asyncio counterpart of BrowserHandler, built on playwright.async_api.
+
+    Each document gets its own context in a browser owned by the caller, so
+    one event loop can keep many documents loading in the same Chromium.
+    Only the single-tab render with the "events" load strategy is available;
+    chunked, multi-tab and scroll-strategy rendering stay on BrowserHandler.
+    Pages are printed at their own size when they all share one; mixed
+    sizes are printed at the largest of them.
+    """
+    def __init__(self, logger, page_count=None, progress_callback=None):
+        self.logger = logger
+        self.page_count = int(page_count) if page_count and page_count != 'N/A' else None
+        self.progress_callback = progress_callback
+
+    def _report_progress(self, stage, **progress):
+        """Forwards stage and page counters to the progress callback, if any."""
+        if self.progress_callback:
+            self.progress_callback(stage=stage, **progress)
+
+    async def get_pdf_from_url(self, browser, url, output_path):
+        """
+        Renders the document in a fresh context of `browser` and streams the
+        PDF into `output_path`.
+
+        Returns:
+            str: `output_path`, or None on failure.
+        """
+        context = await browser.new_context(**CONTEXT_OPTIONS)
+        try:
+            page = await context.new_page()
+            if not await self._open_document(page, url):
+                return None
+
+            await self._event_driven_load(page)
+            await self._clean_ui_elements(page)
+            await asyncio.gather(
+                page.emulate_media(media="print"),
+                page.add_style_tag(content=PRINT_CSS),
+            )
+            await self._wait_until_settled(page)
+            self._report_progress("printing")
+
+            sizes = normalize_page_sizes(await page.evaluate(PAGE_GEOMETRY_JS, [0, None]), max_runs=1)
+            size = sizes[0] if sizes else None
+            await page.evaluate(SET_PAGE_SIZE_JS, [size["width"], size["height"]] if size else [0, 0])
+            await self._print_pdf_to_file(page, output_path, size=size)
+            self.logger.info("PDF generated successfully with zero margins")
+            return output_path
+        except Exception as e:
+            self.logger.error(f"Error in browser process: {e}")
+            return None
+        finally:
+            await context.close()
+
+    async def _open_document(self, page, url):
+        """Navigates to the document and waits for its first page. Returns False on timeout."""
+        self.logger.info(f"Accessing URL: {url}")
+        await page.goto(url, wait_until="networkidle", timeout=120000)
+        try:
+            await page.wait_for_selector("[class*='page']", timeout=120000)
+            self.logger.info("First page element found, starting to load all pages...")
+            return True
+        except PlaywrightTimeoutError:
+            self.logger.error("Timeout waiting for page elements.")
+            return False
+
+    async def _event_driven_load(self, page, quiet_ms=1500, step_timeout=15000, max_stalled_steps=5):
+        """
+        Same loop as BrowserHandler._event_driven_load: scroll one step, then
+        wake up on the in-page tracker's signals instead of sleeping.
+        """
+        self.logger.info("Starting event-driven page loading...")
+        await page.evaluate(PAGE_TRACKER_JS)
+
+        stalled_steps = 0
+        state = await page.evaluate(TRACKER_SNAPSHOT_JS)
+        while True:
+            self._report_progress("loading", pages_loaded=state["rendered"])
+            self.logger.debug(
+                f"{state['rendered']}/{self.page_count or state['total']} pages rendered, "
+                f"{state['pending']} requests pending"
+            )
+            if self.page_count and state["rendered"] >= self.page_count:
+                self.logger.info(f"All {self.page_count} pages loaded successfully")
+                break
+            if not self.page_count and state["at_bottom"] and 0 < state["total"] == state["rendered"]:
+                self.logger.info(f"Reached the end with all {state['total']} pages rendered")
+                break
+            if stalled_steps >= max_stalled_steps:
+                self.logger.info(f"No new pages after {stalled_steps} quiet steps. Stopping.")
+                break
+
+            await page.evaluate(LOAD_STEP_JS, state["at_bottom"])
+            try:
+                await page.wait_for_function(
+                    WAIT_FOR_PROGRESS_JS,
+                    arg=[state["rendered"], self.page_count, quiet_ms],
+                    polling=100,
+                    timeout=step_timeout
+                )
+            except PlaywrightTimeoutError:
+                self.logger.debug("No loading signal before the step timeout, continuing...")
+
+            previous = state
+            state = await page.evaluate(TRACKER_SNAPSHOT_JS)
+            if state["rendered"] > previous["rendered"] or not previous["at_bottom"]:
+                stalled_steps = 0
+            else:
+                stalled_steps += 1
+
+        self.logger.info(f"Event-driven loading completed with {state['rendered']} rendered pages")
+
+    async def _clean_ui_elements(self, page):
+        """Runs the UI cleanup scripts concurrently instead of one round-trip after another."""
+        self.logger.debug("Performing advanced UI cleanup...")
+        results = await asyncio.gather(
+            *(page.evaluate(script) for script in UI_CLEANUP_SCRIPTS),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.warning(f"Failed to execute cleanup script: {result}")
+
+    async def _wait_until_settled(self, page, timeout=10000):
+        """Waits until fonts and page images finished loading, up to `timeout` ms."""
+        try:
+            await page.wait_for_function(WAIT_FOR_SETTLED_JS, polling=100, timeout=timeout)
+        except PlaywrightTimeoutError:
+            self.logger.debug("Page did not settle before printing, continuing...")
+
+    async def _print_pdf_to_file(self, page, output_path, size=None):
+        """
+        Streams the printed PDF to `output_path` over the DevTools protocol,
+        falling back to page.pdf(path=...). See BrowserHandler._print_pdf_to_file.
+        """
+        try:
+            cdp = await page.context.new_cdp_session(page)
+        except Exception as e:
+            self.logger.debug(f"CDP session unavailable ({e}), printing with page.pdf()")
+            await page.pdf(path=output_path, **pdf_options_for(size))
+            return
+        try:
+            result = await cdp.send("Page.printToPDF", dict(print_params_for(size), transferMode="ReturnAsStream"))
+            stream = result["stream"]
+            try:
+                with open(output_path, "wb") as f:
+                    while True:
+                        chunk = await cdp.send("IO.read", {"handle": stream, "size": PDF_STREAM_CHUNK_SIZE})
+                        data = chunk.get("data", "")
+                        f.write(base64.b64decode(data) if chunk.get("base64Encoded") else data.encode("latin-1"))
+                        if chunk.get("eof"):
+                            break
+            finally:
+                await cdp.send("IO.close", {"handle": stream})
+        finally:
+            await cdp.detach()
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import shutil
+import time
+from playwright.async_api import async_playwright
+from .async_browser_handler import AsyncBrowserHandler
+from .browser_handler import BROWSER_LAUNCH_ARGS
+from .compression import DEFAULT_PROFILE
+from .downloader import Downloader
+from .metadata_fetcher import SCRIBD_BASE_URL, AsyncMetadataFetcher, create_async_session, embed_url_for
+from .utils import get_document_id_from_url
+
+
+class AsyncDownloader(Downloader):
+    """
+    Downloader variant running on asyncio.
+
+    Metadata is fetched with an async HTTP client and the document is
+    rendered with playwright.async_api, so while one document waits on the
+    network or the browser the event loop drives the others. Cleaning and
+    compression are CPU-bound and run in a worker thread.
+
+    `run()` keeps the synchronous interface of Downloader; use `run_async()`
+    or AsyncDownloadEngine to share one event loop and one browser between
+    documents. Stage statistics are process-wide, so they overlap when
+    several documents run on the same loop.
+    """
+    def __init__(self, url_or_id, compress, clean, logger, output_dir="downloads", browser=None,
+                 progress_callback=None, load_strategy="events", cache=None, clean_workers=1,
+                 http_session=None, compress_profile=DEFAULT_PROFILE, image_dpi=None, trace_dir=None,
+                 base_url=SCRIBD_BASE_URL):
+        """
+        Initializes the AsyncDownloader.
+
+        Takes the same arguments as Downloader, except:
+
+        Args:
+            browser (playwright.async_api.Browser, optional): Running browser the
+                document gets a context in. Without one, a browser is launched
+                for this document.
+            load_strategy (str, optional): Only "events" is supported.
+            http_session (aiohttp.ClientSession, optional): Shared session for
+                metadata requests (see create_async_session).
+        """
+        if load_strategy != "events":
+            raise ValueError("The async engine only supports the 'events' load strategy")
+        super().__init__(
+            url_or_id, compress, clean, logger,
+            output_dir=output_dir,
+            progress_callback=progress_callback,
+            load_strategy=load_strategy,
+            cache=cache,
+            clean_workers=clean_workers,
+            compress_profile=compress_profile,
+            image_dpi=image_dpi,
+            trace_dir=trace_dir,
+            base_url=base_url
+        )
+        self.browser = browser
+        self.http_session = http_session
+
+    def run(self):
+        """
+        Runs `run_async()` on a new event loop, for synchronous callers.
+
+        Returns:
+            str: The path to the saved file, or None on failure.
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Executes the entire download workflow on the running event loop.
+
+        Returns:
+            str: The path to the saved file, or None on failure.
+        """
+        self.logger.info("="*50)
+        self.logger.info("Starting Scribd Document Download Process")
+        self.logger.info("="*50)
+
+        doc_id = get_document_id_from_url(self.url_or_id)
+        if not doc_id:
+            self.logger.error(f"Invalid URL or ID: '{self.url_or_id}'")
+            return None
+        self.logger.info(f"Successfully extracted Document ID: {doc_id}")
+
+        if self.browser is None:
+            async with async_playwright() as p:
+                self.browser = await p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+                try:
+                    return await self._run_cached(doc_id)
+                finally:
+                    await self.browser.close()
+                    self.browser = None
+        return await self._run_cached(doc_id)
+
+    async def _run_cached(self, doc_id):
+        """Serves the document from the result cache, downloading and storing it on a miss."""
+        if self.cache is None:
+            return await self._download_async(doc_id)
+
+        async def produce():
+            output_path = await self._download_async(doc_id)
+            if not output_path:
+                return None
+            return output_path, self._cache_metadata(doc_id, output_path)
+
+        started = time.monotonic()
+        # The same id queued twice on the loop is rendered once; the second waits for it.
+        entry = await self.cache.get_or_create_async(self._cache_key(doc_id), produce)
+        if not entry:
+            return None
+        output_path = await asyncio.to_thread(self._deliver_cached, entry)
+        self.logger.info(f"Result ready at '{output_path}' after {(time.monotonic() - started) * 1000:.0f} ms")
+        return output_path
+
+    async def _download_async(self, doc_id):
+        """
+        Fetches metadata, renders the document and post-processes the PDF.
+
+        Returns:
+            str: The path to the saved file, or None on failure.
+        """
+        self._begin_run(doc_id)
+        self._report_progress("metadata")
+        metadata_fetcher = AsyncMetadataFetcher(doc_id, self.logger, session=self.http_session, base_url=self.base_url)
+        doc_title, page_count = self._apply_metadata(doc_id, await metadata_fetcher.fetch_async())
+
+        browser_handler = AsyncBrowserHandler(
+            self.logger,
+            page_count=page_count,
+            progress_callback=self.progress_callback
+        )
+
+        work_dir = self._create_work_dir(doc_id)
+        try:
+            with self._measure_stage("render"):
+                current_path = await browser_handler.get_pdf_from_url(
+                    self.browser, embed_url_for(doc_id, self.base_url), os.path.join(work_dir, "rendered.pdf")
+                )
+            return await asyncio.to_thread(self._post_process, current_path, work_dir, doc_title)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            self.tracer.write_trace()
+
+
+class AsyncDownloadEngine:
+    """
+    Drives many documents on one event loop with one browser and one HTTP session.
+
+        async with AsyncDownloadEngine(logger, concurrency=8) as engine:
+            paths = await engine.download_many(ids)
+
+    A document that is waiting on the browser or the network costs no thread,
+    so `concurrency` is bounded by browser memory rather than by workers.
+    The browser is relaunched if it crashes.
+    """
+    def __init__(self, logger, concurrency=4, output_dir="downloads", cache=None, progress_callback=None,
+                 **download_options):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            concurrency (int, optional): Documents in flight at the same time.
+            output_dir (str, optional): Directory the PDFs are saved to.
+            cache (ResultCache, optional): Cache of finished downloads.
+            progress_callback (callable, optional): Passed to every AsyncDownloader.
+            **download_options: Passed on to every AsyncDownloader (compress,
+                clean, load_strategy, clean_workers, compress_profile, image_dpi,
+                trace_dir).
+        """
+        self.logger = logger
+        self.concurrency = max(1, int(concurrency))
+        self.output_dir = output_dir
+        self.cache = cache
+        self.progress_callback = progress_callback
+        self.download_options = download_options
+        self.http_session = None
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._browser_lock = asyncio.Lock()
+        self._playwright = await async_playwright().start()
+        self.http_session = create_async_session(pool_size=self.concurrency * 2)
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+            if self.http_session is not None:
+                await self.http_session.close()
+        finally:
+            self._browser = self.http_session = None
+            await self._playwright.stop()
+
+    async def _get_browser(self):
+        """Returns the shared browser, launching it on first use or after a crash."""
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                self.logger.info("Launching browser for the async engine...")
+                self._browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+            return self._browser
+
+    async def download(self, url_or_id):
+        """
+        Downloads one document once a concurrency slot is free.
+
+        Returns:
+            str: The path to the saved file, or None on failure.
+        """
+        async with self._semaphore:
+            downloader = AsyncDownloader(
+                url_or_id=url_or_id,
+                logger=self.logger,
+                output_dir=self.output_dir,
+                browser=await self._get_browser(),
+                progress_callback=self.progress_callback,
+                cache=self.cache,
+                http_session=self.http_session,
+                **self.download_options
+            )
+            return await downloader.run_async()
+
+    async def download_many(self, entries):
+        """
+        Downloads every entry concurrently. A failing entry does not stop the others.
+
+        Returns:
+            list: The saved paths in input order, None for failed entries.
+        """
+        async def download_logged(entry):
+            try:
+                return await self.download(entry)
+            except Exception as e:
+                self.logger.error(f"Download of '{entry}' failed: {e}")
+                return None
+
+        return await asyncio.gather(*(download_logged(entry) for entry in entries))
+
+
+def download_many(entries, logger, concurrency=4, **engine_options):
+    """
+    Synchronous wrapper around AsyncDownloadEngine.download_many.
+
+    Returns:
+        list: The saved paths in input order, None for failed entries.
+    """
+    async def run():
+        async with AsyncDownloadEngine(logger, concurrency=concurrency, **engine_options) as engine:
+            return await engine.download_many(entries)
+
+    return asyncio.run(run())
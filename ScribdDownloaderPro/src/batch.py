@@ -0,0 +1,319 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .browser_pool import BrowserPool
+from .downloader import Downloader
+from .metadata_fetcher import create_session
+from .pdf_processor import count_pdf_pages
+from .pipeline import DocumentPipeline
+from .text_extractor import FORMAT_EXTENSIONS
+from .utils import get_document_id_from_url
+
+# Maps document ids to the files a batch already produced in an output directory.
+BATCH_INDEX = ".batch_index.json"
+
+# Download options recorded in the batch summary. Only plain settings are
+# listed; shared objects such as the network policy are left out because the
+# summary is written as JSON.
+SUMMARY_OPTIONS = (
+    "compress", "clean", "load_strategy", "clean_workers", "chunk_size", "tabs", "renderer",
+    "compress_profile", "image_dpi", "trace_dir", "base_url", "output_format",
+)
+
+
+def read_batch_file(path):
+    """
+    Reads document URLs or ids from a text file, one per line.
+
+    Blank lines and lines starting with '#' are ignored; commas and other
+    whitespace also separate entries. Use '-' to read from stdin.
+
+    Returns:
+        list: The entries in file order.
+    """
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    entries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        entries.extend(part for part in line.replace(",", " ").split() if part)
+    return entries
+
+
+class BatchDownloader:
+    """
+    Downloads many documents with bounded concurrency.
+
+    All documents share one browser pool and one HTTP session, so Playwright
+    and TLS setup are paid once per batch instead of once per document.
+    Documents already produced in the output directory by an earlier batch
+    are skipped, and every run ends with a machine-readable summary.
+    """
+    def __init__(self, logger, output_dir="downloads", concurrency=2, browser_pool=None, session=None,
+                 cache=None, skip_existing=True, progress_callback=None, pipeline=False,
+                 stage_workers=None, checkpoints=None, **download_options):
+        """
+        Initializes the batch.
+
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            output_dir (str, optional): Directory the PDFs are saved to.
+            concurrency (int, optional): Documents processed at the same time.
+            browser_pool (BrowserPool, optional): Shared browsers. When omitted, a
+                pool of `concurrency` browsers is created for the batch and closed
+                at the end.
+            session (requests.Session, optional): Shared HTTP session; created when omitted.
+            cache (ResultCache, optional): Cache of finished downloads.
+            skip_existing (bool, optional): Skip documents already in `output_dir`.
+            progress_callback (callable, optional): Called as
+                `callback(stage="downloading", completed=..., total=..., failed=...)`
+                after every document.
+            pipeline (bool, optional): Run the documents through a DocumentPipeline,
+                with separate workers per stage, instead of `concurrency` threads
+                that each run one whole document. `concurrency` then sets the
+                number of browsers of the render stage.
+            stage_workers (dict, optional): Pipeline mode: workers of the other
+                stages, as DocumentPipeline arguments (metadata_workers,
+                clean_processes, compress_processes, queue_size).
+            checkpoints (CheckpointStore, optional): Resume documents that failed
+                in an earlier batch from their last finished chunk or stage.
+            **download_options: Passed on to every Downloader (compress, clean,
+                load_strategy, clean_workers, chunk_size, tabs, compress_profile,
+                image_dpi, network, output_format).
+        """
+        self.logger = logger
+        self.output_dir = output_dir
+        self.concurrency = max(1, int(concurrency))
+        self.browser_pool = browser_pool
+        self.session = session
+        self.cache = cache
+        self.skip_existing = skip_existing
+        self.progress_callback = progress_callback
+        self.pipeline = pipeline
+        self.stage_workers = stage_workers or {}
+        self.checkpoints = checkpoints
+        self.download_options = download_options
+        self._pipeline_stats = None
+        self._lock = threading.Lock()
+        self._index = {}
+        self._completed = 0
+        self._failed = 0
+
+    def run(self, entries, summary_path=None):
+        """
+        Downloads every entry and writes the summary.
+
+        Args:
+            entries (list): Document URLs or ids. Duplicates are processed once.
+            summary_path (str, optional): Where the JSON summary is written.
+                Defaults to `batch_summary_<timestamp>.json` in `output_dir`.
+
+        Returns:
+            dict: The summary, with one record per document in input order.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._index = self._load_index()
+        started = time.time()
+
+        documents, seen = [], set()
+        for entry in entries:
+            doc_id = get_document_id_from_url(str(entry))
+            if doc_id in seen:
+                continue
+            if doc_id:
+                seen.add(doc_id)
+            documents.append((entry, doc_id))
+
+        self._completed = self._failed = 0
+        self._pipeline_stats = None
+        own_pool = self.browser_pool is None
+        browser_pool = BrowserPool(self.logger, size=self.concurrency) if own_pool else self.browser_pool
+        session = self.session or create_session(pool_size=self.concurrency * 2)
+        self.logger.info(f"Batch of {len(documents)} documents, {self.concurrency} at a time")
+        try:
+            if self.pipeline:
+                records = self._run_pipeline(documents, browser_pool, session)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+                    records = list(executor.map(
+                        lambda document: self._process(*document, len(documents), browser_pool, session),
+                        documents
+                    ))
+        finally:
+            if own_pool:
+                browser_pool.close()
+            if self.session is None:
+                session.close()
+
+        finished = time.time()
+        counts = {}
+        for record in records:
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        summary = {
+            "started_at": started,
+            "finished_at": finished,
+            "duration_s": round(finished - started, 2),
+            "options": {key: value for key, value in self.download_options.items() if key in SUMMARY_OPTIONS},
+            "counts": counts,
+            "documents": records,
+        }
+        if self._pipeline_stats:
+            summary["pipeline"] = self._pipeline_stats
+        summary_path = summary_path or os.path.join(
+            self.output_dir, f"batch_summary_{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}.json"
+        )
+        self._write_json(summary_path, summary)
+        self.logger.info(f"Batch finished in {summary['duration_s']:.0f}s: {counts}. Summary: {summary_path}")
+        summary["summary_path"] = summary_path
+        return summary
+
+    @staticmethod
+    def _new_record(entry, doc_id):
+        return {"input": entry, "id": doc_id, "status": None, "file": None,
+                "pages": None, "bytes": None, "duration_s": 0.0, "compression": None, "error": None}
+
+    def _precheck(self, record):
+        """Marks invalid and already downloaded documents. Returns True if the record is settled."""
+        if not record["id"]:
+            record.update(status="failed", error="Invalid URL or ID")
+            return True
+        existing = self._existing(record["id"])
+        if existing:
+            self.logger.info(f"Skipping {record['id']}, already downloaded as '{existing['file']}'")
+            record.update(existing, status="skipped")
+            return True
+        return False
+
+    def _record_output(self, record, output_path):
+        """Fills in a record from the downloaded file, or marks it failed."""
+        if not output_path or not os.path.exists(output_path):
+            record.update(status="failed", error=record["error"] or "Download failed, see the log for details")
+            return
+        record.update(
+            status="downloaded",
+            file=os.path.basename(output_path),
+            pages=count_pdf_pages(output_path) if output_path.endswith(".pdf") else None,
+            bytes=os.path.getsize(output_path),
+        )
+        self._remember(record["id"], record)
+
+    def _run_pipeline(self, documents, browser_pool, session):
+        """Downloads the documents through a DocumentPipeline and returns their records."""
+        records = [self._new_record(entry, doc_id) for entry, doc_id in documents]
+        pending = {}
+        for record in records:
+            if self._precheck(record):
+                self._report(record, len(records))
+            else:
+                pending[record["id"]] = record
+
+        def document_done(document):
+            record = pending[document.doc_id]
+            try:
+                if document.error:
+                    record["error"] = str(document.error)
+                self._record_output(record, document.output_path)
+                record["compression"] = document.downloader.stage_stats.get("compress")
+            except Exception as e:
+                self.logger.error(f"Batch entry '{document.entry}' failed: {e}")
+                record.update(status="failed", error=str(e))
+            record["duration_s"] = document.duration_s
+            self._report(record, len(records))
+
+        pipeline = DocumentPipeline(
+            self.logger,
+            browser_pool,
+            output_dir=self.output_dir,
+            session=session,
+            cache=self.cache,
+            checkpoints=self.checkpoints,
+            on_document_done=document_done,
+            **self.stage_workers,
+            **self.download_options
+        )
+        pipeline.run([(record["input"], record["id"]) for record in pending.values()])
+        self._pipeline_stats = pipeline.stats()
+        for stage in self._pipeline_stats["stages"]:
+            self.logger.info(
+                f"Stage '{stage['name']}': {stage['workers']} {stage['kind']} workers, "
+                f"utilisation {stage['utilisation']:.0%}, max queue {stage['max_queue_depth']}, "
+                f"mean wait {stage['mean_wait_s']:.1f}s"
+            )
+        return records
+
+    def _process(self, entry, doc_id, total, browser_pool, session):
+        """Downloads one document and returns its summary record."""
+        record = self._new_record(entry, doc_id)
+        started = time.monotonic()
+        try:
+            if self._precheck(record):
+                return record
+
+            downloader = Downloader(
+                url_or_id=doc_id,
+                logger=self.logger,
+                output_dir=self.output_dir,
+                browser_pool=browser_pool,
+                cache=self.cache,
+                session=session,
+                checkpoints=self.checkpoints,
+                **self.download_options
+            )
+            self._record_output(record, downloader.run())
+            record["compression"] = downloader.stage_stats.get("compress")
+            return record
+        except Exception as e:
+            self.logger.error(f"Batch entry '{entry}' failed: {e}")
+            record.update(status="failed", error=str(e))
+            return record
+        finally:
+            record["duration_s"] = round(time.monotonic() - started, 2)
+            self._report(record, total)
+
+    def _report(self, record, total):
+        with self._lock:
+            self._completed += 1
+            if record["status"] == "failed":
+                self._failed += 1
+            completed, failed = self._completed, self._failed
+        self.logger.info(f"Batch progress: {completed}/{total} ({failed} failed)")
+        if self.progress_callback:
+            self.progress_callback(stage="downloading", completed=completed, total=total, failed=failed)
+
+    def _existing(self, doc_id):
+        """Returns the index entry of an earlier download in the same format whose file still exists."""
+        if not self.skip_existing:
+            return None
+        with self._lock:
+            known = self._index.get(doc_id)
+        extension = FORMAT_EXTENSIONS[self.download_options.get("output_format", "pdf")]
+        if known and known["file"].endswith(extension) and os.path.exists(os.path.join(self.output_dir, known["file"])):
+            return dict(known)
+        return None
+
+    def _remember(self, doc_id, record):
+        with self._lock:
+            self._index[doc_id] = {key: record[key] for key in ("file", "pages", "bytes")}
+            self._write_json(os.path.join(self.output_dir, BATCH_INDEX), self._index)
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.output_dir, BATCH_INDEX), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
@@ -1,189 +1,674 @@
+import base64
+import json
+import os
+import shutil
 import time
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from PyPDF2 import PdfWriter
+from .metrics import Tracer, traced
+from .page_scripts import (
+    PAGE_TRACKER_JS, TRACKER_SNAPSHOT_JS, LOAD_STEP_JS, WAIT_FOR_PROGRESS_JS, WAIT_FOR_SETTLED_JS,
+    PAGE_WINDOW_CSS, SCROLL_TO_PAGE_JS, PAGE_RENDERED_JS, SHOW_PAGE_WINDOW_JS, SHOW_UNPRINTED_PAGES_JS,
+    RELEASE_PAGES_JS, START_RANGE_LOAD_JS, RANGE_STATE_JS, SCROLL_METRICS_JS, UI_CLEANUP_SCRIPTS,
+    LOAD_MISSING_PAGES_JS, PAGE_SLOT_COUNT_JS, PENDING_PAGES_JS, REVISIT_PAGES_JS, PAGE_GEOMETRY_JS,
+    SET_PAGE_SIZE_JS
+)
+
+BROWSER_LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor',
+    '--memory-pressure-off',
+    '--disable-background-timer-throttling',  # Better for dynamic content
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows'
+]
+
+LOAD_STRATEGIES = ("events", "index", "scroll")
+
+# Empty page slots the "index" strategy scrolls to and awaits per step.
+INDEX_BATCH_PAGES = 8
+
+# Total time the render check may spend revisiting incomplete pages, in ms.
+RENDER_CHECK_BUDGET_MS = 60000
+
+# Bump whenever a change alters the produced PDF, so cached results are not reused.
+RENDERER_VERSION = "5"
+
+# page.pdf() options; PRINT_TO_PDF_PARAMS is the same layout for CDP Page.printToPDF.
+# A4 is only the fallback for pages that cannot be measured: every page is
+# printed at its own size (see pdf_options_for and print_params_for).
+PDF_OPTIONS = {
+    "format": "A4",
+    "landscape": False,
+    "display_header_footer": False,
+    "print_background": True,
+    "prefer_css_page_size": False,  # Use format instead
+    "scale": 1.0,  # No scaling
+    "margin": {'top': '0mm', 'bottom': '0mm', 'left': '0mm', 'right': '0mm'},
+}
+PRINT_TO_PDF_PARAMS = {
+    "paperWidth": 8.27,  # A4 in inches, as Playwright defines it
+    "paperHeight": 11.7,
+    "landscape": False,
+    "displayHeaderFooter": False,
+    "printBackground": True,
+    "preferCSSPageSize": False,
+    "scale": 1.0,
+    "marginTop": 0, "marginBottom": 0, "marginLeft": 0, "marginRight": 0,
+}
+
+# Chromium lays pages out at 96 CSS pixels per inch.
+CSS_PIXELS_PER_INCH = 96
+
+# Runs of differently sized pages are printed one at a time and merged. A
+# document with more runs than this is printed at its largest page size.
+MAX_PAGE_SIZE_RUNS = 16
+
+# Size of each IO.read call when streaming a printed PDF to disk.
+PDF_STREAM_CHUNK_SIZE = 1024 * 1024
+
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1280, "height": 720},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "java_script_enabled": True,
+    "bypass_csp": True,
+    "locale": 'en-US',
+    "accept_downloads": True,
+}
+
+# CSS to remove unwanted margins and spacing
+PRINT_CSS = """
+    @page {
+        margin: 0 !important;
+        padding: 0 !important;
+    }
+
+    body {
+        margin: 0 !important;
+        padding: 0 !important;
+    }
+
+    [class*='page'] {
+        margin: 0 !important;
+        padding: 0 !important;
+        page-break-inside: avoid !important;
+        display: block !important;
+    }
+
+    /* Hide any remaining UI elements */
+    .toolbar_top, .toolbar_bottom, .navigation,
+    .header, .footer, .sidebar {
+        display: none !important;
+    }
+"""
+
+# Chunked rendering keeps its progress here, next to the chunk PDFs.
+CHUNK_MANIFEST = "manifest.json"
+
+# Below this many pages per tab, opening another tab costs more than it saves.
+MIN_PAGES_PER_TAB = 20
+
+def normalize_page_sizes(runs, max_runs=MAX_PAGE_SIZE_RUNS):
+    """
+    Checks the page size runs measured by PAGE_GEOMETRY_JS. Returns [] when a
+    run has no size (print on A4), and a single run of the largest size when
+    there are more than `max_runs` of them.
+    """
+    if not runs or any(not run["width"] or not run["height"] for run in runs):
+        return []
+    if len(runs) > max_runs:
+        return [{
+            "start": runs[0]["start"],
+            "stop": runs[-1]["stop"],
+            "width": max(run["width"] for run in runs),
+            "height": max(run["height"] for run in runs),
+        }]
+    return runs
+
+
+def pdf_options_for(size):
+    """page.pdf() options for a sheet of `size` (width and height in CSS pixels), or A4 without one."""
+    if not size:
+        return PDF_OPTIONS
+    options = {key: value for key, value in PDF_OPTIONS.items() if key != "format"}
+    return dict(options, width=f"{size['width']}px", height=f"{size['height']}px", prefer_css_page_size=True)
+
+
+def print_params_for(size):
+    """Page.printToPDF parameters for a sheet of `size`, or A4 without one."""
+    if not size:
+        return PRINT_TO_PDF_PARAMS
+    return dict(
+        PRINT_TO_PDF_PARAMS,
+        paperWidth=size["width"] / CSS_PIXELS_PER_INCH,
+        paperHeight=size["height"] / CSS_PIXELS_PER_INCH,
+        preferCSSPageSize=True,
+    )
+
 
 class BrowserHandler:
     """
     Mengelola interaksi dengan browser (Chromium) menggunakan Playwright untuk
     meng-scrape halaman dan mencetaknya ke PDF.
     """
-    def __init__(self, logger, page_count=None):
+    def __init__(self, logger, page_count=None, browser_pool=None, progress_callback=None,
+                 load_strategy="events", chunk_size=None, chunk_dir=None, tabs=1, tracer=None,
+                 request_filter=None):
+        """
+        Args:
+            chunk_size (int, optional): Render and print this many pages at a
+                time, dropping printed pages from the DOM, instead of printing
+                the whole document at once. Needs an `output_path`.
+            chunk_dir (str, optional): Where chunk PDFs and their manifest are
+                kept until the merge; an interrupted render resumes from it.
+            tabs (int, optional): Open this many tabs of the viewer, each loading
+                and printing its own page range, and merge their PDFs. Only
+                used with the "events" strategy and without chunking.
+            tracer (Tracer, optional): Records the open, load and print steps as
+                spans, with their browser round trips.
+            request_filter (RequestFilter, optional): Blocks trackers and serves
+                static viewer assets from the asset cache in every context.
+        """
+        if load_strategy not in LOAD_STRATEGIES:
+            raise ValueError(f"Unknown load strategy '{load_strategy}', expected one of {LOAD_STRATEGIES}")
+        if chunk_size is not None and int(chunk_size) < 1:
+            raise ValueError("chunk_size must be a positive number of pages")
+        if int(tabs) < 1:
+            raise ValueError("tabs must be at least 1")
         self.logger = logger
         self.page_count = int(page_count) if page_count and page_count != 'N/A' else None
+        self.browser_pool = browser_pool
+        self.progress_callback = progress_callback
+        self.load_strategy = load_strategy
+        self.chunk_size = int(chunk_size) if chunk_size else None
+        self.chunk_dir = chunk_dir
+        self.tabs = int(tabs)
+        self.tracer = tracer or Tracer(logger)
+        self.request_filter = request_filter
 
-    def get_pdf_from_url(self, url):
+    def _report_progress(self, stage, **progress):
+        """Forwards stage and page counters to the progress callback, if any."""
+        if self.progress_callback:
+            self.progress_callback(stage=stage, **progress)
+
+    def get_pdf_from_url(self, url, output_path=None):
         """
         Improved PDF generation with better margin control.
+
+        Uses a warm browser borrowed from `browser_pool` when one is
+        configured, otherwise launches a dedicated Chromium for this document.
+
+        Args:
+            url (str): The document URL.
+            output_path (str, optional): Streams the PDF into this file instead
+                of returning it as bytes.
+
+        Returns:
+            bytes | str: The PDF bytes, or `output_path` when one is given;
+                None on failure.
         """
-        pdf_bytes = None
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor',
-                    '--memory-pressure-off',
-                    '--disable-background-timer-throttling',  # Better for dynamic content
-                    '--disable-renderer-backgrounding',
-                    '--disable-backgrounding-occluded-windows'
-                ]
-            )
-            context = browser.new_context(
-                viewport={"width": 1280, "height": 720},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
-                java_script_enabled=True,
-                bypass_csp=True,
-                locale='en-US',
-                accept_downloads=True,
-            )
-            page = context.new_page()
+        if self.chunk_size:
+            if not output_path:
+                raise ValueError("Chunked rendering writes to a file, pass output_path")
+            return self._render_chunked(url, output_path)
+
+        render = self._render_with_browser
+        if self.tabs > 1:
+            if self.load_strategy == "events" and output_path:
+                render = self._render_tabs_with_browser
+            else:
+                self.logger.info("Multi-tab rendering needs the events strategy and an output file, using one tab")
+
+        if self.browser_pool is not None:
             try:
-                self.logger.info(f"Accessing URL: {url}")
-                
-                # Navigate and wait for initial load
-                page.goto(url, wait_until="networkidle", timeout=120000)  # Increased timeout for long documents
-                page.wait_for_timeout(5000)  # Optimized initial wait
-                
-                # Wait for first page element
-                try:
-                    page.wait_for_selector("[class*='page']", timeout=120000)  # Increased timeout
-                    self.logger.info("First page element found, starting to load all pages...")
-                except PlaywrightTimeoutError:
-                    self.logger.error("Timeout waiting for page elements.")
-                    return None
-    
-                # Load all pages completely
-                self._load_all_pages_completely(page)
-                
-                # Advanced UI cleaning for better PDF output
-                self._advanced_clean_ui_elements(page)
-                
-                # Set optimal print media
-                page.emulate_media(media="print")
-                
-                # Add CSS to remove unwanted margins and spacing
-                page.add_style_tag(content="""
-                    @page {
-                        margin: 0 !important;
-                        padding: 0 !important;
-                    }
-                    
-                    body {
-                        margin: 0 !important;
-                        padding: 0 !important;
-                    }
-                    
-                    [class*='page'] {
-                        margin: 0 !important;
-                        padding: 0 !important;
-                        page-break-inside: avoid !important;
-                        display: block !important;
-                    }
-                    
-                    /* Hide any remaining UI elements */
-                    .toolbar_top, .toolbar_bottom, .navigation,
-                    .header, .footer, .sidebar {
-                        display: none !important;
-                    }
-                """)
-                
-                # Final wait before PDF generation
-                page.wait_for_timeout(5000)  # Optimized wait
-                
-                # Generate PDF with zero margins
-                pdf_bytes = page.pdf(
-                    format="A4",
-                    landscape=False,
-                    display_header_footer=False,
-                    print_background=True,
-                    prefer_css_page_size=False,  # Use format instead
-                    scale=1.0,  # No scaling
-                    margin={
-                        'top': '0mm',
-                        'bottom': '0mm', 
-                        'left': '0mm',
-                        'right': '0mm'
-                    }
-                )
-                
-                self.logger.info("PDF generated successfully with zero margins")
-                
+                return self.browser_pool.run(render, url, output_path)
             except Exception as e:
                 self.logger.error(f"Error in browser process: {e}")
                 return None
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+            try:
+                return render(browser, url, output_path)
             finally:
                 browser.close()
-        return pdf_bytes
+
+    def _new_context(self, browser):
+        """Opens a browser context for one document, behind the request filter if there is one."""
+        context = browser.new_context(**CONTEXT_OPTIONS)
+        if self.request_filter is not None:
+            self.request_filter.install(context)
+        return context
+
+    def _render_with_browser(self, browser, url, output_path=None):
+        """
+        Renders a document to PDF in a fresh context of an already running browser.
+        """
+        result = None
+        context = self._new_context(browser)
+        page = self.tracer.instrument_page(context.new_page())
+        try:
+            if not self._open_document(page, url):
+                return None
+
+            # Load all pages completely
+            self._load_all_pages_completely(page)
+            
+            # Advanced UI cleaning for better PDF output
+            self._advanced_clean_ui_elements(page)
+            
+            # Set optimal print media
+            page.emulate_media(media="print")
+            
+            # Add CSS to remove unwanted margins and spacing
+            page.add_style_tag(content=PRINT_CSS)
+            page.add_style_tag(content=PAGE_WINDOW_CSS)
+            
+            # Final wait before PDF generation
+            if self.load_strategy != "scroll":
+                self._wait_until_settled(page)
+            else:
+                page.wait_for_timeout(5000)  # Optimized wait
+            self._report_progress("printing")
+            
+            # Generate PDF with zero margins, one sheet per page at its own size
+            if output_path:
+                self._print_native_size(page, output_path)
+                result = output_path
+            else:
+                sizes = self._page_sizes(page, max_runs=1)
+                size = self._set_page_size(page, sizes[0] if sizes else None)
+                result = page.pdf(**pdf_options_for(size))
+
+            self.logger.info("PDF generated successfully with zero margins")
+            
+        except Exception as e:
+            self.logger.error(f"Error in browser process: {e}")
+            return None
+        finally:
+            context.close()
+        return result
+
+    @traced("open")
+    def _open_document(self, page, url, navigated=False):
+        """
+        Navigates to the document and waits for its first page. Returns False on timeout.
+
+        With `navigated`, the navigation was already started (see
+        _render_tabs_with_browser) and only its completion is awaited.
+        """
+        self.logger.info(f"Accessing URL: {url}")
+
+        # Navigate and wait for initial load
+        if navigated:
+            page.wait_for_load_state("networkidle", timeout=120000)
+        else:
+            page.goto(url, wait_until="networkidle", timeout=120000)  # Increased timeout for long documents
+        if self.load_strategy == "scroll":
+            page.wait_for_timeout(5000)  # Optimized initial wait
+
+        # Wait for first page element
+        try:
+            page.wait_for_selector("[class*='page']", timeout=120000)  # Increased timeout
+            self.logger.info("First page element found, starting to load all pages...")
+            return True
+        except PlaywrightTimeoutError:
+            self.logger.error("Timeout waiting for page elements.")
+            return False
+
+    def _render_tabs_with_browser(self, browser, url, output_path):
+        """
+        Renders the document with up to `tabs` tabs of one context, each tab
+        loading and printing a disjoint page range, and merges the partial
+        PDFs in page order into `output_path`.
+
+        The Playwright sync API drives one call at a time, so every tab runs
+        its range loader inside the page (START_RANGE_LOAD_JS) and Python only
+        polls; the tabs therefore load concurrently. Printing stays sequential
+        but each tab prints only its own pages.
+        """
+        context = self._new_context(browser)
+        part_paths = []
+        try:
+            tabs = [self.tracer.instrument_page(context.new_page()) for _ in range(self.tabs)]
+            # Start every navigation first so the tabs load the viewer in parallel.
+            for tab in tabs:
+                tab.goto(url, wait_until="commit", timeout=120000)
+            for tab in tabs:
+                if not self._open_document(tab, url, navigated=True):
+                    return None
+                tab.evaluate(PAGE_TRACKER_JS)
+
+            total = self._document_page_total(tabs[0])
+            if not total:
+                self.logger.info("Page count unknown, falling back to single-tab rendering")
+                return self._render_with_browser(browser, url, output_path)
+            ranges = self._split_page_ranges(total, len(tabs))
+            for tab in tabs[len(ranges):]:
+                tab.close()
+            tabs = tabs[:len(ranges)]
+            self.logger.info(f"Rendering {total} pages in {len(tabs)} tabs: {ranges}")
+
+            self._load_ranges_in_tabs(tabs, ranges)
+
+            for index, (tab, (start, stop)) in enumerate(zip(tabs, ranges)):
+                self._advanced_clean_ui_elements(tab)
+                tab.add_style_tag(content=PRINT_CSS)
+                tab.add_style_tag(content=PAGE_WINDOW_CSS)
+                tab.evaluate(SHOW_PAGE_WINDOW_JS, [start, stop])
+                tab.emulate_media(media="print")
+                self._wait_until_settled(tab)
+                self._report_progress("printing")
+                part_path = f"{output_path}.part{index:03d}"
+                part_paths.append(part_path)
+                self._print_native_size(tab, part_path, start, stop)
+                self.logger.debug(f"Tab {index + 1} printed pages {start + 1}-{stop}")
+
+            if len(part_paths) == 1:
+                os.replace(part_paths[0], output_path)
+            else:
+                self._merge_pdfs(part_paths, output_path)
+            self.logger.info(f"PDF generated from {len(part_paths)} tabs")
+            return output_path
+        except Exception as e:
+            self.logger.error(f"Error in browser process: {e}")
+            return None
+        finally:
+            context.close()
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+    def _split_page_ranges(self, total, tabs):
+        """Splits [0, total) into at most `tabs` contiguous ranges of similar size."""
+        tabs = max(1, min(tabs, total // MIN_PAGES_PER_TAB))
+        size = -(-total // tabs)
+        return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+    @traced("load")
+    def _load_ranges_in_tabs(self, tabs, ranges, step_timeout=15000, poll_ms=250):
+        """Starts the in-page range loader in every tab and waits until all of them finished."""
+        for tab, (start, stop) in zip(tabs, ranges):
+            tab.evaluate(START_RANGE_LOAD_JS, [start, stop, step_timeout])
+
+        while True:
+            states = [tab.evaluate(RANGE_STATE_JS) for tab in tabs]
+            loaded = sum(state["next"] - state["start"] for state in states)
+            self._report_progress("loading", pages_loaded=loaded)
+            if all(state["done"] for state in states):
+                break
+            tabs[0].wait_for_timeout(poll_ms)
+
+        timed_out = [index + 1 for state in states for index in state["timed_out"]]
+        if timed_out:
+            self.logger.warning(f"Pages that did not render in time: {timed_out[:20]}")
+        self.logger.info(f"Loaded {loaded} pages across {len(tabs)} tabs")
+
+    def _render_chunked(self, url, output_path, max_attempts=3):
+        """
+        Renders the document `chunk_size` pages at a time and merges the chunk
+        PDFs into `output_path`.
+
+        Every finished chunk is recorded in a manifest in `chunk_dir`. When a
+        browser crashes, the next attempt (or the next run of the same
+        document) opens the document again and continues after the last good
+        chunk instead of starting over.
+        """
+        chunk_dir = self.chunk_dir or output_path + ".chunks"
+        os.makedirs(chunk_dir, exist_ok=True)
+        manifest = self._load_chunk_manifest(chunk_dir, url)
+
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if self.browser_pool is not None:
+                    self.browser_pool.run(self._render_chunks_with_browser, url, chunk_dir, manifest)
+                else:
+                    with sync_playwright() as p:
+                        browser = p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+                        try:
+                            self._render_chunks_with_browser(browser, url, chunk_dir, manifest)
+                        finally:
+                            browser.close()
+                break
+            except Exception as e:
+                self.logger.error(
+                    f"Chunked rendering attempt {attempt}/{max_attempts} stopped at page "
+                    f"{manifest['next_page'] + 1}: {e}"
+                )
+        else:
+            self.logger.error(f"Giving up; {len(manifest['chunks'])} finished chunks are kept in '{chunk_dir}'")
+            return None
+
+        self._merge_chunks(chunk_dir, manifest, output_path)
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        self.logger.info(f"Merged {len(manifest['chunks'])} chunks into one PDF")
+        return output_path
+
+    def _render_chunks_with_browser(self, browser, url, chunk_dir, manifest):
+        """
+        Loads, prints and releases one window of pages at a time, starting at
+        the manifest's `next_page`. Raises when the document cannot be opened.
+        """
+        context = self._new_context(browser)
+        page = self.tracer.instrument_page(context.new_page())
+        try:
+            if not self._open_document(page, url):
+                raise RuntimeError("document did not show any page")
+            page.evaluate(PAGE_TRACKER_JS)
+            page.add_style_tag(content=PAGE_WINDOW_CSS)
+            page.add_style_tag(content=PRINT_CSS)
+
+            start = manifest["next_page"]
+            if start:
+                self.logger.info(f"Resuming at page {start + 1}")
+                page.evaluate(RELEASE_PAGES_JS, start)
+            total = self._document_page_total(page)
+            if not total:
+                raise RuntimeError("no page slots found in the viewer")
+
+            while start < total:
+                stop = min(start + self.chunk_size, total)
+                self._load_page_window(page, start, stop)
+                chunk_name = f"chunk_{start:06d}.pdf"
+                self._print_page_window(page, start, stop, os.path.join(chunk_dir, chunk_name))
+
+                manifest["chunks"].append(chunk_name)
+                manifest["next_page"] = stop
+                self._save_chunk_manifest(chunk_dir, manifest)
+                page.evaluate(RELEASE_PAGES_JS, stop)
+                self._report_progress("rendering", pages_rendered=stop)
+                self.logger.info(f"Printed pages {start + 1}-{stop} of {total}")
+
+                start = stop
+                # Documents without a known page count may reveal more slots as we go.
+                total = max(total, self._document_page_total(page))
+        finally:
+            context.close()
+
+    def _document_page_total(self, page):
+        """Number of pages to render: the known page count, else the page slots in the DOM."""
+        return self.page_count or page.evaluate("() => window.__sdpTracker.snapshot().total")
+
+    @traced("load")
+    def _load_page_window(self, page, start, stop, step_timeout=15000):
+        """Scrolls each page of [start, stop) into view and waits until it has rendered."""
+        self.tracer.current().set(pages=stop - start)
+        for index in range(start, stop):
+            if not page.evaluate(SCROLL_TO_PAGE_JS, index):
+                self.logger.warning(f"Page {index + 1} does not exist in the viewer")
+                break
+            try:
+                page.wait_for_function(PAGE_RENDERED_JS, arg=index, polling=100, timeout=step_timeout)
+            except PlaywrightTimeoutError:
+                self.logger.warning(f"Page {index + 1} did not render within {step_timeout} ms")
+            self._report_progress("loading", pages_loaded=index + 1)
+
+    def _print_page_window(self, page, start, stop, chunk_path):
+        """Prints only the pages [start, stop) to `chunk_path`."""
+        self._advanced_clean_ui_elements(page)
+        page.evaluate(SHOW_PAGE_WINDOW_JS, [start, stop])
+        page.emulate_media(media="print")
+        self._wait_until_settled(page)
+        self._report_progress("printing")
+        part_path = chunk_path + ".part"
+        self._print_native_size(page, part_path, start, stop)
+        os.replace(part_path, chunk_path)
+        page.emulate_media(media="screen")
+        page.evaluate(SHOW_UNPRINTED_PAGES_JS, stop)
+
+    def _load_chunk_manifest(self, chunk_dir, url):
+        """
+        Returns the progress of an earlier run of the same document with the
+        same settings, or a fresh manifest (discarding stale chunks).
+        """
+        expected = {"url": url, "chunk_size": self.chunk_size, "renderer": RENDERER_VERSION}
+        try:
+            with open(os.path.join(chunk_dir, CHUNK_MANIFEST), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if (
+            manifest
+            and all(manifest.get(key) == value for key, value in expected.items())
+            and all(os.path.exists(os.path.join(chunk_dir, name)) for name in manifest.get("chunks", []))
+        ):
+            self.logger.info(f"Found {len(manifest['chunks'])} finished chunks from an earlier run")
+            return manifest
+
+        for name in os.listdir(chunk_dir):
+            os.remove(os.path.join(chunk_dir, name))
+        return dict(expected, next_page=0, chunks=[])
+
+    def _save_chunk_manifest(self, chunk_dir, manifest):
+        path = os.path.join(chunk_dir, CHUNK_MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _merge_chunks(self, chunk_dir, manifest, output_path):
+        """Concatenates the chunk PDFs in page order into `output_path`."""
+        self._merge_pdfs([os.path.join(chunk_dir, name) for name in manifest["chunks"]], output_path)
+
+    @traced("merge")
+    def _merge_pdfs(self, paths, output_path):
+        """Concatenates the PDFs at `paths`, in order, into `output_path`."""
+        writer = PdfWriter()
+        streams = []
+        try:
+            for path in paths:
+                stream = open(path, "rb")
+                streams.append(stream)
+                writer.append(stream)
+            writer.write(output_path)
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def _page_sizes(self, page, start=0, stop=None, max_runs=MAX_PAGE_SIZE_RUNS):
+        """Runs of equally sized pages in [start, stop), see normalize_page_sizes."""
+        page.evaluate(PAGE_TRACKER_JS)
+        return normalize_page_sizes(page.evaluate(PAGE_GEOMETRY_JS, [start, stop]), max_runs=max_runs)
+
+    def _set_page_size(self, page, size):
+        """Sizes the printed sheet to `size` through an @page rule (A4 without one). Returns `size`."""
+        page.evaluate(SET_PAGE_SIZE_JS, [size["width"], size["height"]] if size else [0, 0])
+        return size
+
+    def _print_native_size(self, page, output_path, start=0, stop=None):
+        """
+        Prints the visible pages [start, stop) to `output_path`, one PDF page
+        per document page at the size the page has in the viewer, so the PDF
+        has no page split across sheets nor blank filler pages. Runs of
+        differently sized pages are printed one at a time and merged.
+        """
+        sizes = self._page_sizes(page, start, stop)
+        if len(sizes) <= 1:
+            size = self._set_page_size(page, sizes[0] if sizes else None)
+            self._print_pdf_to_file(page, output_path, size=size)
+            return
+
+        self.logger.info(f"Printing {len(sizes)} runs of differently sized pages")
+        part_paths = []
+        try:
+            for index, size in enumerate(sizes):
+                page.evaluate(SHOW_PAGE_WINDOW_JS, [size["start"], size["stop"]])
+                self._set_page_size(page, size)
+                part_path = f"{output_path}.size{index:03d}"
+                part_paths.append(part_path)
+                self._print_pdf_to_file(page, part_path, size=size)
+            self._merge_pdfs(part_paths, output_path)
+        finally:
+            page.evaluate(SHOW_PAGE_WINDOW_JS, [sizes[0]["start"], sizes[-1]["stop"]])
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+    @traced("print")
+    def _print_pdf_to_file(self, page, output_path, size=None):
+        """
+        Streams the printed PDF to `output_path` in chunks over the DevTools
+        protocol, so the whole document is never held in memory at once.
+        Falls back to page.pdf(path=...) if streaming is not available.
+        Prints on sheets of `size` (width and height in CSS pixels), or A4.
+        """
+        try:
+            cdp = page.context.new_cdp_session(page)
+        except Exception as e:
+            self.logger.debug(f"CDP session unavailable ({e}), printing with page.pdf()")
+            page.pdf(path=output_path, **pdf_options_for(size))
+            self.tracer.current().set(bytes_out=os.path.getsize(output_path))
+            return
+        try:
+            self.tracer.count_round_trip()
+            stream = cdp.send("Page.printToPDF", dict(print_params_for(size), transferMode="ReturnAsStream"))["stream"]
+            try:
+                with open(output_path, "wb") as f:
+                    while True:
+                        self.tracer.count_round_trip()
+                        chunk = cdp.send("IO.read", {"handle": stream, "size": PDF_STREAM_CHUNK_SIZE})
+                        data = chunk.get("data", "")
+                        f.write(base64.b64decode(data) if chunk.get("base64Encoded") else data.encode("latin-1"))
+                        if chunk.get("eof"):
+                            break
+            finally:
+                cdp.send("IO.close", {"handle": stream})
+        finally:
+            cdp.detach()
+        self.tracer.current().set(bytes_out=os.path.getsize(output_path))
     
+    @traced("ui_cleanup")
     def _advanced_clean_ui_elements(self, page):
         """Advanced UI cleaning for PDF generation."""
         self.logger.debug("Performing advanced UI cleanup...")
-        
-        cleanup_scripts = [
-            # Remove all toolbars and navigation
-            """
-            const elementsToHide = document.querySelectorAll(`
-                .toolbar_top, .toolbar_bottom, .navigation, .header, .footer,
-                .sidebar, .menu, .popup, .overlay, .modal, .advertisement,
-                [class*='toolbar'], [class*='nav'], [id*='toolbar'], [id*='nav']
-            `);
-            elementsToHide.forEach(el => el.remove());
-            """,
-            
-            # Fix container dimensions
-            """
-            const containers = document.querySelectorAll('.document_scroller, .outer_container, .page_container');
-            containers.forEach(el => {
-                el.style.overflow = 'visible';
-                el.style.height = 'auto';
-                el.style.maxHeight = 'none';
-                el.style.margin = '0';
-                el.style.padding = '0';
-            });
-            """,
-            
-            # Optimize body and html
-            """
-            document.body.style.margin = '0';
-            document.body.style.padding = '0';
-            document.body.style.height = 'auto';
-            document.body.style.overflow = 'visible';
-            document.documentElement.style.margin = '0';
-            document.documentElement.style.padding = '0';
-            """,
-            
-            # Ensure all pages are visible and properly styled
-            """
-            const pages = document.querySelectorAll('[class*="page"]');
-            pages.forEach((page, index) => {
-                page.style.display = 'block';
-                page.style.visibility = 'visible';
-                page.style.opacity = '1';
-                page.style.margin = '0';
-                page.style.padding = '0';
-                page.style.pageBreakInside = 'avoid';
-                page.style.pageBreakAfter = index < pages.length - 1 ? 'always' : 'auto';
-            });
-            """
-        ]
-        
-        for script in cleanup_scripts:
+
+        for script in UI_CLEANUP_SCRIPTS:
             try:
                 page.evaluate(script)
             except Exception as e:
                 self.logger.warning(f"Failed to execute cleanup script: {e}")
         
         # Final cleanup wait
-        page.wait_for_timeout(2000)  # Optimized wait
+        if self.load_strategy == "scroll":
+            page.wait_for_timeout(2000)  # Optimized wait
     
+    @traced("load")
     def _load_all_pages_completely(self, page):
         """
         Memuat semua halaman dokumen secara lengkap dengan strategi scrolling yang diperbaiki.
         """
         self.logger.info("Memulai proses memuat semua halaman...")
         
+        if self.load_strategy in ("events", "index"):
+            if self.load_strategy == "events":
+                self._event_driven_load(page)
+            else:
+                self._indexed_load(page)
+            self._ensure_all_pages_rendered(page)
+            return
+
         try:
             # Strategy 1: Progressive scrolling to load all pages
             self._progressive_scroll_load(page)
@@ -192,8 +677,9 @@ class BrowserHandler:
             self._ensure_all_pages_rendered(page)
             
             # Strategy 3: Final verification and cleanup
-            final_page_count = len(page.locator("[class*='page']").all())
+            final_page_count = page.evaluate(PAGE_SLOT_COUNT_JS)
             self.logger.info(f"Total pages loaded: {final_page_count}")
+            self.tracer.current().set(pages=final_page_count)
             
             if self.page_count and final_page_count < self.page_count:
                 self.logger.warning(f"Expected {self.page_count} pages but only loaded {final_page_count}")
@@ -203,6 +689,104 @@ class BrowserHandler:
         except Exception as e:
             self.logger.error(f"Error in loading all pages: {e}")
 
+    def _event_driven_load(self, page, quiet_ms=1500, step_timeout=15000, max_stalled_steps=5):
+        """
+        Loads pages by scrolling one viewport at a time and waking up on in-page
+        signals (rendered page count, DOM mutations, network activity) instead
+        of fixed sleeps. Stops as soon as `page_count` pages are rendered, or
+        when the bottom is reached and progress stalls.
+        """
+        self.logger.info("Starting event-driven page loading...")
+        page.evaluate(PAGE_TRACKER_JS)
+
+        stalled_steps = 0
+        state = page.evaluate(TRACKER_SNAPSHOT_JS)
+        while True:
+            self._report_progress("loading", pages_loaded=state["rendered"])
+            self.logger.debug(
+                f"{state['rendered']}/{self.page_count or state['total']} pages rendered, "
+                f"{state['pending']} requests pending"
+            )
+            if self.page_count and state["rendered"] >= self.page_count:
+                self.logger.info(f"All {self.page_count} pages loaded successfully")
+                break
+            if not self.page_count and state["at_bottom"] and 0 < state["total"] == state["rendered"]:
+                self.logger.info(f"Reached the end with all {state['total']} pages rendered")
+                break
+            if stalled_steps >= max_stalled_steps:
+                self.logger.info(f"No new pages after {stalled_steps} quiet steps. Stopping.")
+                break
+
+            page.evaluate(LOAD_STEP_JS, state["at_bottom"])
+            try:
+                page.wait_for_function(
+                    WAIT_FOR_PROGRESS_JS,
+                    arg=[state["rendered"], self.page_count, quiet_ms],
+                    polling=100,
+                    timeout=step_timeout
+                )
+            except PlaywrightTimeoutError:
+                self.logger.debug("No loading signal before the step timeout, continuing...")
+
+            previous = state
+            state = page.evaluate(TRACKER_SNAPSHOT_JS)
+            if state["rendered"] > previous["rendered"] or not previous["at_bottom"]:
+                stalled_steps = 0
+            else:
+                stalled_steps += 1
+
+        self.logger.info(f"Event-driven loading completed with {state['rendered']} rendered pages")
+        self.tracer.current().set(pages=state["rendered"])
+
+    def _indexed_load(self, page, batch_size=INDEX_BATCH_PAGES, step_timeout=15000, max_stalled_steps=3):
+        """
+        Loads only the page slots that are still empty, `batch_size` at a time,
+        from an index the page keeps (see LOAD_MISSING_PAGES_JS). Every step is
+        one round trip that returns the counts, so the load time follows the
+        number of missing pages instead of the document length. Stops when no
+        slot is missing (and `page_count` slots exist), or when neither the
+        last `max_stalled_steps` steps nor a retry of every missing slot
+        rendered a new page.
+        """
+        self.logger.info("Starting indexed page loading...")
+        page.evaluate(PAGE_TRACKER_JS)
+
+        stalled_steps = 0
+        previous = {"rendered": 0, "total": 0}
+        while True:
+            state = page.evaluate(LOAD_MISSING_PAGES_JS, [batch_size, step_timeout, self.page_count])
+            self._report_progress("loading", pages_loaded=state["rendered"])
+            self.logger.debug(
+                f"{state['rendered']}/{self.page_count or state['total']} pages rendered, "
+                f"{state['missing']} missing"
+            )
+            if state["timed_out"]:
+                self.logger.debug(f"Pages that did not render in time: {[i + 1 for i in state['timed_out']]}")
+            if not state["missing"] and (not self.page_count or state["total"] >= self.page_count):
+                self.logger.info(f"All {state['total']} pages loaded successfully")
+                break
+            if state["rendered"] > previous["rendered"] or state["total"] > previous["total"]:
+                stalled_steps = 0
+            else:
+                stalled_steps += 1
+            # Stalled once every missing slot was retried without any progress.
+            if stalled_steps >= max(max_stalled_steps, -(-state["missing"] // batch_size)):
+                self.logger.warning(
+                    f"No new pages after {stalled_steps} steps, {state['missing']} pages still missing. Stopping."
+                )
+                break
+            previous = state
+
+        self.logger.info(f"Indexed loading completed with {state['rendered']} rendered pages")
+        self.tracer.current().set(pages=state["rendered"])
+
+    def _wait_until_settled(self, page, timeout=10000):
+        """Waits until fonts and page images finished loading, up to `timeout` ms."""
+        try:
+            page.wait_for_function(WAIT_FOR_SETTLED_JS, polling=100, timeout=timeout)
+        except PlaywrightTimeoutError:
+            self.logger.debug("Page did not settle before printing, continuing...")
+
     def _progressive_scroll_load(self, page):
         """
         Improved progressive scroll loading with incremental viewport-based scrolling for better lazy-loading handling in large documents.
@@ -217,7 +801,7 @@ class BrowserHandler:
         
         while attempt < max_attempts:
             # Get current page count
-            current_pages = len(page.locator("[class*='page']").all())
+            current_pages = page.evaluate(PAGE_SLOT_COUNT_JS)
             
             if current_pages == last_page_count:
                 stable_count += 1
@@ -228,6 +812,7 @@ class BrowserHandler:
                 last_page_count = current_pages
             
             self.logger.debug(f"Attempt {attempt + 1}: {current_pages} pages loaded")
+            self._report_progress("loading", pages_loaded=current_pages)
             
             # If we have the expected page count and it's stable, break
             if self.page_count and current_pages >= self.page_count and stable_count >= 10:  # Increased stability check
@@ -241,21 +826,8 @@ class BrowserHandler:
             
             # Incremental scrolling strategy to trigger lazy loading
             try:
-                current_y = page.evaluate("window.scrollY")
-                scroll_height = page.evaluate("document.body.scrollHeight")
-                viewport_height = page.evaluate("window.innerHeight")
-                step = viewport_height * 1.5  # Scroll by 1.5 viewports for overlap
-                
-                while current_y < scroll_height - viewport_height:
-                    next_y = current_y + step
-                    if next_y > scroll_height:
-                        next_y = scroll_height
-                    page.evaluate(f"window.scrollTo(0, {next_y})")
-                    page.wait_for_timeout(3000)  # Optimized wait for each step to allow loading
-                    # Update positions as content may have loaded
-                    current_y = page.evaluate("window.scrollY")
-                    scroll_height = page.evaluate("document.body.scrollHeight")
-                
+                self._scroll_sweep(page, 3000)  # Optimized wait for each step to allow loading
+
                 # At bottom, dispatch events and wait
                 page.evaluate("""
                     window.dispatchEvent(new Event('scroll'));
@@ -281,53 +853,68 @@ class BrowserHandler:
             
             attempt += 1
         
-        final_count = len(page.locator("[class*='page']").all())
+        final_count = page.evaluate(PAGE_SLOT_COUNT_JS)
         self.logger.info(f"Progressive loading completed with {final_count} pages")
 
-    def _ensure_all_pages_rendered(self, page):
+    def _scroll_sweep(self, page, wait_ms):
         """
-        Ensure all loaded pages are fully rendered, with optimizations for very long documents.
+        Scrolls to the bottom 1.5 viewports at a time (for overlap), waiting
+        `wait_ms` after each step so lazy content can load. Position and
+        heights are read with one evaluate per step.
         """
-        self.logger.info("Ensuring all pages are fully rendered...")
-        
-        page_elements = page.locator("[class*='page']").all()
-        total_pages = len(page_elements)
-        
-        scroll_interval = 1
-        if total_pages > 1000:
-            scroll_interval = 10
-        elif total_pages > 500:
-            scroll_interval = 5
-        elif total_pages > 100:
-            scroll_interval = 2
-        
-        for i, page_element in enumerate(page_elements):
-            if i % scroll_interval == 0:
-                try:
-                    page_element.scroll_into_view_if_needed()
-                    
-                    # Wait for text layer
-                    try:
-                        page_element.wait_for_selector(".textLayer, .text_layer", timeout=3000)  # Optimized timeout
-                    except PlaywrightTimeoutError:
-                        self.logger.debug(f"Text layer not found in page {i+1}")
-                    
-                    # Wait for images or canvas to ensure visuals are loaded
-                    try:
-                        page_element.wait_for_selector("canvas, img", timeout=3000)  # Optimized timeout for images/canvases
-                    except PlaywrightTimeoutError:
-                        self.logger.debug(f"Canvas or image not found in page {i+1}")
-                    
-                    wait_time = 300 if total_pages > 500 else 200  # Optimized wait
-                    page.wait_for_timeout(wait_time)
-                    
-                except Exception as e:
-                    self.logger.debug(f"Error rendering page {i+1}: {e}")
-            
-            if (i + 1) % 50 == 0:  # Log progress every 50 pages
-                self.logger.debug(f"Rendered {i + 1}/{total_pages} pages")
-        
-        self.logger.info(f"All {total_pages} pages rendering completed")
+        metrics = page.evaluate(SCROLL_METRICS_JS)
+        step = metrics["viewport"] * 1.5
+        while metrics["y"] < metrics["height"] - metrics["viewport"]:
+            next_y = min(metrics["y"] + step, metrics["height"])
+            page.evaluate("(y) => window.scrollTo(0, y)", next_y)
+            page.wait_for_timeout(wait_ms)
+            # Update positions as content may have loaded
+            metrics = page.evaluate(SCROLL_METRICS_JS)
+
+    def _ensure_all_pages_rendered(self, page, budget_ms=RENDER_CHECK_BUDGET_MS, batch_size=INDEX_BATCH_PAGES,
+                                   step_timeout=3000):
+        """
+        Verifies in one in-page pass that every page has its content and no
+        image or canvas still loading (see PENDING_PAGES_JS), then revisits
+        the incomplete pages, `batch_size` at a time and each for up to
+        `step_timeout` ms while it is in view. After every batch the check
+        runs again, and pages that stay incomplete are retried after the
+        others, until none is left or `budget_ms` is spent.
+
+        Returns:
+            list: Indices of the pages still incomplete.
+        """
+        self.logger.info("Verifying that all pages are fully rendered...")
+        page.evaluate(PAGE_TRACKER_JS)
+        state = page.evaluate(PENDING_PAGES_JS)
+        total, pending = state["total"], state["pending"]
+        self.logger.info(f"{total - len(pending)}/{total} pages complete, revisiting {len(pending)}")
+
+        deadline = time.monotonic() + budget_ms / 1000
+        retried = set()
+        while pending:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            batch = pending[:batch_size]
+            page.evaluate(REVISIT_PAGES_JS, [batch, step_timeout, remaining_ms])
+            retried.update(batch)
+            state = page.evaluate(PENDING_PAGES_JS)
+            # Pages that were just revisited go to the back, so the others get their turn first.
+            pending = ([i for i in state["pending"] if i not in retried]
+                       + [i for i in state["pending"] if i in retried])
+            if not any(i not in retried for i in pending):
+                retried.clear()
+            self._report_progress("rendering", pages_rendered=state["total"] - len(pending))
+
+        if pending:
+            self.logger.warning(
+                f"{len(pending)} pages still incomplete within the {budget_ms / 1000:.0f}s budget: "
+                f"{[i + 1 for i in pending[:20]]}"
+            )
+        else:
+            self.logger.info(f"All {state['total']} pages rendering completed")
+        return pending
 
     def _aggressive_load_remaining_pages(self, page, current_count):
         """
@@ -342,20 +929,8 @@ class BrowserHandler:
         while aggressive_attempts < max_aggressive_attempts and current_count < self.page_count:
             try:
                 # Force incremental scroll again with longer waits
-                current_y = page.evaluate("window.scrollY")
-                scroll_height = page.evaluate("document.body.scrollHeight")
-                viewport_height = page.evaluate("window.innerHeight")
-                step = viewport_height * 1.5
-                
-                while current_y < scroll_height - viewport_height:
-                    next_y = current_y + step
-                    if next_y > scroll_height:
-                        next_y = scroll_height
-                    page.evaluate(f"window.scrollTo(0, {next_y})")
-                    page.wait_for_timeout(longer_wait)  # Optimized wait
-                    current_y = page.evaluate("window.scrollY")
-                    scroll_height = page.evaluate("document.body.scrollHeight")
-                
+                self._scroll_sweep(page, longer_wait)
+
                 # Trigger events
                 page.evaluate("""
                     window.dispatchEvent(new Event('scroll'));
@@ -369,10 +944,11 @@ class BrowserHandler:
                     pass
                 
                 # Update count
-                new_count = len(page.locator("[class*='page']").all())
+                new_count = page.evaluate(PAGE_SLOT_COUNT_JS)
                 if new_count > current_count:
                     self.logger.info(f"Aggressive load added {new_count - current_count} pages")
                     current_count = new_count
+                    self._report_progress("loading", pages_loaded=current_count)
                 
             except Exception as e:
                 self.logger.debug(f"Error in aggressive load: {e}")
@@ -380,7 +956,7 @@ class BrowserHandler:
             aggressive_attempts += 1
             page.wait_for_timeout(3000)  # Optimized wait between attempts
         
-        final_count = len(page.locator("[class*='page']").all())
+        final_count = page.evaluate(PAGE_SLOT_COUNT_JS)
         self.logger.info(f"Aggressive loading completed with {final_count} pages")
 
     def _clean_ui_elements(self, page):
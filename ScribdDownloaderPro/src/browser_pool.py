@@ -0,0 +1,273 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from playwright.sync_api import sync_playwright
+from . import sysinfo
+from .browser_handler import BROWSER_LAUNCH_ARGS
+
+
+class _BrowserSlot:
+    """
+    One warm Chromium instance owned by a dedicated thread.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    slot runs its own Playwright driver and executes borrowed work on its
+    own thread.
+    """
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.tasks = queue.Queue()
+        self.playwright = None
+        self.browser = None
+        self.driver_pid = None
+        self.documents = 0
+        self.launches = 0
+        self.busy = False
+        self.busy_since = None
+        self.busy_seconds = 0.0
+        self.last_rss = None
+        self.thread = threading.Thread(
+            target=self._loop, name=f"browser-slot-{index}", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, func, args):
+        future = Future()
+        self.tasks.put((func, args, future))
+        return future
+
+    def is_connected(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    def _start_playwright(self):
+        # Serialize driver startup so the new child process can be attributed
+        # to this slot for memory accounting.
+        with self.pool._launch_lock:
+            before = sysinfo.child_pids()
+            self.playwright = sync_playwright().start()
+            new_pids = sysinfo.child_pids() - before
+        self.driver_pid = min(new_pids) if new_pids else None
+
+    def _ensure_browser(self):
+        if self.is_connected():
+            return self.browser
+        if self.browser is not None:
+            self.pool.logger.warning(f"Browser slot {self.index} lost its browser, relaunching...")
+            self._close_browser()
+        if self.playwright is None:
+            self._start_playwright()
+        self.browser = self.playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        self.documents = 0
+        self.launches += 1
+        self.pool._count("launches")
+        self.pool.logger.debug(f"Browser slot {self.index} launched a new browser")
+        return self.browser
+
+    def _close_browser(self):
+        try:
+            if self.browser is not None:
+                self.browser.close()
+        except Exception as e:
+            self.pool.logger.debug(f"Error closing browser in slot {self.index}: {e}")
+        self.browser = None
+
+    def _maybe_recycle(self):
+        self.last_rss = sysinfo.process_tree_rss(self.driver_pid)
+        reason = None
+        if self.documents >= self.pool.max_documents_per_browser:
+            reason = f"served {self.documents} documents"
+        elif self.pool.max_memory_bytes and self.last_rss and self.last_rss > self.pool.max_memory_bytes:
+            reason = f"memory {self.last_rss / (1024 * 1024):.0f} MB over limit"
+        if reason:
+            self.pool.logger.info(f"Recycling browser slot {self.index} ({reason})")
+            self._close_browser()
+            self.pool._count("recycles")
+
+    def _loop(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            if task == "recycle":
+                if self.browser is not None:
+                    self.pool.logger.info(f"Recycling browser slot {self.index} (requested)")
+                    self._close_browser()
+                    self.pool._count("recycles")
+                continue
+            func, args, future = task
+            if not future.set_running_or_notify_cancel():
+                self.pool._release(self)
+                continue
+            self.busy, self.busy_since = True, time.monotonic()
+            try:
+                browser = self._ensure_browser()
+                result = func(browser, *args)
+            except BaseException as e:
+                self.pool._count("failures")
+                future.set_exception(e)
+            else:
+                self.pool._count("documents")
+                future.set_result(result)
+            finally:
+                self.documents += 1
+                self.busy_seconds += time.monotonic() - self.busy_since
+                self.busy, self.busy_since = False, None
+                self._maybe_recycle()
+                self.pool._release(self)
+        self._close_browser()
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+
+class BrowserPool:
+    """
+    A bounded pool of long-lived Chromium browsers.
+
+    Callers borrow a warm browser with `run`, which executes a function on
+    the browser's own thread and returns its result. Browsers are recycled
+    after a number of documents or when their process tree grows past a
+    memory limit.
+    """
+    def __init__(self, logger, size=2, max_documents_per_browser=25, max_memory_mb=2048):
+        """
+        Initializes the pool. Browsers are launched lazily on first use.
+
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            size (int, optional): Number of browsers kept in the pool.
+            max_documents_per_browser (int, optional): Documents served before
+                a browser is relaunched.
+            max_memory_mb (int, optional): RSS of a browser process tree above
+                which it is relaunched. 0 disables the check.
+        """
+        if size < 1:
+            raise ValueError("Browser pool size must be at least 1.")
+        self.logger = logger
+        self.size = size
+        self.max_documents_per_browser = max_documents_per_browser
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.created_at = time.monotonic()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._launch_lock = threading.Lock()
+        self._counters = {
+            "borrowed": 0, "documents": 0, "failures": 0,
+            "launches": 0, "recycles": 0, "wait_seconds": 0.0,
+        }
+        self._idle = queue.Queue()
+        self._slots = [_BrowserSlot(self, i) for i in range(size)]
+        for slot in self._slots:
+            self._idle.put(slot)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _release(self, slot):
+        self._idle.put(slot)
+
+    def run(self, func, *args, timeout=None):
+        """
+        Borrows a browser, calls `func(browser, *args)` with it and returns it.
+
+        Args:
+            func (callable): Work to run with the borrowed browser.
+            *args: Extra positional arguments for `func`.
+            timeout (float, optional): Seconds to wait for a free browser.
+
+        Returns:
+            The return value of `func`. Exceptions raised by `func` propagate.
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        started = time.monotonic()
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No browser became available within {timeout} seconds.")
+        self._count("borrowed")
+        self._count("wait_seconds", time.monotonic() - started)
+        return slot.submit(func, args).result()
+
+    def recycle(self, index):
+        """Closes a slot's browser once its current document (if any) is done."""
+        self._slots[index].tasks.put("recycle")
+
+    def recycle_heaviest(self):
+        """
+        Recycles (see `recycle`) the browser whose process tree uses the most
+        memory right now.
+
+        Returns:
+            tuple: `(index, rss_bytes)` of that slot, or None when no browser
+                is running or its memory cannot be read.
+        """
+        heaviest = None
+        for slot in self._slots:
+            if not slot.is_connected():
+                continue
+            rss = sysinfo.process_tree_rss(slot.driver_pid)
+            if rss and (heaviest is None or rss > heaviest[1]):
+                heaviest = (slot.index, rss)
+        if heaviest:
+            self.recycle(heaviest[0])
+        return heaviest
+
+    def is_healthy(self):
+        """Returns True when every slot thread is alive and the pool is open."""
+        return not self._closed and all(slot.thread.is_alive() for slot in self._slots)
+
+    def stats(self):
+        """
+        Returns health and utilisation counters for the pool.
+
+        Returns:
+            dict: Pool-wide counters and a per-slot breakdown.
+        """
+        now = time.monotonic()
+        uptime = max(now - self.created_at, 1e-9)
+        with self._lock:
+            counters = dict(self._counters)
+        slots = []
+        busy_seconds = 0.0
+        for slot in self._slots:
+            slot_busy = slot.busy_seconds + (now - slot.busy_since if slot.busy_since else 0.0)
+            busy_seconds += slot_busy
+            slots.append({
+                "index": slot.index,
+                "busy": slot.busy,
+                "connected": slot.is_connected(),
+                "documents_since_launch": slot.documents,
+                "launches": slot.launches,
+                "rss_mb": round(slot.last_rss / (1024 * 1024), 1) if slot.last_rss else None,
+            })
+        borrowed = counters["borrowed"]
+        return {
+            "healthy": self.is_healthy(),
+            "size": self.size,
+            "busy": sum(1 for s in slots if s["busy"]),
+            "idle": self._idle.qsize(),
+            "utilisation": round(busy_seconds / (uptime * self.size), 4),
+            "documents": counters["documents"],
+            "failures": counters["failures"],
+            "launches": counters["launches"],
+            "recycles": counters["recycles"],
+            "avg_wait_ms": round(counters["wait_seconds"] * 1000 / borrowed, 1) if borrowed else 0.0,
+            "slots": slots,
+        }
+
+    def close(self):
+        """Stops every slot thread and closes its browser."""
+        if self._closed:
+            return
+        self._closed = True
+        for slot in self._slots:
+            slot.tasks.put(None)
+        for slot in self._slots:
+            slot.thread.join(timeout=30)
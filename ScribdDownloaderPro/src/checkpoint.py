@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+CHECKPOINT_MANIFEST = "checkpoint.json"
+
+# Pages per chunk when a checkpointed render has no chunk size of its own.
+CHECKPOINT_CHUNK_PAGES = 100
+
+
+class Checkpoint:
+    """
+    Finished stage outputs of one document, kept in its work directory.
+
+    The manifest records, per stage, the output file, the options it was
+    produced with and the file it was produced from. A stage is only
+    resumed when all three still match, so changing e.g. the compression
+    profile reuses the rendered and cleaned PDFs but compresses again.
+    """
+    def __init__(self, store, doc_id, work_dir):
+        self.store = store
+        self.doc_id = doc_id
+        self.work_dir = work_dir
+        self.manifest = self._load()
+
+    @property
+    def chunk_dir(self):
+        """Where chunked rendering keeps its chunk PDFs and manifest."""
+        return os.path.join(self.work_dir, "chunks")
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.work_dir, CHECKPOINT_MANIFEST), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {"doc_id": self.doc_id, "stages": {}}
+        if manifest.get("stages"):
+            self.store.logger.info(
+                f"Found checkpoint of document {self.doc_id} with finished stages: {', '.join(manifest['stages'])}"
+            )
+        return manifest
+
+    def _save(self):
+        self.manifest["updated_at"] = time.time()
+        path = os.path.join(self.work_dir, CHECKPOINT_MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def resume(self, stage, input_path, options):
+        """
+        Returns the output `stage` left in an earlier run from the same input
+        with the same options, or None if the stage has to run.
+        """
+        record = self.manifest["stages"].get(stage)
+        if not record:
+            return None
+        path = os.path.join(self.work_dir, record["file"])
+        if (
+            record["input"] != (os.path.basename(input_path) if input_path else None)
+            or record["options"] != json.loads(json.dumps(options))
+            or not os.path.exists(path)
+        ):
+            return None
+        return path
+
+    def record(self, stage, input_path, output_path, options):
+        """
+        Records the output of a finished stage. Stages recorded after `stage`
+        were produced from its previous output and are forgotten.
+        """
+        stages = self.manifest["stages"]
+        if stage in stages:
+            names = list(stages)
+            for later in names[names.index(stage) + 1:]:
+                del stages[later]
+        stages[stage] = {
+            "file": os.path.basename(output_path),
+            "input": os.path.basename(input_path) if input_path else None,
+            "options": options,
+        }
+        self._save()
+
+    def release(self, succeeded):
+        """
+        Ends the run. The work directory is removed after a successful run
+        and kept for the next attempt otherwise.
+        """
+        if succeeded:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        else:
+            self.store.logger.info(f"Checkpoint of document {self.doc_id} kept in '{self.work_dir}'")
+        self.store._release(self.doc_id)
+
+
+class CheckpointStore:
+    """
+    Per-document work directories that survive a failed download.
+
+    Every document gets `<root>/<doc_id>/`, holding its render chunks and
+    the output of every finished stage, so rerunning the same id resumes
+    where the last attempt stopped. Work directories that have not been
+    touched for `max_age_hours` are removed, and the least recently used
+    ones once all of them together grow past `max_size_mb`. The root may
+    be on another filesystem than the output directory; the finished file
+    is then copied next to its target before it is put in place.
+    """
+    def __init__(self, root, logger, max_age_hours=24, max_size_mb=4096, gc_interval_seconds=300):
+        """
+        Args:
+            root (str): Directory that holds the work directories.
+            logger (Logger): The logger instance for logging messages.
+            max_age_hours (float, optional): Age after which a checkpoint is discarded.
+            max_size_mb (int, optional): Total size of all checkpoints before the
+                oldest are discarded.
+            gc_interval_seconds (int, optional): Minimum time between two
+                garbage collections triggered by `open`.
+        """
+        self.root = root
+        self.logger = logger
+        self.max_age_seconds = max_age_hours * 3600
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.gc_interval_seconds = gc_interval_seconds
+        self._lock = threading.Lock()
+        self._doc_locks = {}
+        self._active = set()
+        self._last_gc = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def open(self, doc_id):
+        """
+        Opens the checkpoint of a document, waiting while another run in this
+        process holds it. Call `release` on the result when the run ends.
+
+        Returns:
+            Checkpoint: The document's checkpoint, empty if there is none yet.
+        """
+        doc_id = str(doc_id)
+        if time.monotonic() - self._last_gc > self.gc_interval_seconds:
+            self.collect_garbage()
+        with self._lock:
+            doc_lock = self._doc_locks.setdefault(doc_id, threading.Lock())
+        doc_lock.acquire()
+        with self._lock:
+            self._active.add(doc_id)
+        work_dir = os.path.join(self.root, doc_id)
+        os.makedirs(work_dir, exist_ok=True)
+        return Checkpoint(self, doc_id, work_dir)
+
+    def _release(self, doc_id):
+        with self._lock:
+            self._active.discard(doc_id)
+            doc_lock = self._doc_locks.get(doc_id)
+        if doc_lock is not None and doc_lock.locked():
+            doc_lock.release()
+
+    def collect_garbage(self):
+        """
+        Removes expired checkpoints, then the least recently used ones until
+        the rest fits in `max_size_mb`. Checkpoints in use are left alone.
+
+        Returns:
+            dict: Number of removed checkpoints and megabytes freed.
+        """
+        self._last_gc = time.monotonic()
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            last_used, size = self._usage(path)
+            entries.append((last_used, size, name, path))
+
+        removed, freed = 0, 0
+        total = sum(size for _, size, _, _ in entries)
+        for last_used, size, name, path in sorted(entries):
+            expired = now - last_used > self.max_age_seconds
+            if not expired and total <= self.max_size_bytes:
+                continue
+            with self._lock:
+                if name in self._active:
+                    continue
+            self.logger.debug(f"Removing checkpoint of document {name}")
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            freed += size
+            total -= size
+        if removed:
+            self.logger.info(f"Removed {removed} stale checkpoints ({freed / (1024 * 1024):.1f} MB)")
+        return {"removed": removed, "freed_mb": round(freed / (1024 * 1024), 1)}
+
+    @staticmethod
+    def _usage(path):
+        """Latest modification time and total size of the files under `path`."""
+        last_used, size = os.path.getmtime(path), 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                last_used = max(last_used, stat.st_mtime)
+                size += stat.st_size
+        return last_used, size
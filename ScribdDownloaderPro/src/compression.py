@@ -0,0 +1,271 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PyPDF2 import PdfReader, PdfWriter
+from .pdf_processor import available_cpus, open_reader_stream, count_pdf_pages
+
+# Ghostscript -dPDFSETTINGS presets, from the smallest to the largest output.
+COMPRESSION_PROFILES = ("screen", "ebook", "printer")
+DEFAULT_PROFILE = "ebook"
+
+# Bounds of a custom image resolution, in DPI.
+MIN_IMAGE_DPI = 30
+MAX_IMAGE_DPI = 1200
+
+# Documents with more pages are compressed as page-range segments of this
+# size in parallel. Fonts used in several segments are embedded once per
+# segment, so short documents are left whole.
+SEGMENT_PAGES = 150
+
+
+def ghostscript_path():
+    """Path of the Ghostscript executable, or None if it is not installed."""
+    return shutil.which('gs') or shutil.which('gswin64c.exe')
+
+
+def validate_profile(profile, image_dpi=None):
+    """
+    Checks a compression profile and custom image resolution.
+
+    Raises:
+        ValueError: If the profile is unknown or the resolution out of range.
+    """
+    if profile not in COMPRESSION_PROFILES:
+        raise ValueError(f"Unknown compression profile '{profile}', expected one of {COMPRESSION_PROFILES}")
+    if image_dpi is not None and not MIN_IMAGE_DPI <= int(image_dpi) <= MAX_IMAGE_DPI:
+        raise ValueError(f"Image DPI must be between {MIN_IMAGE_DPI} and {MAX_IMAGE_DPI}")
+
+
+def ghostscript_command(gs_path, input_path, output_path, profile=DEFAULT_PROFILE, image_dpi=None,
+                        first_page=None, last_page=None):
+    """
+    Builds the Ghostscript command line for one compression job.
+
+    Args:
+        profile (str): One of COMPRESSION_PROFILES.
+        image_dpi (int, optional): Downsample color and gray images to this
+            resolution instead of the profile's. Monochrome images (scanned
+            text) keep the profile's resolution.
+        first_page, last_page (int, optional): 1-based page range to write.
+    """
+    command = [
+        gs_path,
+        '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
+        f'-dPDFSETTINGS=/{profile}', '-dNOPAUSE', '-dQUIET', '-dBATCH',
+    ]
+    if image_dpi:
+        for kind in ("Color", "Gray"):
+            command += [f'-dDownsample{kind}Images=true', f'-d{kind}ImageResolution={int(image_dpi)}']
+    if first_page:
+        command += [f'-dFirstPage={first_page}', f'-dLastPage={last_page}']
+    command += [f'-sOutputFile={output_path}', input_path]
+    return command
+
+
+class _WorkerSlots:
+    """
+    Admits at most `limit` holders at a time. Unlike a semaphore, the limit
+    can be changed while slots are held; holders beyond a lowered limit
+    finish, and new ones wait until the count is below it again.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self._held = 0
+        self._changed = threading.Condition()
+
+    def set_limit(self, limit):
+        with self._changed:
+            self.limit = limit
+            self._changed.notify_all()
+
+    def __enter__(self):
+        with self._changed:
+            while self._held >= self.limit:
+                self._changed.wait()
+            self._held += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._changed:
+            self._held -= 1
+            self._changed.notify_all()
+
+
+class CompressionService:
+    """
+    Compresses PDFs with a bounded pool of Ghostscript processes.
+
+    Every document, and every segment of a long document, is one Ghostscript
+    run that has to take one of `workers` slots first, so concurrent
+    downloads share the CPUs instead of each starting its own process.
+    Documents longer than `segment_pages` are split into page ranges that
+    are compressed in parallel and merged. Without Ghostscript, PyPDF2
+    content stream compression is used.
+    """
+    def __init__(self, logger, workers=None, segment_pages=SEGMENT_PAGES):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            workers (int, optional): Ghostscript processes running at the same
+                time. Defaults to the number of usable CPUs.
+            segment_pages (int, optional): Page count above which a document is
+                compressed in segments; 0 disables segmenting.
+        """
+        self.logger = logger
+        self.workers = max(1, int(workers or available_cpus()))
+        self.segment_pages = segment_pages
+        self.gs_path = ghostscript_path()
+        self._slots = _WorkerSlots(self.workers)
+
+    def set_workers(self, workers):
+        """Changes the number of Ghostscript processes running at the same time, e.g. under memory pressure."""
+        self.workers = max(1, int(workers))
+        self._slots.set_limit(self.workers)
+
+    def compress_file(self, input_path, output_path, profile=DEFAULT_PROFILE, image_dpi=None):
+        """
+        Compresses `input_path` into `output_path`.
+
+        Returns:
+            tuple: `(path, stats)`. `path` is `output_path`, or `input_path` if
+            compression failed or did not make the file smaller. `stats` holds
+            the profile, sizes, ratio (output / input size), seconds and the
+            number of segments.
+        """
+        validate_profile(profile, image_dpi)
+        started = time.monotonic()
+        input_size = os.path.getsize(input_path)
+        segments = 1
+
+        if self.gs_path:
+            ranges = self._segment_ranges(input_path)
+            segments = len(ranges)
+            if segments > 1:
+                ok = self._compress_segments(input_path, output_path, ranges, profile, image_dpi)
+            else:
+                ok = self._run_ghostscript(ghostscript_command(
+                    self.gs_path, input_path, output_path, profile=profile, image_dpi=image_dpi
+                ))
+            method = "ghostscript"
+        else:
+            self.logger.warning("Ghostscript not found. Falling back to PyPDF2 compression (less effective).")
+            ok = self._compress_with_pypdf(input_path, output_path)
+            method = "pypdf"
+
+        path = output_path if ok else input_path
+        if ok and os.path.getsize(output_path) >= input_size:
+            self.logger.info("Compressed file is not smaller than the original, keeping the original.")
+            path = input_path
+
+        output_size = os.path.getsize(path)
+        stats = {
+            "method": method,
+            "profile": profile,
+            "image_dpi": image_dpi,
+            "segments": segments,
+            "input_mb": round(input_size / (1024 * 1024), 2),
+            "output_mb": round(output_size / (1024 * 1024), 2),
+            "ratio": round(output_size / input_size, 3) if input_size else 1.0,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        self.logger.info(
+            f"Compressed {stats['input_mb']:.2f} MB to {stats['output_mb']:.2f} MB "
+            f"({stats['ratio']:.0%}) in {stats['seconds']:.2f}s with profile '{profile}'"
+            + (f" at {image_dpi} DPI" if image_dpi else "")
+            + (f", {segments} segments" if segments > 1 else "")
+        )
+        return path, stats
+
+    def _segment_ranges(self, input_path):
+        """1-based inclusive page ranges to compress separately; one range for short documents."""
+        if not self.segment_pages:
+            return [(None, None)]
+        try:
+            total = count_pdf_pages(input_path)
+        except Exception as e:
+            self.logger.debug(f"Could not count pages ({e}), compressing the document whole")
+            return [(None, None)]
+        if total <= self.segment_pages or self.workers == 1:
+            return [(None, None)]
+        size = max(self.segment_pages, -(-total // self.workers))
+        return [(first, min(first + size - 1, total)) for first in range(1, total + 1, size)]
+
+    def _compress_segments(self, input_path, output_path, ranges, profile, image_dpi):
+        """Compresses the page ranges in parallel and merges them. Returns True on success."""
+        segment_paths = [f"{output_path}.{number:04d}.part" for number in range(len(ranges))]
+        commands = [
+            ghostscript_command(self.gs_path, input_path, segment_path, profile=profile, image_dpi=image_dpi,
+                                first_page=first, last_page=last)
+            for segment_path, (first, last) in zip(segment_paths, ranges)
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=len(commands), thread_name_prefix="gs-segment") as executor:
+                if not all(executor.map(self._run_ghostscript, commands)):
+                    return False
+            writer = PdfWriter()
+            streams = []
+            try:
+                for segment_path in segment_paths:
+                    stream = open(segment_path, "rb")
+                    streams.append(stream)
+                    writer.append(stream)
+                writer.write(output_path)
+            finally:
+                for stream in streams:
+                    stream.close()
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to merge the compressed segments: {e}")
+            return False
+        finally:
+            for segment_path in segment_paths:
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
+
+    def _run_ghostscript(self, command):
+        """Runs one Ghostscript job once a slot is free. Returns True on success."""
+        with self._slots:
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                self.logger.error("Ghostscript failed.")
+                self.logger.error(f"Stderr: {e.stderr}")
+                return False
+            except Exception as e:
+                self.logger.error(f"Error while compressing with Ghostscript: {e}")
+                return False
+        return True
+
+    def _compress_with_pypdf(self, input_path, output_path):
+        """Rewrites the document with compressed content streams. Returns True on success."""
+        try:
+            with open_reader_stream(input_path) as stream:
+                writer = PdfWriter()
+                for page in PdfReader(stream).pages:
+                    page.compress_content_streams()
+                    writer.add_page(page)
+                writer.write(output_path)
+            self.logger.info("PyPDF2 fallback compression finished.")
+            return True
+        except Exception as e:
+            self.logger.error(f"PyPDF2 compression failed: {e}")
+            return False
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def shared_compression_service(logger, workers=None):
+    """
+    The process-wide CompressionService, created on first use. `workers`
+    only takes effect on that first call.
+    """
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = CompressionService(logger, workers=workers)
+        return _shared_service
@@ -1,7 +1,17 @@
 import os
-from .metadata_fetcher import MetadataFetcher
-from .browser_handler import BrowserHandler
-from .pdf_processor import PDFProcessor
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from .asset_renderer import AssetRenderer, RENDERERS
+from .checkpoint import CHECKPOINT_CHUNK_PAGES
+from .compression import DEFAULT_PROFILE, shared_compression_service, validate_profile
+from .metadata_fetcher import SCRIBD_BASE_URL, MetadataFetcher, embed_url_for
+from .metrics import Tracer
+from .browser_handler import BrowserHandler, RENDERER_VERSION
+from .result_cache import ResultCache
+from .text_extractor import FORMAT_EXTENSIONS, OUTPUT_FORMATS, TextExtractor
+from .pdf_processor import PDFProcessor, count_pdf_pages
 from .utils import get_document_id_from_url, sanitize_filename
 
 class Downloader:
@@ -9,7 +19,11 @@ class Downloader:
     Orchestrates the document download process from Scribd, from
     metadata fetching, browser interaction, to PDF processing.
     """
-    def __init__(self, url_or_id, compress, clean, logger, output_dir="downloads"):
+    def __init__(self, url_or_id, compress, clean, logger, output_dir="downloads", browser_pool=None,
+                 progress_callback=None, load_strategy="events", cache=None, clean_workers=1,
+                 chunk_size=None, tabs=1, session=None, renderer="print", compress_profile=DEFAULT_PROFILE,
+                 image_dpi=None, checkpoints=None, trace_dir=None, base_url=SCRIBD_BASE_URL, network=None,
+                 output_format="pdf"):
         """
         Initializes the Downloader.
         
@@ -20,12 +34,127 @@ class Downloader:
             logger (Logger): The logger instance for logging messages.
             output_dir (str, optional): The directory to save the downloaded file. 
                                         Defaults to "downloads".
+            browser_pool (BrowserPool, optional): Pool of warm browsers to borrow
+                                        from instead of launching Chromium per document.
+            progress_callback (callable, optional): Called as `callback(stage=..., **counters)`
+                                        whenever the workflow advances.
+            load_strategy (str, optional): How pages are loaded in the browser: "events"
+                                        (in-page signals), "index" (only the page slots
+                                        that are still empty) or "scroll" (legacy fixed
+                                        sleeps).
+            cache (ResultCache, optional): Cache of finished downloads. When set, repeated
+                                        requests are served from it without rendering.
+            clean_workers (int, optional): Processes used for blank page detection.
+            chunk_size (int, optional): Print the document this many pages at a time
+                                        and merge the chunks; an interrupted render
+                                        resumes from the last finished chunk.
+            tabs (int, optional): Browser tabs that load and print disjoint page
+                                        ranges in parallel.
+            session (requests.Session, optional): Shared HTTP session for metadata
+                                        requests, reused across documents.
+            renderer (str, optional): "print" prints the laid-out document (default);
+                                        "assets" builds the PDF from the page images the
+                                        viewer downloads and prints only the other pages.
+                                        chunk_size and tabs apply to "print" only.
+            compress_profile (str, optional): Ghostscript quality preset: "screen",
+                                        "ebook" (default) or "printer".
+            image_dpi (int, optional): Downsample color and gray images to this
+                                        resolution instead of the profile's.
+            checkpoints (CheckpointStore, optional): Keep render chunks and the output
+                                        of every finished stage in a per-document work
+                                        directory, so a rerun after a failure resumes
+                                        there. Without chunk_size (and with one tab)
+                                        the render is chunked by CHECKPOINT_CHUNK_PAGES.
+            trace_dir (str, optional): Write a Chrome trace of every download into
+                                        this directory (see `trace_path`).
+            base_url (str, optional): Origin the embed page and metadata are
+                                        fetched from, e.g. a local stand-in server
+                                        for benchmarks.
+            network (NetworkPolicy, optional): Block trackers and non-content
+                                        requests and serve static viewer assets
+                                        from a shared cache while rendering. The
+                                        render stage then reports requests_blocked,
+                                        asset_cache_hits and bytes_saved.
+            output_format (str, optional): "pdf" (default), or "text", "json" or
+                                        "markdown" to read the text layers from the
+                                        viewer instead of printing (see TextExtractor).
+                                        Text output is neither cleaned nor compressed,
+                                        and ignores renderer, chunk_size and tabs.
         """
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer '{renderer}', expected one of {RENDERERS}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
+        validate_profile(compress_profile, image_dpi)
         self.url_or_id = url_or_id
         self.compress = compress
         self.clean = clean
         self.logger = logger
         self.output_dir = output_dir
+        self.browser_pool = browser_pool
+        self.progress_callback = progress_callback
+        self.load_strategy = load_strategy
+        self.cache = cache
+        self.clean_workers = clean_workers
+        self.chunk_size = chunk_size
+        self.tabs = tabs
+        self.session = session
+        self.renderer = renderer
+        self.compress_profile = compress_profile
+        self.image_dpi = image_dpi
+        self.checkpoints = checkpoints
+        self._checkpoint = None
+        self.trace_dir = trace_dir
+        self.base_url = base_url
+        self.network = network
+        self.output_format = output_format
+        # Request interception of the last render, when `network` is set.
+        self.request_filter = None
+        self.metadata = {}
+        # Wall time and peak memory per pipeline stage of the last download.
+        self.stage_stats = {}
+        # Spans of the last download; its trace file, if trace_dir is set.
+        self.tracer = Tracer(logger)
+        self.trace_path = None
+
+    def _report_progress(self, stage, **progress):
+        """Forwards stage and progress counters to the progress callback, if any."""
+        if self.progress_callback:
+            self.progress_callback(stage=stage, **progress)
+
+    @contextmanager
+    def _measure_stage(self, stage):
+        """
+        Records one pipeline stage as a span of `tracer` and its wall time,
+        peak RSS and counters in `stage_stats`. Yields the span.
+
+        The Python peak is process-wide; the subprocess peak is only reported
+        when a child (e.g. Ghostscript) set a new maximum during the stage.
+        """
+        span = None
+        try:
+            with self.tracer.span(stage, memory=True) as span:
+                yield span
+        finally:
+            if span is not None:
+                stats = {"seconds": round(span.duration, 2)}
+                for key in ("peak_rss_bytes", "subprocess_peak_rss_bytes"):
+                    if span.attrs.get(key):
+                        stats[key.replace("_bytes", "_mb")] = round(span.attrs[key] / (1024 * 1024), 1)
+                for key in ("pages", "bytes_in", "bytes_out", "round_trips"):
+                    if key in span.attrs:
+                        stats[key] = span.attrs[key]
+                self.stage_stats.setdefault(stage, {}).update(stats)
+
+    def _begin_run(self, doc_id):
+        """Resets `stage_stats` and starts the tracer of a new download of `doc_id`."""
+        self.stage_stats = {}
+        self.trace_path = None
+        if self.trace_dir:
+            self.trace_path = os.path.join(
+                self.trace_dir, f"{doc_id}-{time.strftime('%Y%m%d-%H%M%S')}.trace.json"
+            )
+        self.tracer = Tracer(self.logger, trace_path=self.trace_path, doc_id=doc_id)
 
     def run(self):
         """
@@ -43,48 +172,315 @@ class Downloader:
             return None
         self.logger.info(f"Successfully extracted Document ID: {doc_id}")
 
-        metadata_fetcher = MetadataFetcher(doc_id, self.logger)
-        metadata = metadata_fetcher.fetch()
+        if self.cache is None:
+            return self._download(doc_id)
+
+        started = time.monotonic()
+        entry = self.cache.get_or_create(self._cache_key(doc_id), lambda: self._download_for_cache(doc_id))
+        if not entry:
+            return None
+        output_path = self._deliver_cached(entry)
+        self.logger.info(f"Result ready at '{output_path}' after {(time.monotonic() - started) * 1000:.0f} ms")
+        return output_path
+
+    def from_cache(self):
+        """
+        Serves the document from the result cache without rendering anything.
+
+        Returns:
+            str: The path to the saved file, or None on a cache miss.
+        """
+        if self.cache is None:
+            return None
+        doc_id = get_document_id_from_url(self.url_or_id)
+        if not doc_id:
+            return None
+        entry = self.cache.get(self._cache_key(doc_id))
+        if not entry:
+            return None
+        self.logger.info(f"Cache hit for document {doc_id}")
+        return self._deliver_cached(entry)
+
+    def _cache_key(self, doc_id):
+        """Builds the result cache key from every option that changes the output."""
+        return ResultCache.make_key(
+            doc_id,
+            clean=self.clean,
+            compress=self.compress,
+            compress_profile=self.compress_profile if self.compress else None,
+            image_dpi=self.image_dpi if self.compress else None,
+            chunk_size=self.chunk_size,
+            tabs=self.tabs,
+            renderer=RENDERER_VERSION,
+            mode=self.renderer,
+            output_format=self.output_format
+        )
+
+    def _deliver_cached(self, entry):
+        """Places a cached file into the output directory under its document title."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, entry["filename"])
+        return self.cache.export(entry, output_path)
+
+    def _download_for_cache(self, doc_id):
+        """Runs a fresh download and returns `(path, metadata)` for the cache."""
+        output_path = self._download(doc_id)
+        if not output_path:
+            return None
+        return output_path, self._cache_metadata(doc_id, output_path)
+
+    def _cache_metadata(self, doc_id, output_path):
+        """Metadata stored next to a finished download (in any output format) in the result cache."""
+        return {
+            "doc_id": doc_id,
+            "title": self.metadata.get("title"),
+            "page_count": self.metadata.get("page_count"),
+            "filename": os.path.basename(output_path),
+            "extension": FORMAT_EXTENSIONS[self.output_format],
+        }
+
+    def _download(self, doc_id):
+        """
+        Fetches metadata, renders the document and post-processes the PDF.
+
+        Returns:
+            str: The path to the saved file, or None on failure.
+        """
+        self._begin_run(doc_id)
+        self._report_progress("metadata")
+        work_dir = output_path = None
+        try:
+            with self._measure_stage("metadata"):
+                metadata_fetcher = MetadataFetcher(doc_id, self.logger, session=self.session, base_url=self.base_url)
+                doc_title, page_count = self._apply_metadata(doc_id, metadata_fetcher.fetch())
+
+            work_dir = self._create_work_dir(doc_id)
+            browser_handler = self._browser_handler(doc_id, page_count)
+            current_path = self._run_stage("render", None, lambda _: browser_handler.get_pdf_from_url(
+                embed_url_for(doc_id, self.base_url), output_path=os.path.join(work_dir, self.render_filename())
+            ))
+            self._record_network_stats()
+            output_path = self._post_process(current_path, work_dir, doc_title)
+            return output_path
+        finally:
+            if work_dir:
+                self._release_work_dir(work_dir, succeeded=output_path is not None)
+            self.tracer.write_trace()
+
+    def _apply_metadata(self, doc_id, metadata):
+        """Stores fetched metadata and returns `(doc_title, page_count)`."""
+        self.metadata = metadata
 
         doc_title = metadata.get("title", f"scribd_document_{doc_id}")
         self.logger.info(f"Document Title: {doc_title}")
         page_count = metadata.get('page_count')
         self.logger.info(f"Page Count: {page_count if page_count else 'N/A'}")
+        self._report_progress("loading", page_count=int(page_count) if page_count else None)
+        return doc_title, page_count
+
+    def render_filename(self):
+        """Name of the render stage's output in the work directory."""
+        if self.output_format == "pdf":
+            return "rendered.pdf"
+        return "extracted" + FORMAT_EXTENSIONS[self.output_format]
+
+    def _browser_handler(self, doc_id, page_count):
+        """Creates the BrowserHandler (AssetRenderer, TextExtractor) that renders this document."""
+        self.request_filter = self.network.request_filter(self.tracer) if self.network else None
+        if self.output_format != "pdf":
+            return TextExtractor(
+                self.logger,
+                output_format=self.output_format,
+                title=self.metadata.get("title"),
+                page_count=page_count,
+                browser_pool=self.browser_pool,
+                progress_callback=self.progress_callback,
+                tracer=self.tracer,
+                request_filter=self.request_filter
+            )
+        if self.renderer == "assets":
+            return AssetRenderer(
+                self.logger,
+                page_count=page_count,
+                browser_pool=self.browser_pool,
+                progress_callback=self.progress_callback,
+                session=self.session,
+                tracer=self.tracer,
+                request_filter=self.request_filter
+            )
+        chunk_size = self.chunk_size
+        if self._checkpoint is not None:
+            chunk_dir = self._checkpoint.chunk_dir
+            if not chunk_size and self.tabs == 1:
+                chunk_size = CHECKPOINT_CHUNK_PAGES
+        else:
+            # Outside the per-run work directory so a crashed run can be resumed.
+            chunk_dir = os.path.join(self.output_dir, f".{doc_id}.chunks")
+        return BrowserHandler(
+            self.logger,
+            page_count=page_count,
+            browser_pool=self.browser_pool,
+            progress_callback=self.progress_callback,
+            load_strategy=self.load_strategy,
+            chunk_size=chunk_size,
+            chunk_dir=chunk_dir,
+            tabs=self.tabs,
+            tracer=self.tracer,
+            request_filter=self.request_filter
+        )
 
-        browser_handler = BrowserHandler(self.logger, page_count=page_count)
+    def _record_network_stats(self):
+        """Adds the request filter counters of the last render to its stage stats."""
+        if self.request_filter is not None and self.request_filter.stats["requests"]:
+            self.stage_stats.setdefault("render", {}).update(self.request_filter.stats)
 
-        embed_url = f"https://www.scribd.com/embeds/{doc_id}/content"
+    def _create_work_dir(self, doc_id):
+        """
+        Creates the work directory of one run.
 
-        pdf_bytes = browser_handler.get_pdf_from_url(embed_url)
+        Every stage reads the previous stage's file and writes a new one in the
+        work directory. Without checkpoints it is created inside output_dir;
+        with checkpoints, the document's checkpoint directory is the work
+        directory and may be on another filesystem (see _save).
+        """
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.logger.info(f"Directory '{self.output_dir}' created successfully.")
+        if self.checkpoints is not None:
+            self._checkpoint = self.checkpoints.open(doc_id)
+            return self._checkpoint.work_dir
+        return tempfile.mkdtemp(prefix=f".{doc_id}-", dir=self.output_dir)
 
-        if not pdf_bytes:
+    def _release_work_dir(self, work_dir, succeeded):
+        """Removes the work directory; a checkpoint is kept when the run failed."""
+        if self._checkpoint is not None:
+            self._checkpoint.release(succeeded)
+            self._checkpoint = None
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _stage_options(self, stage):
+        """Options the output of a checkpointed stage depends on."""
+        if stage == "render":
+            return {"renderer": RENDERER_VERSION, "mode": self.renderer, "load_strategy": self.load_strategy,
+                    "chunk_size": self.chunk_size, "tabs": self.tabs, "output_format": self.output_format}
+        if stage == "compress":
+            return {"profile": self.compress_profile, "image_dpi": self.image_dpi}
+        return {}
+
+    def _resume_stage(self, stage, input_path):
+        """Returns the checkpointed output of `stage` for `input_path`, or None if it has to run."""
+        if self._checkpoint is None:
+            return None
+        path = self._checkpoint.resume(stage, input_path, self._stage_options(stage))
+        if path:
+            self.logger.info(f"Resuming after stage '{stage}' from the checkpoint")
+            self.stage_stats[stage] = {"resumed": True}
+        return path
+
+    def _record_stage(self, stage, input_path, output_path):
+        """Checkpoints the output of a finished stage; failed stages (no new file) are not recorded."""
+        if self._checkpoint is not None and output_path and output_path != input_path:
+            self._checkpoint.record(stage, input_path, output_path, self._stage_options(stage))
+
+    def _run_stage(self, stage, input_path, run):
+        """
+        Runs one stage as `run(input_path)` and returns its output path. With
+        checkpoints, the output an earlier run left for the same input and
+        options is returned instead, and a new output is recorded.
+        """
+        resumed = self._resume_stage(stage, input_path)
+        if resumed:
+            return resumed
+        with self._measure_stage(stage) as span:
+            output_path = run(input_path)
+            if input_path:
+                span.set(bytes_in=os.path.getsize(input_path))
+            if output_path and os.path.exists(output_path):
+                span.set(bytes_out=os.path.getsize(output_path))
+        self._record_stage(stage, input_path, output_path)
+        return output_path
+
+    def _post_process(self, current_path, work_dir, doc_title):
+        """
+        Cleans and compresses the rendered PDF, then moves it into `output_dir`.
+        Extracted text is moved there as it is.
+
+        Returns:
+            str: The path to the saved file, or None if rendering failed.
+        """
+        if not current_path:
             self.logger.error("Failed to generate PDF from the browser. Halting process.")
             return None
+        if self.output_format != "pdf":
+            self.logger.info(f"Extracted the document text as {self.output_format}, saving it as is.")
+            self._report_progress("saving")
+            with self._measure_stage("save"):
+                return self._save(current_path, doc_title)
         self.logger.info("Successfully created PDF file from the browser.")
 
-        pdf_processor = PDFProcessor(self.logger)
-        processed_pdf = pdf_bytes
+        pdf_processor = PDFProcessor(self.logger, workers=self.clean_workers, tracer=self.tracer)
 
-        if self.clean:
+        if self.clean and self._has_expected_page_count(current_path):
+            self.logger.info("Rendered PDF has exactly the document's pages, skipping blank page removal.")
+            self.stage_stats["clean"] = {"skipped": True}
+        elif self.clean:
             self.logger.info("Starting blank page removal process...")
-            processed_pdf = pdf_processor.remove_blank_pages(processed_pdf)
+            self._report_progress("cleaning")
+            current_path = self._run_stage("clean", current_path, lambda path: pdf_processor.remove_blank_pages_file(
+                path, os.path.join(work_dir, "cleaned.pdf")
+            ))
         else:
             self.logger.info("Skipping blank page removal process.")
 
         if self.compress:
             self.logger.info("Starting PDF compression process...")
-            processed_pdf = pdf_processor.compress_pdf(processed_pdf)
+            self._report_progress("compressing")
+            current_path = self._run_stage("compress", current_path, lambda path: self._compress(path, work_dir))
         else:
             self.logger.info("Skipping PDF compression process.")
 
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-            self.logger.info(f"Directory '{self.output_dir}' created successfully.")
-        
-        safe_filename = sanitize_filename(doc_title) + ".pdf"
-        output_path = os.path.join(self.output_dir, safe_filename)
+        self._report_progress("saving")
+        with self._measure_stage("save"):
+            return self._save(current_path, doc_title)
+
+    def _has_expected_page_count(self, path):
+        """
+        Whether the rendered PDF has exactly the page count from the metadata.
+        Printed at their own size, the pages leave no blank filler pages, so
+        the blank page pass would only re-read the PDF.
+        """
+        page_count = self.metadata.get("page_count")
+        if not page_count or page_count == "N/A":
+            return False
+        try:
+            return count_pdf_pages(path) == int(page_count)
+        except Exception as e:
+            self.logger.debug(f"Could not count the pages of {path}: {e}")
+            return False
 
-        pdf_processor.save_pdf(processed_pdf, output_path)
+    def _compress(self, input_path, work_dir):
+        """Compresses with the shared CompressionService and keeps its report in `stage_stats`."""
+        output_path, self.stage_stats["compress"] = shared_compression_service(self.logger).compress_file(
+            input_path, os.path.join(work_dir, "compressed.pdf"),
+            profile=self.compress_profile, image_dpi=self.image_dpi
+        )
+        return output_path
+
+    def _save(self, current_path, doc_title):
+        """
+        Moves the finished file into `output_dir` under the document title.
+
+        Returns:
+            str: The path to the saved file.
+        """
+        safe_filename = sanitize_filename(doc_title) + FORMAT_EXTENSIONS[self.output_format]
+        output_path = os.path.join(self.output_dir, safe_filename)
+        # The work dir may sit on another filesystem (CHECKPOINT_DIR), where a
+        # rename fails: move next to the target first, then replace atomically.
+        part_path = output_path + ".part"
+        shutil.move(current_path, part_path)
+        os.replace(part_path, output_path)
 
         file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
         self.logger.info("="*50)
@@ -92,5 +488,5 @@ class Downloader:
         self.logger.info(f"File saved successfully at: {output_path}")
         self.logger.info(f"File Size: {file_size_mb:.2f} MB")
         self.logger.info("="*50)
-        
-        return output_path
\ No newline at end of file
+
+        return output_path
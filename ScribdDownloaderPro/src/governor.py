@@ -0,0 +1,203 @@
+import threading
+import time
+from . import sysinfo
+from .metrics import registry
+
+
+class ConcurrencyGovernor:
+    """
+    Adapts the number of concurrent renders and post-processing workers to
+    the memory and CPU pressure of the container.
+
+    Every `interval` seconds it samples the memory in use against the
+    cgroup (or host) limit and the CPU time used against the CPU quota,
+    both read from /proc and the cgroup files (see sysinfo), and then:
+
+    - at `memory_critical` it pauses the scheduler (running jobs finish,
+      none start), recycles the heaviest browser of the pool and lowers
+      the render workers;
+    - at `memory_high` it lowers the render workers, and under `cpu_high`
+      the post-processing workers (Ghostscript processes, clean processes),
+      then the render workers once those are at one;
+    - below `memory_low` and `cpu_low` it raises both again, up to their
+      maximum, and a paused scheduler resumes once memory is back under
+      `memory_high`.
+
+    Workers change by one at a time and at most once per `cooldown`
+    seconds, so a single spike does not swing them. Every decision is
+    logged and counted, and the samples and current limits are published
+    as gauges on the metrics registry.
+    """
+    def __init__(self, logger, scheduler, browser_pool=None, compression=None, min_workers=1, max_workers=None,
+                 max_post_workers=None, interval=5.0, cooldown=15.0, memory_low=0.6, memory_high=0.8,
+                 memory_critical=0.9, cpu_low=0.6, cpu_high=0.9, metrics=registry):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            scheduler (JobScheduler): Whose workers are the concurrent renders.
+            browser_pool (BrowserPool, optional): Pool whose heaviest browser
+                is recycled under critical memory pressure.
+            compression (CompressionService, optional): Whose Ghostscript
+                processes follow the post-processing workers.
+            min_workers (int, optional): Fewest concurrent renders.
+            max_workers (int, optional): Most concurrent renders. Defaults to
+                the scheduler's `max_workers`.
+            max_post_workers (int, optional): Most post-processing workers.
+                Defaults to the compression service's workers, else the CPUs.
+            interval (float, optional): Seconds between two samples.
+            cooldown (float, optional): Seconds between two worker changes,
+                and between two browser recycles.
+            memory_low, memory_high, memory_critical (float, optional): Shares
+                of the memory limit in use that raise, lower and pause.
+            cpu_low, cpu_high (float, optional): Shares of the CPU quota in use
+                that raise and lower.
+            metrics (MetricsRegistry, optional): Registry the gauges are set on.
+        """
+        self.logger = logger
+        self.scheduler = scheduler
+        self.browser_pool = browser_pool
+        self.compression = compression
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or scheduler.max_workers)
+        self.max_post_workers = max(1, max_post_workers or (compression.workers if compression
+                                                            else round(sysinfo.cpu_limit())))
+        self.render_workers = max(self.min_workers, min(self.max_workers, scheduler.workers))
+        self.post_workers = self.max_post_workers
+        self.interval = interval
+        self.cooldown = cooldown
+        self.memory_low = memory_low
+        self.memory_high = memory_high
+        self.memory_critical = memory_critical
+        self.cpu_low = cpu_low
+        self.cpu_high = cpu_high
+        self.metrics = metrics
+        self.paused = False
+        self.last_sample = {}
+        self.decisions = {}
+        self._last_cpu = None
+        self._last_resize = float("-inf")
+        self._last_recycle = float("-inf")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Samples and adjusts on a background thread until `stop`."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="concurrency-governor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.warning(f"Concurrency governor step failed: {e}")
+
+    def sample(self):
+        """
+        Returns:
+            dict: `memory_ratio` (memory in use / limit) and `cpu_ratio` (CPU
+                time / wall time / CPU quota since the previous sample); None
+                where it cannot be read yet.
+        """
+        memory = sysinfo.memory_usage()
+        now, cpu = time.monotonic(), sysinfo.cpu_time()
+        cpu_ratio = None
+        if cpu is not None and self._last_cpu is not None and now > self._last_cpu[0]:
+            cpu_ratio = (cpu - self._last_cpu[1]) / (now - self._last_cpu[0]) / sysinfo.cpu_limit()
+        self._last_cpu = (now, cpu) if cpu is not None else None
+        return {
+            "memory_ratio": round(memory[0] / memory[1], 3) if memory and memory[1] else None,
+            "memory_used_mb": round(memory[0] / (1024 * 1024)) if memory else None,
+            "cpu_ratio": round(cpu_ratio, 3) if cpu_ratio is not None else None,
+        }
+
+    def step(self):
+        """Takes one sample and applies the decisions it calls for."""
+        sample = self.last_sample = self.sample()
+        memory, cpu = sample["memory_ratio"], sample["cpu_ratio"]
+        now = time.monotonic()
+
+        if memory is not None and memory >= self.memory_critical:
+            reason = f"memory at {memory:.0%}"
+            if not self.paused:
+                self.scheduler.pause()
+                self.paused = True
+                self._decide("pause", reason)
+            if self.browser_pool is not None and now - self._last_recycle >= self.cooldown:
+                recycled = self.browser_pool.recycle_heaviest()
+                if recycled:
+                    self._last_recycle = now
+                    self._decide("recycle", f"{reason}, slot {recycled[0]} uses {recycled[1] / (1024 * 1024):.0f} MB")
+            self._resize(now, render=-1, reason=reason)
+        else:
+            if self.paused and (memory is None or memory < self.memory_high):
+                self.scheduler.resume()
+                self.paused = False
+                self._decide("resume", f"memory at {memory:.0%}" if memory is not None else "memory unknown")
+            if memory is not None and memory >= self.memory_high:
+                self._resize(now, render=-1, reason=f"memory at {memory:.0%}")
+            elif cpu is not None and cpu >= self.cpu_high:
+                if self.post_workers > 1:
+                    self._resize(now, post=-1, reason=f"CPU at {cpu:.0%}")
+                else:
+                    self._resize(now, render=-1, reason=f"CPU at {cpu:.0%}")
+            elif (memory is not None and memory < self.memory_low) and (cpu is None or cpu < self.cpu_low):
+                self._resize(now, render=1, post=1, reason=f"memory at {memory:.0%}, CPU "
+                             + (f"at {cpu:.0%}" if cpu is not None else "unknown"))
+        self._publish()
+        return sample
+
+    def _resize(self, now, render=0, post=0, reason=""):
+        """Moves the worker counts by the given steps within their bounds, once per cooldown."""
+        if now - self._last_resize < self.cooldown:
+            return
+        render_workers = max(self.min_workers, min(self.max_workers, self.render_workers + render))
+        post_workers = max(1, min(self.max_post_workers, self.post_workers + post))
+        if render_workers == self.render_workers and post_workers == self.post_workers:
+            return
+        self._last_resize = now
+        if render_workers != self.render_workers:
+            self.render_workers = self.scheduler.set_workers(render_workers)
+        if post_workers != self.post_workers:
+            self.post_workers = post_workers
+            if self.compression is not None:
+                self.compression.set_workers(post_workers)
+        action = "scale_down" if render + post < 0 else "scale_up"
+        self._decide(action, f"{reason}: {self.render_workers} renders, {self.post_workers} post-processing workers")
+
+    def _decide(self, action, reason):
+        self.decisions[action] = self.decisions.get(action, 0) + 1
+        log = self.logger.warning if action in ("pause", "recycle") else self.logger.info
+        log(f"Concurrency governor: {action} ({reason})")
+
+    def _publish(self):
+        if self.metrics is None:
+            return
+        sample = self.last_sample
+        if sample.get("memory_ratio") is not None:
+            self.metrics.set_gauge("sdp_memory_pressure", sample["memory_ratio"], "Share of the memory limit in use.")
+        if sample.get("cpu_ratio") is not None:
+            self.metrics.set_gauge("sdp_cpu_pressure", sample["cpu_ratio"], "Share of the CPU quota in use.")
+        self.metrics.set_gauge("sdp_governor_render_workers", self.render_workers, "Concurrent renders allowed.")
+        self.metrics.set_gauge("sdp_governor_post_workers", self.post_workers, "Post-processing workers allowed.")
+        self.metrics.set_gauge("sdp_governor_paused", int(self.paused), "1 while new renders are paused.")
+        for action, count in self.decisions.items():
+            self.metrics.set_gauge("sdp_governor_decisions", count, "Governor decisions since start.", action=action)
+
+    def stats(self):
+        """Current limits, the last sample and the decisions taken so far."""
+        return {
+            "render_workers": self.render_workers,
+            "post_workers": self.post_workers,
+            "paused": self.paused,
+            "sample": dict(self.last_sample),
+            "decisions": dict(self.decisions),
+        }
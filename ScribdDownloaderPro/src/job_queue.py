@@ -0,0 +1,132 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """
+    State of one queued download, updated by the worker that runs it.
+    """
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, **progress):
+        """
+        Records the current stage and progress counters of the job.
+
+        Args:
+            stage (str, optional): Name of the stage being executed.
+            **progress: Counters such as `pages_loaded` or `page_count`.
+        """
+        with self._lock:
+            if stage:
+                self.stage = stage
+            self.progress.update(progress)
+
+    def to_dict(self):
+        """Returns a JSON-serializable snapshot of the job."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    """
+    Runs download jobs on a fixed number of background worker slots so that
+    request threads only enqueue work and return immediately.
+    """
+    def __init__(self, logger, workers=2, max_finished_jobs=500):
+        """
+        Initializes the queue.
+
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            workers (int, optional): Number of jobs executed concurrently.
+            max_finished_jobs (int, optional): Finished jobs kept for status
+                polling before the oldest ones are forgotten.
+        """
+        self.logger = logger
+        self.workers = workers
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download-job")
+
+    def submit(self, func, **params):
+        """
+        Enqueues `func(job, **params)` and returns the job right away.
+
+        Args:
+            func (callable): Work to run. Its return value becomes the job result.
+            **params: Keyword arguments passed to `func` and kept on the job.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        self.logger.info(f"Job {job.id} queued")
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None if it is unknown."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Returns the number of jobs per status and the worker count."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {"queued": 0, "running": 0, "finished": 0, "failed": 0}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "jobs": counts}
+
+    def shutdown(self, wait=False):
+        """Stops accepting jobs; queued jobs are cancelled unless `wait` is set."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _run(self, job, func):
+        job.status = "running"
+        job.started_at = time.time()
+        job.update(stage="starting")
+        try:
+            job.result = func(job, **job.params)
+            job.status = "finished"
+            job.update(stage="done")
+        except Exception as e:
+            self.logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+            job.update(stage="failed")
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.id]
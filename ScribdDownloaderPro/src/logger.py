@@ -1,13 +1,31 @@
+import json
 import logging
 import sys
 
-def setup_logger(name="ScribdDownloader", level="INFO"):
+class JsonFormatter(logging.Formatter):
+    """Menulis setiap record sebagai satu objek JSON; record span membawa field span-nya."""
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        span = getattr(record, "span", None)
+        if span:
+            data.update(span)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+def setup_logger(name="ScribdDownloader", level="INFO", json_format=False):
     """
     Mengkonfigurasi dan mengembalikan sebuah logger.
 
     Args:
         name (str): Nama logger.
         level (str): Level logging (DEBUG, INFO, WARNING, ERROR).
+        json_format (bool): Tulis log sebagai JSON per baris (lihat src/metrics.py
+            untuk field span), bukan teks biasa.
 
     Returns:
         logging.Logger: Instance logger yang sudah dikonfigurasi.
@@ -23,10 +41,13 @@ def setup_logger(name="ScribdDownloader", level="INFO"):
     handler = logging.StreamHandler(sys.stdout)
     handler.setLevel(log_level)
 
-    formatter = logging.Formatter(
-        '%(asctime)s - [%(levelname)s] - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - [%(levelname)s] - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
     handler.setFormatter(formatter)
 
     logger.addHandler(handler)
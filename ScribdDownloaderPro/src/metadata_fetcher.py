@@ -1,19 +1,190 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
 
+try:
+    import aiohttp
+except ImportError:  # AsyncMetadataFetcher falls back to requests in a thread
+    aiohttp = None
+
+SCRIBD_BASE_URL = "https://www.scribd.com"
+
+# (connect, read) dalam detik untuk setiap permintaan metadata.
+DEFAULT_TIMEOUT = (5, 20)
+
+# Status yang dicoba ulang dengan jeda eksponensial (backoff).
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Satu pola untuk kedua field, sehingga HTML cukup dipindai sekali.
+METADATA_PATTERN = re.compile(r'"title"\s*:\s*"(.*?)"|"page_count"\s*:\s*(\d+)')
+
+def create_session(pool_size=10, retries=3, backoff=0.5):
+    """
+    Membuat requests.Session yang bisa dipakai bersama oleh banyak unduhan
+    (dan banyak thread), sehingga koneksi ke Scribd digunakan ulang.
+
+    Args:
+        pool_size (int): Jumlah koneksi yang disimpan per host.
+        retries (int): Jumlah percobaan ulang untuk kegagalan koneksi dan
+            status sementara (429/5xx).
+        backoff (float): Faktor jeda eksponensial antar percobaan, dalam detik.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def shared_session():
+    """Session bawaan yang dipakai MetadataFetcher bila tidak diberi session."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
+def create_async_session(pool_size=10):
+    """
+    Membuat aiohttp.ClientSession bersama untuk AsyncMetadataFetcher. Harus
+    dipanggil di dalam event loop yang sedang berjalan.
+
+    Returns:
+        aiohttp.ClientSession: Session baru, atau None bila aiohttp tidak terpasang.
+    """
+    if aiohttp is None:
+        return None
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=pool_size))
+
+def embed_url_for(doc_id, base_url=SCRIBD_BASE_URL):
+    """Mengembalikan URL halaman embed Scribd untuk sebuah ID dokumen."""
+    return f"{base_url}/embeds/{doc_id}/content"
+
+def parse_metadata(content, logger):
+    """
+    Mengekstrak metadata dari HTML halaman embed dalam satu kali pindai yang
+    berhenti begitu judul dan jumlah halaman ditemukan.
+
+    Returns:
+        dict: Sebuah dictionary berisi metadata (title, page_count).
+    """
+    title = page_count = None
+    for match in METADATA_PATTERN.finditer(content):
+        if match.group(1) is not None:
+            if title is None:
+                title = match.group(1).strip()
+        elif page_count is None:
+            page_count = match.group(2)
+        if title is not None and page_count is not None:
+            break
+
+    if not page_count:
+         logger.warning("Jumlah halaman tidak ditemukan.")
+    if not title:
+        logger.warning("Judul dokumen tidak ditemukan, akan menggunakan nama default.")
+
+    return {
+        "title": title,
+        "page_count": page_count
+    }
+
+class MetadataCache:
+    """
+    Cache metadata (title, page_count) di memori, dengan kunci doc_id.
+    Entri kedaluwarsa setelah `ttl_seconds`; bila penuh, entri yang paling
+    lama tidak dipakai dibuang lebih dulu. Aman dipakai banyak thread.
+    """
+    def __init__(self, max_entries=1024, ttl_seconds=6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doc_id):
+        """Mengembalikan salinan metadata yang masih berlaku, atau None."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(doc_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(doc_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, doc_id, metadata):
+        with self._lock:
+            self._entries[doc_id] = (time.monotonic(), dict(metadata))
+            self._entries.move_to_end(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Cache bawaan yang dibagi semua MetadataFetcher dalam satu proses.
+metadata_cache = MetadataCache()
+
 class MetadataFetcher:
     """
     Mengambil metadata dokumen (seperti judul dan jumlah halaman) dari
     halaman embed Scribd menggunakan requests.
     """
-    def __init__(self, doc_id, logger):
+    def __init__(self, doc_id, logger, session=None, cache=None, timeout=DEFAULT_TIMEOUT,
+                 base_url=SCRIBD_BASE_URL):
+        """
+        Args:
+            session (requests.Session, optional): Session bersama (lihat
+                create_session). Bawaan: shared_session().
+            cache (MetadataCache, optional): Cache metadata. Bawaan: metadata_cache;
+                berikan False untuk selalu mengambil dari jaringan.
+            timeout (tuple, optional): Timeout (connect, read) dalam detik.
+            base_url (str, optional): Host halaman embed, misalnya server tiruan
+                untuk benchmark.
+        """
         self.doc_id = doc_id
         self.logger = logger
-        self.embed_url = f"https://www.scribd.com/embeds/{self.doc_id}/content"
+        self.session = session or shared_session()
+        self.cache = metadata_cache if cache is None else (cache or None)
+        self.timeout = timeout
+        self.embed_url = embed_url_for(self.doc_id, base_url)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
         }
 
+    def _cached(self):
+        metadata = self.cache.get(self.doc_id) if self.cache is not None else None
+        if metadata is not None:
+            self.logger.info("Metadata dokumen diambil dari cache.")
+        return metadata
+
+    def _remember(self, metadata):
+        # Hasil tanpa jumlah halaman tidak disimpan agar dicoba lagi lain kali.
+        if self.cache is not None and metadata.get("page_count"):
+            self.cache.put(self.doc_id, metadata)
+        return metadata
+
     def fetch(self):
         """
         Mengambil konten halaman dan mengekstrak metadata.
@@ -21,29 +192,78 @@ class MetadataFetcher:
         Returns:
             dict: Sebuah dictionary berisi metadata (title, page_count).
         """
+        metadata = self._cached()
+        if metadata is not None:
+            return metadata
+
         self.logger.info("Mengambil metadata dokumen...")
         try:
-            response = requests.get(self.embed_url, headers=self.headers, allow_redirects=True)
+            response = self.session.get(
+                self.embed_url, headers=self.headers, allow_redirects=True, timeout=self.timeout
+            )
             response.raise_for_status()
+            return self._remember(parse_metadata(response.text, self.logger))
+        except requests.RequestException as e:
+            self.logger.error(f"Gagal mengambil metadata dari {self.embed_url}: {e}")
+            return {}
 
-            content = response.text
+class AsyncMetadataFetcher(MetadataFetcher):
+    """
+    Varian asyncio dari MetadataFetcher. Memakai aiohttp bila terpasang;
+    tanpa aiohttp, fetch() yang blocking dijalankan di thread terpisah agar
+    event loop tidak tertahan.
+    """
+    def __init__(self, doc_id, logger, session=None, cache=None, timeout=DEFAULT_TIMEOUT,
+                 base_url=SCRIBD_BASE_URL, retries=3, backoff=0.5):
+        super().__init__(doc_id, logger, cache=cache, timeout=timeout, base_url=base_url)
+        # aiohttp.ClientSession bersama (lihat create_async_session).
+        self.client_session = session
+        self.retries = retries
+        self.backoff = backoff
 
-            title_match = re.search(r'"title"\s*:\s*"(.*?)"', content)
+    async def fetch_async(self):
+        """
+        Mengambil konten halaman dan mengekstrak metadata tanpa memblokir event loop.
 
-            page_count_match = re.search(r'"page_count"\s*:\s*(\d+)', content)
+        Returns:
+            dict: Sebuah dictionary berisi metadata (title, page_count).
+        """
+        if aiohttp is None:
+            return await asyncio.to_thread(self.fetch)
 
-            title = title_match.group(1).strip() if title_match else None
-            page_count = page_count_match.group(1) if page_count_match else None
+        metadata = self._cached()
+        if metadata is not None:
+            return metadata
 
-            if not page_count:
-                 self.logger.warning("Jumlah halaman tidak ditemukan.")
-            if not title:
-                self.logger.warning("Judul dokumen tidak ditemukan, akan menggunakan nama default.")
-            
-            return {
-                "title": title,
-                "page_count": page_count
-            }
-        except requests.RequestException as e:
+        self.logger.info("Mengambil metadata dokumen...")
+        try:
+            if self.client_session is not None:
+                return self._remember(await self._get_with_retry(self.client_session))
+            async with aiohttp.ClientSession() as session:
+                return self._remember(await self._get_with_retry(session))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             self.logger.error(f"Gagal mengambil metadata dari {self.embed_url}: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    async def _get_with_retry(self, session):
+        """Sama dengan Retry pada create_session: coba ulang kegagalan koneksi dan status 429/5xx."""
+        connect, read = self.timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(
+                    self.embed_url, headers=self.headers, allow_redirects=True, timeout=timeout
+                ) as response:
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status
+                        )
+                    response.raise_for_status()
+                    return parse_metadata(await response.text(), self.logger)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+                if attempt >= self.retries or not retryable:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                self.logger.debug(f"Permintaan metadata gagal ({e}), mencoba lagi dalam {delay:.1f} detik...")
+                await asyncio.sleep(delay)
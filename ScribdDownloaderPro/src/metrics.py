@@ -0,0 +1,296 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from . import sysinfo
+
+# Upper bounds of the duration histogram buckets, in seconds.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Upper bounds of the peak memory histogram buckets, in bytes.
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (64, 128, 256, 512, 1024, 2048, 4096, 8192))
+
+# Page methods that cost one round trip to the browser (see Tracer.instrument_page).
+ROUND_TRIP_METHODS = (
+    "goto", "evaluate", "wait_for_function", "wait_for_selector", "wait_for_timeout",
+    "wait_for_load_state", "add_style_tag", "emulate_media", "pdf",
+)
+
+# Span counters that are added to the enclosing span of the same thread.
+_ROLLED_UP = ("round_trips", "requests_blocked", "asset_cache_hits", "bytes_saved")
+
+
+class Histogram:
+    """A Prometheus-style cumulative histogram."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """
+    Aggregates finished spans into histograms and counters per span name
+    and renders them in the Prometheus text format.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._memory = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, span):
+        """Adds a finished span."""
+        with self._lock:
+            self._durations.setdefault(span.name, Histogram(DURATION_BUCKETS)).observe(span.duration)
+            if span.attrs.get("peak_rss_bytes"):
+                self._memory.setdefault(span.name, Histogram(MEMORY_BUCKETS)).observe(span.attrs["peak_rss_bytes"])
+            for counter in ("pages", "bytes_in", "bytes_out", "round_trips", "requests_blocked", "asset_cache_hits",
+                            "bytes_saved"):
+                if span.attrs.get(counter):
+                    key = (counter, span.name)
+                    self._counters[key] = self._counters.get(key, 0) + span.attrs[counter]
+            if span.error:
+                key = ("errors", span.name)
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def set_gauge(self, name, value, help_text, **labels):
+        """Sets a gauge reported next to the span metrics, e.g. pool utilisation."""
+        with self._lock:
+            self._gauges.setdefault(name, [help_text, {}])[1][tuple(sorted(labels.items()))] = value
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, "sdp_span_duration_seconds",
+                                    "Wall time of a download stage or step.", self._durations)
+            self._render_histograms(lines, "sdp_span_peak_rss_bytes",
+                                    "Peak resident memory of the process during a stage.", self._memory)
+            for counter, help_text in (
+                ("pages", "Pages processed."),
+                ("bytes_in", "Bytes read by a stage."),
+                ("bytes_out", "Bytes written by a stage."),
+                ("round_trips", "Browser round trips."),
+                ("requests_blocked", "Viewer requests blocked by the request filter."),
+                ("asset_cache_hits", "Viewer assets served from the asset cache."),
+                ("bytes_saved", "Bytes served from the asset cache instead of the network."),
+                ("errors", "Spans that ended with an exception."),
+            ):
+                name = f"sdp_span_{counter}_total"
+                values = {span: value for (kind, span), value in sorted(self._counters.items()) if kind == counter}
+                if not values:
+                    continue
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{span="{span}"}} {value}' for span, value in values.items()]
+            for name, (help_text, series) in sorted(self._gauges.items()):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                for labels, value in series.items():
+                    label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, histograms):
+        if not histograms:
+            return
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for span, histogram in sorted(histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{span="{span}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{span="{span}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{span="{span}"}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{span="{span}"}} {histogram.count}')
+
+
+# Process-wide registry behind the /metrics endpoint.
+registry = MetricsRegistry()
+
+
+class Span:
+    """One timed step, with counters such as pages, bytes and round trips."""
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = {key: value for key, value in attrs.items() if value is not None}
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.error = None
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attrs):
+        """Sets attributes; None values are ignored."""
+        self.attrs.update({key: value for key, value in attrs.items() if value is not None})
+
+    def add(self, counter, value=1):
+        self.attrs[counter] = self.attrs.get(counter, 0) + value
+
+    def to_dict(self):
+        data = {"span": self.name, "duration_s": round(self.duration, 4), **self.attrs}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Tracer:
+    """
+    Records the spans of one download.
+
+    Every finished span is logged as a structured record (see
+    setup_logger(json_format=True)), added to the metrics registry and,
+    when `trace_path` is set, kept for a Chrome trace file
+    (chrome://tracing or ui.perfetto.dev) written by `write_trace`. Spans
+    nest per thread.
+    """
+    def __init__(self, logger, trace_path=None, metrics=None, **context):
+        """
+        Args:
+            logger (Logger): The logger instance the spans are logged to.
+            trace_path (str, optional): Where `write_trace` writes the trace.
+            metrics (MetricsRegistry, optional): Defaults to the process-wide registry.
+            **context: Attributes logged with every span, e.g. doc_id.
+        """
+        self.logger = logger
+        self.trace_path = trace_path
+        self.metrics = metrics or registry
+        self.context = context
+        self.spans = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """The innermost open span of the calling thread, or None."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, memory=False, **attrs):
+        """
+        Times the enclosed block as a span named `name`.
+
+        Args:
+            memory (bool, optional): Also record the peak RSS of the process and
+                of waited-for children during the span. The peak counter is
+                process-wide and reset by every such span, so only use it for
+                top-level stages.
+        """
+        stack = self._stack()
+        span = Span(name, parent=stack[-1] if stack else None, **attrs)
+        if memory:
+            sysinfo.reset_peak_rss()
+            children_before = sysinfo.children_peak_rss() or 0
+        started = time.monotonic()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            span.duration = time.monotonic() - started
+            if memory:
+                span.set(peak_rss_bytes=sysinfo.peak_rss())
+                children_peak = sysinfo.children_peak_rss() or 0
+                if children_peak > children_before:
+                    span.set(subprocess_peak_rss_bytes=children_peak)
+            if span.parent is not None:
+                for counter in _ROLLED_UP:
+                    if span.attrs.get(counter):
+                        span.parent.add(counter, span.attrs[counter])
+            self._finish(span)
+
+    def _finish(self, span):
+        self.metrics.observe(span)
+        if self.trace_path:
+            with self._lock:
+                self.spans.append(span)
+        data = dict(self.context, **span.to_dict())
+        details = ", ".join(f"{key}={value}" for key, value in span.attrs.items())
+        self.logger.info(
+            f"Span '{span.name}' finished in {span.duration:.2f}s" + (f" ({details})" if details else ""),
+            extra={"span": data}
+        )
+
+    def count_round_trip(self):
+        """Counts one browser round trip in the innermost span of the calling thread."""
+        span = self.current()
+        if span is not None:
+            span.add("round_trips")
+
+    def instrument_page(self, page):
+        """
+        Counts the round trips of `page` (see ROUND_TRIP_METHODS) in the span
+        that is open when they are made. The page object itself is kept, so
+        it can still be passed to Playwright APIs.
+        """
+        for method_name in ROUND_TRIP_METHODS:
+            method = getattr(page, method_name, None)
+            if method is None:
+                continue
+
+            @functools.wraps(method)
+            def counted(*args, _method=method, **kwargs):
+                self.count_round_trip()
+                return _method(*args, **kwargs)
+
+            setattr(page, method_name, counted)
+        return page
+
+    def write_trace(self):
+        """
+        Writes the recorded spans as a Chrome trace to `trace_path`.
+
+        Returns:
+            str: The trace path, or None when tracing is off.
+        """
+        if not self.trace_path:
+            return None
+        with self._lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": span.name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": int(span.started_at * 1e6),
+                "dur": int(span.duration * 1e6),
+                "pid": os.getpid(),
+                "tid": span.thread_id,
+                "args": span.to_dict(),
+            }
+            for span in sorted(spans, key=lambda span: span.started_at)
+        ]
+        os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+        with open(self.trace_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "metadata": self.context}, f)
+        os.replace(self.trace_path + ".tmp", self.trace_path)
+        self.logger.info(f"Trace written to '{self.trace_path}'")
+        return self.trace_path
+
+
+def traced(name):
+    """Records every call of a method as a span of `self.tracer`."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Resource types the viewer does not need to lay out and print a document.
+BLOCKED_RESOURCE_TYPES = ("media", "websocket", "eventsource", "manifest", "texttrack", "ping")
+
+# Analytics, tracking and ad hosts; subdomains are blocked too.
+BLOCKED_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com", "doubleclick.net",
+    "googlesyndication.com", "googleadservices.com", "adservice.google.com", "amazon-adsystem.com",
+    "adnxs.com", "facebook.net", "connect.facebook.com", "scorecardresearch.com", "quantserve.com",
+    "quantcount.com", "chartbeat.com", "chartbeat.net", "hotjar.com", "newrelic.com", "nr-data.net",
+    "segment.io", "segment.com", "optimizely.com", "branch.io", "braze.com", "taboola.com",
+    "outbrain.com", "criteo.com", "criteo.net", "pubmatic.com", "rubiconproject.com", "moatads.com",
+)
+
+# Static viewer assets kept in the AssetCache. Page images are document
+# content, usually unique per document, and are always fetched.
+CACHED_RESOURCE_TYPES = ("script", "stylesheet", "font")
+
+# Larger responses are passed through without caching.
+MAX_CACHED_ASSET_BYTES = 8 * 1024 * 1024
+
+# Response headers that do not describe the stored (already decoded) body.
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie")
+
+
+def _is_cacheable(headers):
+    cache_control = headers.get("cache-control", "").lower()
+    return "no-store" not in cache_control and "private" not in cache_control
+
+
+class AssetCache:
+    """
+    Static viewer assets (scripts, stylesheets, fonts) on disk, keyed by URL.
+
+    Every browser context starts with an empty HTTP cache, so without this
+    the viewer downloads the same bundles and fonts for every document. The
+    files are written atomically and can be shared by several processes.
+    Entries older than `max_age_hours` are ignored, and the least recently
+    used are removed once all of them together grow past `max_size_mb`.
+    """
+    def __init__(self, root, logger, max_size_mb=256, max_age_hours=168):
+        """
+        Args:
+            root (str): Directory of the cached assets.
+            logger (Logger): The logger instance for logging messages.
+            max_size_mb (int, optional): Total size before the least recently
+                used assets are removed.
+            max_age_hours (float, optional): Age after which an asset is fetched again.
+        """
+        self.root = root
+        self.logger = logger
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.max_age_seconds = max_age_hours * 3600
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, url):
+        """
+        Returns:
+            tuple: `(headers, body)` of the cached asset, or None.
+        """
+        path = self._path(url)
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if time.time() - meta["stored_at"] > self.max_age_seconds:
+                return None
+            with open(path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return meta["headers"], body
+
+    def put(self, url, headers, body):
+        """Stores an asset; the body is written before its metadata so readers never see half an entry."""
+        if len(body) > MAX_CACHED_ASSET_BYTES:
+            return
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        headers = {key: value for key, value in headers.items() if key.lower() not in _DROPPED_HEADERS}
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path + tmp_suffix, "wb") as f:
+            f.write(body)
+        os.replace(path + tmp_suffix, path)
+        with open(path + ".json" + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "headers": headers, "stored_at": time.time()}, f)
+        os.replace(path + ".json" + tmp_suffix, path + ".json")
+        with self._lock:
+            self._size += len(body)
+            over_budget = self._size > self.max_size_bytes
+        if over_budget:
+            self.evict()
+
+    def _entries(self):
+        """`(last_used, size, path)` of every cached asset body."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith((".json", ".tmp")):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Removes the least recently used assets until the rest fits in 90% of `max_size_mb`."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_size_bytes * 0.9:
+                break
+            for stale in (path + ".json", path):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+        if removed:
+            self.logger.debug(f"Evicted {removed} cached viewer assets")
+
+
+class NetworkPolicy:
+    """
+    What the viewer may load: resource types and domains that are blocked,
+    and the asset cache static assets are served from. Shared by all
+    downloads; `request_filter` creates the per-download interception.
+    """
+    def __init__(self, logger, blocked_resource_types=BLOCKED_RESOURCE_TYPES, blocked_domains=BLOCKED_DOMAINS,
+                 asset_cache=None):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            blocked_resource_types (tuple, optional): Playwright resource types to abort.
+            blocked_domains (tuple, optional): Hosts to abort requests to,
+                including their subdomains.
+            asset_cache (AssetCache, optional): Serve scripts, stylesheets and
+                fonts from this cache.
+        """
+        self.logger = logger
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_domains = tuple(domain.lower().lstrip(".") for domain in blocked_domains)
+        self.asset_cache = asset_cache
+
+    def is_blocked(self, url, resource_type):
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = (urlsplit(url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    def request_filter(self, tracer=None):
+        """Creates the RequestFilter of one download."""
+        return RequestFilter(self, tracer=tracer)
+
+
+class RequestFilter:
+    """
+    Intercepts every request of a browser context (see `install`): blocked
+    requests are aborted, static assets are answered from the asset cache
+    or stored in it, and everything else continues untouched.
+
+    `stats` counts the requests, blocked requests, cache hits and the bytes
+    the cache hits saved for this download; the counters are also added to
+    the innermost open span of `tracer`.
+    """
+    def __init__(self, policy, tracer=None):
+        self.policy = policy
+        self.tracer = tracer
+        self.stats = {"requests": 0, "requests_blocked": 0, "asset_cache_hits": 0, "bytes_saved": 0}
+        self._lock = threading.Lock()
+
+    def install(self, context):
+        """Routes every request of `context` (a Playwright BrowserContext) through the filter."""
+        context.route("**/*", self._handle)
+        return context
+
+    def _count(self, counter, value=1):
+        with self._lock:
+            self.stats[counter] += value
+        span = self.tracer.current() if self.tracer else None
+        if span is not None and counter != "requests":
+            span.add(counter, value)
+
+    def _handle(self, route):
+        request = route.request
+        self._count("requests")
+        if self.policy.is_blocked(request.url, request.resource_type):
+            self._count("requests_blocked")
+            route.abort("blockedbyclient")
+            return
+
+        cache = self.policy.asset_cache
+        if cache is None or request.method != "GET" or request.resource_type not in CACHED_RESOURCE_TYPES:
+            route.continue_()
+            return
+
+        cached = cache.get(request.url)
+        if cached:
+            headers, body = cached
+            route.fulfill(status=200, headers=headers, body=body)
+            self._count("asset_cache_hits")
+            self._count("bytes_saved", len(body))
+            return
+
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception as e:
+            self.policy.logger.debug(f"Could not fetch {request.url} for the asset cache: {e}")
+            route.continue_()
+            return
+        if response.status == 200 and _is_cacheable(response.headers):
+            try:
+                cache.put(request.url, response.headers, body)
+            except OSError as e:
+                self.policy.logger.debug(f"Could not cache {request.url}: {e}")
+        route.fulfill(response=response, body=body)
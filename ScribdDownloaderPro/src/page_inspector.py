@@ -0,0 +1,322 @@
+import re
+from PyPDF2.generic import ContentStream, IndirectObject
+
+# Verdicts of a fast page inspection.
+PAGE_BLANK = "blank"
+PAGE_CONTENT = "content"
+PAGE_AMBIGUOUS = "ambiguous"
+
+# Path painting operators; the closing variants add an implicit 'h' first.
+# The obsolete 'F' is a no-op in pdfminer, so it is deliberately absent.
+PATH_PAINT_OPERATORS = {b"S": False, b"f": False, b"f*": False, b"B": False, b"B*": False,
+                        b"s": True, b"b": True, b"b*": True}
+PATH_SEGMENT_OPERATORS = {b"m": "m", b"l": "l", b"c": "c", b"v": "v", b"y": "y"}
+TEXT_SHOW_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+STANDARD_ENCODINGS = {"/StandardEncoding", "/WinAnsiEncoding", "/MacRomanEncoding"}
+SYMBOLIC_BASE_FONTS = {"/Symbol", "/ZapfDingbats"}
+MAX_FORM_DEPTH = 8
+
+# Results of decoding a shown string.
+TEXT_VISIBLE = "visible"
+TEXT_WHITESPACE = "whitespace"
+TEXT_UNKNOWN = "unknown"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_HEX_PAIR_RE = re.compile(r"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>")
+_BFRANGE_RE = re.compile(r"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])")
+
+
+def _mult_matrix(m1, m0):
+    """Multiplies two PDF transformation matrices (m1 x m0)."""
+    a1, b1, c1, d1, e1, f1 = m1
+    a0, b0, c0, d0, e0, f0 = m0
+    return (
+        a0 * a1 + c0 * b1,
+        b0 * a1 + d0 * b1,
+        a0 * c1 + c0 * d1,
+        b0 * c1 + d0 * d1,
+        a0 * e1 + c0 * f1 + e0,
+        b0 * e1 + d0 * f1 + f0,
+    )
+
+
+def _apply_matrix(m, point):
+    a, b, c, d, e, f = m
+    x, y = point
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def _paint_path(path, ctm):
+    """
+    Classifies a painted path exactly like pdfminer's PDFLayoutAnalyzer:
+    lines and curves are content, closed axis-aligned rectangles (e.g.
+    Chromium's white page background) and invalid paths are not.
+
+    Returns:
+        str: PAGE_CONTENT or PAGE_BLANK.
+    """
+    shape = "".join(segment[0] for segment in path)
+    if shape[:1] != "m":
+        return PAGE_BLANK
+    if shape.count("m") > 1:
+        for match in re.finditer(r"m[^m]+", shape):
+            if _paint_path(path[match.start(0):match.end(0)], ctm) == PAGE_CONTENT:
+                return PAGE_CONTENT
+        return PAGE_BLANK
+
+    raw_points = [segment[-2:] if segment[0] != "h" else path[0][-2:] for segment in path]
+    points = [_apply_matrix(ctm, point) for point in raw_points]
+    if len(shape) > 3 and shape[-2:] == "lh" and points[-2] == points[0]:
+        shape = shape[:-2] + "h"
+        points.pop()
+    if shape in ("mlllh", "mllll"):
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3), _ = points
+        is_closed_loop = points[0] == points[4]
+        has_square_coordinates = (
+            x0 == x1 and y1 == y2 and x2 == x3 and y3 == y0
+        ) or (y0 == y1 and x1 == x2 and y2 == y3 and x3 == x0)
+        if is_closed_loop and has_square_coordinates:
+            return PAGE_BLANK
+    # Single segments (lines) and everything else (curves) are content.
+    return PAGE_CONTENT
+
+
+def _page_matrix(page):
+    """The initial CTM pdfminer uses for a page, from its MediaBox and /Rotate."""
+    x0, y0, x1, y1 = (float(v) for v in page.mediabox)
+    rotate = (int(page.get("/Rotate", 0) or 0) + 360) % 360
+    if rotate == 90:
+        return (0, -1, 1, 0, -y0, x1)
+    if rotate == 180:
+        return (-1, 0, 0, -1, x1, y1)
+    if rotate == 270:
+        return (0, 1, -1, 0, y1, -x0)
+    return (1, 0, 0, 1, -x0, -y0)
+
+
+def _utf16(hex_string):
+    try:
+        return bytes.fromhex(hex_string).decode("utf-16-be")
+    except ValueError:
+        return None
+
+
+def _classify_unicode(text):
+    if text is None:
+        return TEXT_UNKNOWN
+    return TEXT_VISIBLE if _WHITESPACE_RE.sub("", text) else TEXT_WHITESPACE
+
+
+class _ToUnicodeDecoder:
+    """Maps character codes of a font to Unicode through its ToUnicode CMap."""
+    def __init__(self, cmap_bytes, default_code_length):
+        text = cmap_bytes.decode("latin-1")
+        lengths = set()
+        for block in re.findall(r"begincodespacerange(.*?)endcodespacerange", text, re.S):
+            for low, _ in _HEX_PAIR_RE.findall(block):
+                lengths.add(len(low) // 2)
+        if len(lengths) > 1:
+            raise ValueError("Mixed code lengths are not supported")
+        self.code_length = lengths.pop() if lengths else default_code_length
+        self.chars = {}
+        self.ranges = []
+        for block in re.findall(r"beginbfchar(.*?)endbfchar", text, re.S):
+            for src, dst in _HEX_PAIR_RE.findall(block):
+                self.chars[int(src, 16)] = _utf16(dst)
+        for block in re.findall(r"beginbfrange(.*?)endbfrange", text, re.S):
+            for low, high, dst in _BFRANGE_RE.findall(block):
+                if dst.startswith("["):
+                    values = [_utf16(h) for h in re.findall(r"<([0-9A-Fa-f]*)>", dst)]
+                    for offset, value in enumerate(values):
+                        self.chars[int(low, 16) + offset] = value
+                else:
+                    self.ranges.append((int(low, 16), int(high, 16), dst[1:-1]))
+
+    def _lookup(self, code):
+        if code in self.chars:
+            return self.chars[code]
+        for low, high, base in self.ranges:
+            if low <= code <= high:
+                width = len(base) // 2
+                value = int(base, 16) + code - low
+                return _utf16(value.to_bytes(width, "big").hex()) if value < 256 ** width else None
+        return None
+
+    def classify(self, data):
+        if len(data) % self.code_length:
+            return TEXT_UNKNOWN
+        result = TEXT_WHITESPACE
+        for i in range(0, len(data), self.code_length):
+            kind = _classify_unicode(self._lookup(int.from_bytes(data[i:i + self.code_length], "big")))
+            if kind == TEXT_VISIBLE:
+                return TEXT_VISIBLE
+            if kind == TEXT_UNKNOWN:
+                result = TEXT_UNKNOWN
+        return result
+
+
+class _StandardEncodingDecoder:
+    """Decodes single-byte codes of a simple font with a standard encoding."""
+    def classify(self, data):
+        result = TEXT_WHITESPACE
+        for byte in data:
+            if 0x21 <= byte <= 0x7E:
+                return TEXT_VISIBLE
+            if byte != 0x20:
+                result = TEXT_UNKNOWN
+        return result
+
+
+class PageInspector:
+    """
+    Decides whether a PDF page is blank by scanning its content stream,
+    XObjects, image resources and fonts directly, with the same criteria
+    as the pdfplumber-based check (no non-whitespace text, images, lines or
+    curves). Pages whose verdict would require full text extraction are
+    reported as ambiguous.
+    """
+    def __init__(self, reader, logger):
+        self.reader = reader
+        self.logger = logger
+        self._decoders = {}
+
+    def inspect(self, page):
+        """
+        Inspects one page of the reader's document.
+
+        Returns:
+            str: PAGE_BLANK, PAGE_CONTENT or PAGE_AMBIGUOUS.
+        """
+        try:
+            contents = page.get_contents()
+            if contents is None:
+                return PAGE_BLANK
+            resources = page.get("/Resources")
+            resources = resources.get_object() if resources is not None else {}
+            return self._inspect_content(contents, resources, _page_matrix(page), 0)
+        except Exception as e:
+            self.logger.debug(f"Fast page inspection failed, falling back to text extraction: {e}")
+            return PAGE_AMBIGUOUS
+
+    def _decoder(self, font_ref):
+        key = font_ref.idnum if isinstance(font_ref, IndirectObject) else id(font_ref)
+        if key not in self._decoders:
+            try:
+                self._decoders[key] = self._build_decoder(font_ref.get_object())
+            except Exception as e:
+                self.logger.debug(f"Cannot decode font for blank-page check: {e}")
+                self._decoders[key] = None
+        return self._decoders[key]
+
+    def _build_decoder(self, font):
+        subtype = font.get("/Subtype")
+        to_unicode = font.get("/ToUnicode")
+        if to_unicode is not None:
+            return _ToUnicodeDecoder(to_unicode.get_object().get_data(), 2 if subtype == "/Type0" else 1)
+        if subtype not in ("/Type1", "/TrueType", "/MMType1"):
+            return None
+        encoding = font.get("/Encoding")
+        if encoding is not None:
+            encoding = encoding.get_object()
+            return _StandardEncodingDecoder() if encoding in STANDARD_ENCODINGS else None
+        descriptor = font.get("/FontDescriptor")
+        descriptor = descriptor.get_object() if descriptor is not None else {}
+        embedded = any(key in descriptor for key in ("/FontFile", "/FontFile2", "/FontFile3"))
+        if subtype == "/Type1" and not embedded and font.get("/BaseFont") not in SYMBOLIC_BASE_FONTS:
+            return _StandardEncodingDecoder()
+        return None
+
+    def _classify_text(self, operands, operator, font_ref):
+        if operator == b"TJ":
+            strings = [item for item in (operands[0] if operands else []) if isinstance(item, (str, bytes))]
+        else:
+            strings = [operands[-1]] if operands and isinstance(operands[-1], (str, bytes)) else []
+        strings = [item for item in strings if len(item)]
+        if not strings:
+            return TEXT_WHITESPACE
+        decoder = self._decoder(font_ref) if font_ref is not None else None
+        if decoder is None:
+            return TEXT_UNKNOWN
+        result = TEXT_WHITESPACE
+        for item in strings:
+            try:
+                data = item.original_bytes if isinstance(item, str) else bytes(item)
+            except Exception:
+                return TEXT_UNKNOWN
+            kind = decoder.classify(data)
+            if kind == TEXT_VISIBLE:
+                return TEXT_VISIBLE
+            if kind == TEXT_UNKNOWN:
+                result = TEXT_UNKNOWN
+        return result
+
+    def _inspect_content(self, contents, resources, ctm, depth):
+        operations = ContentStream(contents, self.reader).operations
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+        fonts = resources.get("/Font")
+        fonts = fonts.get_object() if fonts is not None else {}
+        verdict = PAGE_BLANK
+        font_ref = None
+        state_stack = []
+        path = []
+
+        for operands, operator in operations:
+            if operator == b"q":
+                state_stack.append((ctm, font_ref))
+            elif operator == b"Q":
+                if state_stack:
+                    ctm, font_ref = state_stack.pop()
+            elif operator == b"cm":
+                ctm = _mult_matrix(tuple(float(v) for v in operands), ctm)
+            elif operator == b"Tf":
+                font_ref = fonts.get(operands[0]) if operands else None
+            elif operator in PATH_SEGMENT_OPERATORS:
+                path.append((PATH_SEGMENT_OPERATORS[operator], *(float(v) for v in operands)))
+            elif operator == b"h":
+                path.append(("h",))
+            elif operator == b"re":
+                x, y, w, h = (float(v) for v in operands)
+                path.extend([("m", x, y), ("l", x + w, y), ("l", x + w, y + h), ("l", x, y + h), ("h",)])
+            elif operator in PATH_PAINT_OPERATORS:
+                if PATH_PAINT_OPERATORS[operator]:
+                    path.append(("h",))
+                if _paint_path(path, ctm) == PAGE_CONTENT:
+                    return PAGE_CONTENT
+                path = []
+            elif operator == b"n":
+                path = []
+            elif operator == b"INLINE IMAGE":
+                settings = operands.get("settings", {}) if isinstance(operands, dict) else {}
+                if "/W" in settings and "/H" in settings:
+                    return PAGE_CONTENT
+                if "/Width" in settings or "/Height" in settings:
+                    verdict = PAGE_AMBIGUOUS
+            elif operator == b"Do":
+                xobject = xobjects.get(operands[0]) if operands else None
+                if xobject is None:
+                    continue
+                xobject = xobject.get_object()
+                subtype = xobject.get("/Subtype")
+                if subtype == "/Image" and "/Width" in xobject and "/Height" in xobject:
+                    return PAGE_CONTENT
+                if subtype == "/Form" and "/BBox" in xobject:
+                    if depth >= MAX_FORM_DEPTH:
+                        verdict = PAGE_AMBIGUOUS
+                        continue
+                    matrix = xobject.get("/Matrix")
+                    form_ctm = _mult_matrix(tuple(float(v) for v in matrix), ctm) if matrix else ctm
+                    form_resources = xobject.get("/Resources")
+                    form_resources = form_resources.get_object() if form_resources is not None else resources
+                    kind = self._inspect_content(xobject, form_resources, form_ctm, depth + 1)
+                    if kind == PAGE_CONTENT:
+                        return PAGE_CONTENT
+                    if kind == PAGE_AMBIGUOUS:
+                        verdict = PAGE_AMBIGUOUS
+            elif operator in TEXT_SHOW_OPERATORS:
+                kind = self._classify_text(operands, operator, font_ref)
+                if kind == TEXT_VISIBLE:
+                    return PAGE_CONTENT
+                if kind == TEXT_UNKNOWN:
+                    verdict = PAGE_AMBIGUOUS
+        return verdict
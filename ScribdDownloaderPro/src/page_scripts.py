@@ -0,0 +1,604 @@
+"""
+JavaScript snippets evaluated inside the Scribd embed viewer.
+"""
+
+# Installs `window.__sdpTracker`, which keeps live counters of rendered page
+# nodes and in-flight network requests so Python can block on in-page
+# signals (via `wait_for_function`) instead of sleeping for fixed intervals.
+PAGE_TRACKER_JS = """
+() => {
+    if (window.__sdpTracker) {
+        return;
+    }
+
+    const pageSelector = "[id^='outer_page_']";
+    const fallbackSelector = "[class*='page']";
+
+    const tracker = {
+        rendered: 0,
+        total: 0,
+        pending: 0,
+        lastActivity: performance.now(),
+        dirty: true,
+
+        pages() {
+            const pages = document.querySelectorAll(pageSelector);
+            if (pages.length) {
+                return pages;
+            }
+            // Keep only outermost matches so nested "page_*" parts are not
+            // counted as pages of their own.
+            return Array.from(document.querySelectorAll(fallbackSelector))
+                .filter(el => !el.parentElement || !el.parentElement.closest(fallbackSelector));
+        },
+
+        isRendered(el) {
+            const text = el.querySelector('.textLayer, .text_layer');
+            if (text && text.textContent.trim().length) {
+                return true;
+            }
+            for (const img of el.querySelectorAll('img')) {
+                if (img.complete && img.naturalWidth > 0) {
+                    return true;
+                }
+            }
+            for (const canvas of el.querySelectorAll('canvas')) {
+                if (canvas.width > 0 && canvas.height > 0) {
+                    return true;
+                }
+            }
+            return false;
+        },
+
+        // Stricter than isRendered: the page has content and none of its
+        // images or canvases is still loading or empty.
+        isComplete(el) {
+            if (!this.isRendered(el)) {
+                return false;
+            }
+            for (const img of el.querySelectorAll('img')) {
+                if (!img.complete || img.naturalWidth === 0) {
+                    return false;
+                }
+            }
+            for (const canvas of el.querySelectorAll('canvas')) {
+                if (canvas.width === 0 || canvas.height === 0) {
+                    return false;
+                }
+            }
+            return true;
+        },
+
+        touch() {
+            this.dirty = true;
+            this.lastActivity = performance.now();
+        },
+
+        recount() {
+            if (!this.dirty) {
+                return;
+            }
+            const pages = this.pages();
+            let rendered = 0;
+            for (const el of pages) {
+                if (this.isRendered(el)) {
+                    rendered += 1;
+                }
+            }
+            this.total = pages.length;
+            this.rendered = rendered;
+            this.dirty = false;
+        },
+
+        idleMs() {
+            return performance.now() - this.lastActivity;
+        },
+
+        snapshot() {
+            this.recount();
+            const scroller = document.scrollingElement || document.documentElement;
+            return {
+                rendered: this.rendered,
+                total: this.total,
+                pending: this.pending,
+                idle_ms: Math.round(this.idleMs()),
+                at_bottom: window.scrollY + window.innerHeight >= scroller.scrollHeight - 2,
+            };
+        },
+    };
+
+    new MutationObserver(() => tracker.touch()).observe(document.documentElement, {
+        childList: true,
+        subtree: true,
+    });
+    // Image and font loads do not mutate the DOM; `load` does not bubble, so capture it.
+    document.addEventListener('load', () => tracker.touch(), true);
+    new PerformanceObserver(() => tracker.touch()).observe({ type: 'resource', buffered: false });
+
+    const started = () => { tracker.pending += 1; tracker.touch(); };
+    const finished = () => { tracker.pending = Math.max(0, tracker.pending - 1); tracker.touch(); };
+
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function (...args) {
+            started();
+            return originalFetch.apply(this, args).finally(finished);
+        };
+    }
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        started();
+        this.addEventListener('loadend', finished, { once: true });
+        return originalSend.apply(this, args);
+    };
+
+    window.__sdpTracker = tracker;
+}
+"""
+
+TRACKER_SNAPSHOT_JS = "() => window.__sdpTracker.snapshot()"
+
+# One loader step: nudges lazy loaders that only listen for scroll/resize
+# events when already at the bottom, scrolls 1.5 viewports down otherwise.
+LOAD_STEP_JS = """
+(atBottom) => {
+    if (atBottom) {
+        window.dispatchEvent(new Event('scroll'));
+        window.dispatchEvent(new Event('resize'));
+    } else {
+        window.scrollBy(0, window.innerHeight * 1.5);
+    }
+}
+"""
+
+# Resolves once the tracker saw new rendered pages, or once the page has been
+# quiet (no pending requests, no DOM or resource activity) for `quietMs`.
+WAIT_FOR_PROGRESS_JS = """
+([rendered, target, quietMs]) => {
+    const t = window.__sdpTracker;
+    t.recount();
+    if (target && t.rendered >= target) {
+        return true;
+    }
+    return t.rendered > rendered || (t.pending === 0 && t.idleMs() >= quietMs);
+}
+"""
+
+# Resolves when fonts are ready and no image inside a page is still loading.
+WAIT_FOR_SETTLED_JS = """
+() => {
+    if (document.fonts && document.fonts.status !== 'loaded') {
+        return false;
+    }
+    const t = window.__sdpTracker;
+    for (const el of t.pages()) {
+        for (const img of el.querySelectorAll('img')) {
+            if (!img.complete) {
+                return false;
+            }
+        }
+    }
+    return t.pending === 0;
+}
+"""
+
+# Chunked rendering: hides pages through an attribute so the page elements
+# (and therefore the tracker's page indices) stay in place. The selector is
+# more specific than the print stylesheet's `[class*='page']` rule.
+PAGE_WINDOW_CSS = "html [data-sdp-hidden] { display: none !important; }"
+
+# Scrolls page `index` into view. Resolves to false when there is no such page.
+SCROLL_TO_PAGE_JS = """
+(index) => {
+    const el = window.__sdpTracker.pages()[index];
+    if (!el) {
+        return false;
+    }
+    el.scrollIntoView({ block: 'center' });
+    return true;
+}
+"""
+
+# Resolves once page `index` has rendered content (or does not exist).
+PAGE_RENDERED_JS = """
+(index) => {
+    const t = window.__sdpTracker;
+    const el = t.pages()[index];
+    return !el || t.isRendered(el);
+}
+"""
+
+# Leaves only pages [start, stop) visible for printing one chunk. The last
+# page of the window gets no forced break, so the chunk has no trailing
+# empty page.
+SHOW_PAGE_WINDOW_JS = """
+([start, stop]) => {
+    const pages = window.__sdpTracker.pages();
+    const last = Math.min(stop, pages.length) - 1;
+    pages.forEach((el, i) => {
+        const inWindow = i >= start && i < stop;
+        el.toggleAttribute('data-sdp-hidden', !inWindow);
+        if (inWindow) {
+            el.style.pageBreakAfter = i < last ? 'always' : 'auto';
+        }
+    });
+    return pages.length;
+}
+"""
+
+# Unhides the pages from `start` on so lazy loading can reach them again.
+SHOW_UNPRINTED_PAGES_JS = """
+(start) => {
+    const pages = window.__sdpTracker.pages();
+    for (let i = start; i < pages.length; i++) {
+        pages[i].removeAttribute('data-sdp-hidden');
+    }
+}
+"""
+
+# Measures pages [start, stop) (`stop` null: up to the last page) in CSS
+# pixels and groups consecutive pages of the same size, within a pixel, into
+# runs of {start, stop, width, height}. Pages without a layout box (hidden
+# or released) join the run before them.
+PAGE_GEOMETRY_JS = """
+([start, stop]) => {
+    const pages = window.__sdpTracker.pages();
+    const end = stop === null ? pages.length : Math.min(stop, pages.length);
+    const runs = [];
+    for (let i = start; i < end; i++) {
+        const box = pages[i].getBoundingClientRect();
+        const width = Math.ceil(box.width);
+        const height = Math.ceil(box.height);
+        const last = runs[runs.length - 1];
+        const unsized = !width || !height;
+        if (last && (unsized || (Math.abs(last.width - width) <= 1 && Math.abs(last.height - height) <= 1))) {
+            // The sheet takes the larger size, so no page spills onto a second one.
+            last.stop = i + 1;
+            last.width = Math.max(last.width, width);
+            last.height = Math.max(last.height, height);
+        } else {
+            runs.push({ start: i, stop: i + 1, width, height });
+        }
+    }
+    return runs;
+}
+"""
+
+# Sets the size of the printed sheet through an `@page` rule; [0, 0] removes
+# it again so the print options decide.
+SET_PAGE_SIZE_JS = """
+([width, height]) => {
+    let style = document.getElementById('sdp-page-size');
+    if (!style) {
+        style = document.createElement('style');
+        style.id = 'sdp-page-size';
+        document.head.appendChild(style);
+    }
+    style.textContent = width && height ? `@page { size: ${width}px ${height}px; margin: 0; }` : '';
+}
+"""
+
+# Drops the content of pages [0, stop) so the renderer can free their text
+# layers, images and canvases. The emptied page elements stay as hidden
+# placeholders.
+RELEASE_PAGES_JS = """
+(stop) => {
+    const t = window.__sdpTracker;
+    const pages = t.pages();
+    for (let i = 0; i < Math.min(stop, pages.length); i++) {
+        const el = pages[i];
+        if (el.hasAttribute('data-sdp-released')) {
+            continue;
+        }
+        el.querySelectorAll('img').forEach(img => img.removeAttribute('src'));
+        el.querySelectorAll('canvas').forEach(canvas => { canvas.width = 0; canvas.height = 0; });
+        el.replaceChildren();
+        el.setAttribute('data-sdp-released', '');
+        el.setAttribute('data-sdp-hidden', '');
+    }
+    t.touch();
+}
+"""
+
+# Starts loading pages [start, stop) in the background of one tab: every page
+# is scrolled into view and awaited until rendered, or until `timeoutMs`
+# passes. Returns at once; progress is published on `window.__sdpRange` so a
+# single Python thread can poll several tabs that load concurrently.
+START_RANGE_LOAD_JS = """
+([start, stop, timeoutMs]) => {
+    const t = window.__sdpTracker;
+    const state = window.__sdpRange = { start, stop, next: start, done: false, timed_out: [] };
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    (async () => {
+        for (let i = start; i < stop; i++) {
+            const el = t.pages()[i];
+            if (!el) {
+                break;
+            }
+            el.scrollIntoView({ block: 'center' });
+            const deadline = performance.now() + timeoutMs;
+            while (!t.isRendered(el) && performance.now() < deadline) {
+                await sleep(50);
+            }
+            if (!t.isRendered(el)) {
+                state.timed_out.push(i);
+            }
+            state.next = i + 1;
+        }
+        state.done = true;
+    })();
+}
+"""
+
+RANGE_STATE_JS = "() => window.__sdpRange"
+
+# One step of the "index" load strategy. The tracker keeps an index of the
+# page slots that are still empty (`missing`), pruned as pages render and
+# extended only by slots added since the last step, so a step costs time in
+# the number of missing pages, not in the length of the document. The first
+# `batchSize` missing slots are scrolled into view (skipping slots a previous
+# scroll already brought on screen) and awaited together for up to
+# `timeoutMs`; slots that stay empty are retried after the others. When no
+# slot is missing but fewer than `target` exist, the viewer is scrolled to
+# the bottom so it appends more. Resolves with the counts in the same round
+# trip.
+LOAD_MISSING_PAGES_JS = """
+async ([batchSize, timeoutMs, target]) => {
+    const t = window.__sdpTracker;
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const nextFrame = () => new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+    const onScreen = el => {
+        const rect = el.getBoundingClientRect();
+        return rect.bottom > 0 && rect.top < window.innerHeight;
+    };
+
+    let pages;
+    const refresh = () => {
+        pages = t.pages();
+        t.missing = (t.missing || []).filter(i => i < pages.length && !t.isRendered(pages[i]));
+        for (let i = t.indexed || 0; i < pages.length; i++) {
+            if (!t.isRendered(pages[i])) {
+                t.missing.push(i);
+            }
+        }
+        t.indexed = pages.length;
+    };
+    refresh();
+
+    const batch = t.missing.slice(0, batchSize);
+    const deadline = performance.now() + timeoutMs;
+    if (batch.length) {
+        for (const i of batch) {
+            if (!onScreen(pages[i])) {
+                pages[i].scrollIntoView({ block: 'center' });
+                await nextFrame();
+            }
+        }
+        while (batch.some(i => !t.isRendered(pages[i])) && performance.now() < deadline) {
+            await sleep(50);
+        }
+    } else if (target && pages.length < target) {
+        const scroller = document.scrollingElement || document.documentElement;
+        window.scrollTo(0, scroller.scrollHeight);
+        window.dispatchEvent(new Event('scroll'));
+        while (t.pages().length === pages.length && performance.now() < deadline) {
+            await sleep(50);
+        }
+    }
+    refresh();
+    t.touch();
+    // Slots that did not render go to the back, so the next step moves on.
+    const stillMissing = new Set(t.missing);
+    const timedOut = batch.filter(i => stillMissing.has(i));
+    const retry = new Set(timedOut);
+    t.missing = t.missing.filter(i => !retry.has(i)).concat(timedOut);
+    return {
+        total: pages.length,
+        rendered: pages.length - t.missing.length,
+        missing: t.missing.length,
+        batch: batch.length,
+        timed_out: timedOut,
+    };
+}
+"""
+
+# Checks every page for completeness (see isComplete) in one pass and
+# returns the page total and the indices of the pages that are not complete.
+PENDING_PAGES_JS = """
+() => {
+    const t = window.__sdpTracker;
+    const pages = t.pages();
+    const pending = [];
+    pages.forEach((el, i) => {
+        if (!t.isComplete(el)) {
+            pending.push(i);
+        }
+    });
+    return { total: pages.length, pending };
+}
+"""
+
+# Revisits the pages `indices` one at a time: scrolls a page into view and
+# waits up to `pageTimeoutMs` for it to complete while it is still in view,
+# then moves on, so a virtualizing viewer does not unload a page before it
+# finished. Stops at `budgetMs`. Resolves with the indices still incomplete.
+REVISIT_PAGES_JS = """
+async ([indices, pageTimeoutMs, budgetMs]) => {
+    const t = window.__sdpTracker;
+    const pages = t.pages();
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const nextFrame = () => new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+    const deadline = performance.now() + budgetMs;
+    const present = indices.filter(i => pages[i]);
+    for (const i of present) {
+        if (performance.now() >= deadline) {
+            break;
+        }
+        if (t.isComplete(pages[i])) {
+            continue;
+        }
+        pages[i].scrollIntoView({ block: 'center' });
+        await nextFrame();
+        const pageDeadline = Math.min(deadline, performance.now() + pageTimeoutMs);
+        while (!t.isComplete(pages[i]) && performance.now() < pageDeadline) {
+            await sleep(50);
+        }
+    }
+    return present.filter(i => !t.isComplete(pages[i]));
+}
+"""
+
+# Number of page slots, counted in the page instead of through element handles.
+PAGE_SLOT_COUNT_JS = "() => document.querySelectorAll(\"[class*='page']\").length"
+
+# Reads the scroll position, document height and viewport height in one
+# round-trip instead of three.
+SCROLL_METRICS_JS = """
+() => ({
+    y: window.scrollY,
+    height: document.body.scrollHeight,
+    viewport: window.innerHeight,
+})
+"""
+
+# Strips the viewer chrome and lays the pages out for printing. Each script
+# is evaluated on its own, so one failing does not stop the others.
+UI_CLEANUP_SCRIPTS = [
+    # Remove all toolbars and navigation
+    """
+    const elementsToHide = document.querySelectorAll(`
+        .toolbar_top, .toolbar_bottom, .navigation, .header, .footer,
+        .sidebar, .menu, .popup, .overlay, .modal, .advertisement,
+        [class*='toolbar'], [class*='nav'], [id*='toolbar'], [id*='nav']
+    `);
+    elementsToHide.forEach(el => el.remove());
+    """,
+
+    # Fix container dimensions
+    """
+    const containers = document.querySelectorAll('.document_scroller, .outer_container, .page_container');
+    containers.forEach(el => {
+        el.style.overflow = 'visible';
+        el.style.height = 'auto';
+        el.style.maxHeight = 'none';
+        el.style.margin = '0';
+        el.style.padding = '0';
+    });
+    """,
+
+    # Optimize body and html
+    """
+    document.body.style.margin = '0';
+    document.body.style.padding = '0';
+    document.body.style.height = 'auto';
+    document.body.style.overflow = 'visible';
+    document.documentElement.style.margin = '0';
+    document.documentElement.style.padding = '0';
+    """,
+
+    # Ensure all pages are visible and properly styled
+    """
+    const pages = document.querySelectorAll('[class*="page"]');
+    pages.forEach((page, index) => {
+        page.style.display = 'block';
+        page.style.visibility = 'visible';
+        page.style.opacity = '1';
+        page.style.margin = '0';
+        page.style.padding = '0';
+        page.style.pageBreakInside = 'avoid';
+        page.style.pageBreakAfter = index < pages.length - 1 ? 'always' : 'auto';
+    });
+    """
+]
+
+# Describes pages [start, stop) for the asset renderer: the largest loaded
+# image of each page, the share of the page it covers, and whether the page
+# has a text layer (which an image alone would not reproduce).
+PAGE_ASSETS_JS = """
+([start, stop]) => {
+    const t = window.__sdpTracker;
+    const pages = t.pages();
+    const result = [];
+    for (let i = start; i < Math.min(stop, pages.length); i++) {
+        const el = pages[i];
+        const box = el.getBoundingClientRect();
+        const text = el.querySelector('.textLayer, .text_layer');
+        let best = null;
+        let images = 0;
+        for (const img of el.querySelectorAll('img')) {
+            if (!img.complete || !img.naturalWidth) {
+                continue;
+            }
+            images += 1;
+            const r = img.getBoundingClientRect();
+            const coverage = box.width && box.height ? (r.width * r.height) / (box.width * box.height) : 0;
+            if (!best || coverage > best.coverage) {
+                best = { src: img.currentSrc || img.src, coverage };
+            }
+        }
+        result.push({
+            index: i,
+            src: best ? best.src : null,
+            coverage: best ? best.coverage : 0,
+            images,
+            has_text: !!(text && text.textContent.trim().length),
+            // Layout size in CSS pixels, measured like PAGE_GEOMETRY_JS.
+            width: Math.ceil(box.width),
+            height: Math.ceil(box.height),
+        });
+    }
+    return result;
+}
+"""
+
+# Reads the text layers of pages [start, stop) for the text extractor: per
+# page its index, size, the text in reading order (spans grouped into lines
+# by their vertical position) and every text span with its box relative to
+# the page, all in CSS pixels.
+PAGE_TEXT_JS = """
+([start, stop]) => {
+    const pages = window.__sdpTracker.pages();
+    const round = value => Math.round(value * 10) / 10;
+    const result = [];
+    for (let i = start; i < Math.min(stop, pages.length); i++) {
+        const el = pages[i];
+        const box = el.getBoundingClientRect();
+        const items = [];
+        for (const layer of el.querySelectorAll('.textLayer, .text_layer')) {
+            const leaves = Array.from(layer.querySelectorAll('*')).filter(node => !node.children.length);
+            for (const node of leaves.length ? leaves : [layer]) {
+                const text = node.textContent;
+                if (!text.trim()) {
+                    continue;
+                }
+                const r = node.getBoundingClientRect();
+                items.push({
+                    text,
+                    x: round(r.left - box.left),
+                    y: round(r.top - box.top),
+                    width: round(r.width),
+                    height: round(r.height),
+                });
+            }
+        }
+
+        const sorted = items.slice().sort((a, b) => a.y - b.y || a.x - b.x);
+        const lines = [];
+        for (const item of sorted) {
+            const line = lines[lines.length - 1];
+            if (line && Math.abs(item.y - line.y) <= Math.max(2, Math.min(item.height, line.height) / 2)) {
+                line.items.push(item);
+            } else {
+                lines.push({ y: item.y, height: item.height, items: [item] });
+            }
+        }
+        const text = lines.map(line => line.items
+            .sort((a, b) => a.x - b.x)
+            .map(item => item.text.trim())
+            .join(' ')).join('\\n');
+
+        result.push({ index: i, width: round(box.width), height: round(box.height), text, items });
+    }
+    return result;
+}
+"""
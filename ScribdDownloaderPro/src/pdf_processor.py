@@ -1,13 +1,79 @@
 import io
+import logging
+import mmap
+import multiprocessing
 import os
 import re
-import shutil
-import subprocess
 import sys
 import warnings
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader, PdfWriter
 import pdfplumber
+from .metrics import Tracer, traced
+from .page_inspector import PageInspector, PAGE_AMBIGUOUS, PAGE_BLANK
+
+# Halaman minimum per potongan agar biaya proses worker sepadan.
+MIN_PAGES_PER_CHUNK = 25
+
+def _open_pdf_source(pdf_source):
+    """Mengembalikan path atau stream baru untuk bytes maupun path PDF."""
+    return io.BytesIO(pdf_source) if isinstance(pdf_source, (bytes, bytearray)) else pdf_source
+
+def open_reader_stream(pdf_source):
+    """
+    Stream untuk PdfReader. Path dipetakan ke memori (read-only) karena
+    PdfReader(path) menyalin seluruh file ke BytesIO.
+    """
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return io.BytesIO(pdf_source)
+    with open(pdf_source, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# Reader milik proses worker; dibuka sekali per proses, bukan per potongan.
+_worker_state = {}
+
+def _init_blank_page_worker(pdf_path):
+    """Initializer worker: hanya path yang dikirim, reader dibuka worker saat pertama dipakai."""
+    _worker_state["path"] = pdf_path
+    _worker_state["reader"] = None
+
+def _find_blank_pages_in_range(start, stop):
+    """Fungsi worker: memeriksa halaman [start, stop) dari file PDF bersama."""
+    if _worker_state.get("reader") is None:
+        _worker_state["reader"] = PdfReader(open_reader_stream(_worker_state["path"]))
+    processor = PDFProcessor(logging.getLogger("ScribdDownloader"))
+    return start, processor.find_blank_pages(_worker_state["path"], _worker_state["reader"], start=start, stop=stop)
+
+def available_cpus():
+    """Jumlah CPU yang benar-benar boleh dipakai proses ini."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def process_pool_context():
+    """
+    Konteks multiprocessing untuk worker CPU (deteksi halaman kosong, tahap
+    clean/compress pipeline).
+
+    Memakai forkserver, atau spawn bila tidak tersedia, dan tidak pernah fork:
+    proses Flask/Playwright menjalankan banyak thread (worker scheduler, slot
+    browser pool, governor), dan anak hasil fork bisa macet pada lock yang
+    sedang dipegang salah satu thread itu. Server forkserver memuat modul ini
+    lebih dulu, sehingga worker baru tidak perlu mengimpornya ulang. Dokumen
+    diserahkan ke worker sebagai path file, bukan objek yang di-pickle.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def count_pdf_pages(path):
+    """Menghitung halaman file PDF tanpa menyalin seluruh file ke memori."""
+    with open_reader_stream(path) as stream:
+        return len(PdfReader(stream).pages)
 
 class StderrRedirect:
     def __init__(self):
@@ -26,8 +92,22 @@ class StderrRedirect:
 
 class PDFProcessor:
     """Menangani operasi PDF dengan deteksi halaman kosong."""
-    def __init__(self, logger):
+    def __init__(self, logger, workers=1, tracer=None):
+        """
+        Args:
+            logger (Logger): Instance logger.
+            workers (int, optional): Jumlah proses untuk deteksi halaman kosong.
+                Nilai 1 menjalankan deteksi di proses saat ini.
+            tracer (Tracer, optional): Mencatat deteksi halaman kosong sebagai span.
+        """
         self.logger = logger
+        self.workers = max(1, int(workers or 1))
+        self.tracer = tracer or Tracer(logger)
+
+    @property
+    def effective_workers(self):
+        """Jumlah worker yang dipakai; lebih banyak proses daripada CPU hanya menambah overhead."""
+        return min(self.workers, available_cpus())
 
     def is_page_blank(self, page, page_number):
         """Deteksi halaman kosong dengan redirect stderr."""
@@ -56,82 +136,188 @@ class PDFProcessor:
             self.logger.warning(f"Gagal memeriksa halaman {page_number+1}: {e}")
             return False
 
+    def find_blank_pages(self, pdf_source, reader=None, start=0, stop=None):
+        """
+        Mendeteksi halaman kosong dalam satu kali buka dokumen.
+
+        Setiap halaman diperiksa langsung dari content stream, XObject, resource
+        gambar dan font-nya (lihat PageInspector). Ekstraksi teks dengan
+        pdfplumber hanya dipakai untuk halaman yang ambigu, dan dokumen
+        pdfplumber dibuka sekali untuk seluruh halaman tersebut.
+
+        Args:
+            pdf_source (bytes | str): Dokumen PDF atau path ke file PDF.
+            reader (PdfReader, optional): Reader yang sudah membuka dokumen yang sama.
+            start (int, optional): Indeks halaman pertama yang diperiksa.
+            stop (int, optional): Indeks setelah halaman terakhir yang diperiksa.
+
+        Returns:
+            list: Daftar bool per halaman dalam rentang, True jika halaman kosong.
+        """
+        if reader is None:
+            with open_reader_stream(pdf_source) as stream:
+                return self.find_blank_pages(pdf_source, PdfReader(stream), start, stop)
+        stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+        inspector = PageInspector(reader, self.logger)
+        plumber = None
+        mask = []
+        fallback_count = 0
+        try:
+            for i in range(start, stop):
+                verdict = inspector.inspect(reader.pages[i])
+                if verdict == PAGE_AMBIGUOUS:
+                    if plumber is None:
+                        with StderrRedirect():
+                            plumber = pdfplumber.open(_open_pdf_source(pdf_source))
+                    fallback_count += 1
+                    blank = self._is_plumber_page_blank(plumber.pages[i], i)
+                else:
+                    blank = verdict == PAGE_BLANK
+                if blank:
+                    self.logger.debug(f"Halaman {i+1} terdeteksi kosong")
+                mask.append(blank)
+        finally:
+            if plumber is not None:
+                plumber.close()
+        self.logger.debug(f"{fallback_count} dari {len(mask)} halaman memerlukan ekstraksi teks")
+        return mask
+
+    def find_blank_pages_parallel(self, pdf_path, page_total):
+        """
+        Membagi rentang halaman ke beberapa proses, lalu hasilnya digabung
+        menjadi satu mask sesuai urutan halaman. Tidak ada halaman yang
+        di-pickle: worker hanya menerima path file dan membuka file PDF
+        sendiri satu kali (lihat process_pool_context).
+
+        Args:
+            pdf_path (str): Path file PDF yang dibaca oleh semua worker.
+            page_total (int): Jumlah halaman dokumen.
+
+        Returns:
+            list: Daftar bool per halaman, True jika halaman kosong.
+        """
+        # Lebih banyak potongan daripada worker agar beban tetap seimbang.
+        workers = self.effective_workers
+        chunk_count = min(workers * 4, max(1, page_total // MIN_PAGES_PER_CHUNK))
+        chunk_size = -(-page_total // chunk_count)
+        ranges = [(start, min(start + chunk_size, page_total)) for start in range(0, page_total, chunk_size)]
+        results = {}
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(ranges)),
+            mp_context=process_pool_context(),
+            initializer=_init_blank_page_worker,
+            initargs=(pdf_path,),
+        ) as pool:
+            futures = [pool.submit(_find_blank_pages_in_range, start, stop) for start, stop in ranges]
+            for future in futures:
+                start, chunk_mask = future.result()
+                results[start] = chunk_mask
+        mask = []
+        for start, _ in ranges:
+            mask.extend(results[start])
+        return mask
+
+    def _find_blank_pages_via_file(self, pdf_bytes, page_total):
+        """Menulis bytes ke file sementara agar bisa dibaca bersama oleh worker."""
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as f:
+                f.write(pdf_bytes)
+                temp_path = f.name
+            return self.find_blank_pages_parallel(temp_path, page_total)
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _is_plumber_page_blank(self, plumber_page, page_number):
+        """Kriteria yang sama dengan is_page_blank untuk halaman pdfplumber yang sudah terbuka."""
+        try:
+            with StderrRedirect():
+                text = "".join(char.get("text", "") for char in plumber_page.chars)
+                if re.sub(r'\s+', '', text):
+                    return False
+                return not (plumber_page.images or plumber_page.curves or plumber_page.lines)
+        except Exception as e:
+            self.logger.warning(f"Gagal memeriksa halaman {page_number+1}: {e}")
+            return False
+
+    @traced("blank_detection")
     def remove_blank_pages(self, pdf_bytes):
-        """Menghapus halaman kosong dengan redirect stderr."""
+        """Menghapus halaman kosong yang dideteksi oleh find_blank_pages."""
         try:
             reader = PdfReader(io.BytesIO(pdf_bytes))
-            writer = PdfWriter()
-            removed_count = 0
-            for i, page in enumerate(reader.pages):
-                if not self.is_page_blank(page, i):
-                    writer.add_page(page)
-                else:
-                    removed_count += 1
-            msg = f"Berhasil menghapus {removed_count} halaman kosong." if removed_count else "Tidak ada halaman kosong yang terdeteksi."
-            self.logger.info(msg)
+            page_total = len(reader.pages)
+            if self.effective_workers > 1 and page_total >= 2 * MIN_PAGES_PER_CHUNK:
+                self.logger.info(f"Memeriksa {page_total} halaman dengan {self.effective_workers} proses...")
+                mask = self._find_blank_pages_via_file(pdf_bytes, page_total)
+            else:
+                mask = self.find_blank_pages(pdf_bytes, reader)
+            self.tracer.current().set(pages=page_total, blank_pages=sum(mask))
             output = io.BytesIO()
-            writer.write(output)
+            self._write_non_blank_pages(reader, mask, output)
             return output.getvalue()
         except Exception as e:
             self.logger.error(f"Gagal saat membersihkan halaman kosong: {e}")
             return pdf_bytes
 
-    def compress_pdf(self, pdf_bytes):
-        """Mengompres PDF menggunakan Ghostscript jika tersedia, jika tidak fallback ke PyPDF2."""
-        gs_path = shutil.which('gs') or shutil.which('gswin64c.exe')
-        if gs_path:
-            self.logger.info(f"Ghostscript ditemukan di '{gs_path}'. Memulai kompresi canggih.")
-            return self._compress_with_ghostscript(pdf_bytes, gs_path)
-        self.logger.warning("Ghostscript tidak ditemukan. Menggunakan metode kompresi fallback (kurang efektif).")
-        return self._compress_with_pypdf(pdf_bytes)
-
-    def _compress_with_ghostscript(self, pdf_bytes, gs_path):
-        """Kompresi menggunakan Ghostscript."""
-        temp_input = temp_output = None
+    @traced("blank_detection")
+    def remove_blank_pages_file(self, input_path, output_path):
+        """
+        Versi berbasis file dari remove_blank_pages. Input dipetakan ke memori
+        dan hasilnya ditulis langsung ke output_path, jadi dokumen tidak pernah
+        disalin utuh ke heap.
+
+        Returns:
+            str: Path hasil tahap ini; input_path jika tidak ada halaman kosong
+                atau pembersihan gagal.
+        """
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as f_in:
-                f_in.write(pdf_bytes)
-                temp_input = f_in.name
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as f_out:
-                temp_output = f_out.name
-            command = [
-                gs_path,
-                '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
-                '-dPDFSETTINGS=/ebook', '-dNOPAUSE', '-dQUIET',
-                '-dBATCH', f'-sOutputFile={temp_output}', temp_input
-            ]
-            subprocess.run(command, check=True, capture_output=True, text=True)
-            with open(temp_output, "rb") as f:
-                compressed_bytes = f.read()
-            self.logger.info("Kompresi dengan Ghostscript berhasil.")
-            return compressed_bytes
-        except subprocess.CalledProcessError as e:
-            self.logger.error("Gagal menjalankan Ghostscript.")
-            self.logger.error(f"Stderr: {e.stderr}")
-            return pdf_bytes
+            with open_reader_stream(input_path) as stream:
+                reader = PdfReader(stream)
+                page_total = len(reader.pages)
+                if self.effective_workers > 1 and page_total >= 2 * MIN_PAGES_PER_CHUNK:
+                    self.logger.info(f"Memeriksa {page_total} halaman dengan {self.effective_workers} proses...")
+                    mask = self.find_blank_pages_parallel(input_path, page_total)
+                else:
+                    mask = self.find_blank_pages(input_path, reader)
+                self.tracer.current().set(pages=page_total, blank_pages=sum(mask))
+                if not any(mask):
+                    self.logger.info("Tidak ada halaman kosong yang terdeteksi.")
+                    return input_path
+                self._write_non_blank_pages(reader, mask, output_path)
+            return output_path
         except Exception as e:
-            self.logger.error(f"Terjadi kesalahan saat kompresi dengan Ghostscript: {e}")
-            return pdf_bytes
-        finally:
-            for f in (temp_input, temp_output):
-                if f and os.path.exists(f):
-                    os.remove(f)
+            self.logger.error(f"Gagal saat membersihkan halaman kosong: {e}")
+            return input_path
 
-    def _compress_with_pypdf(self, pdf_bytes):
-        """Kompresi fallback menggunakan PyPDF2."""
-        try:
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            writer = PdfWriter()
-            for page in reader.pages:
-                page.compress_content_streams()
+    def _write_non_blank_pages(self, reader, mask, output):
+        """Menulis halaman yang tidak kosong ke output (stream atau path)."""
+        writer = PdfWriter()
+        removed_count = 0
+        for page, blank in zip(reader.pages, mask):
+            if not blank:
                 writer.add_page(page)
-            output = io.BytesIO()
-            writer.write(output)
-            self.logger.info("Kompresi fallback dengan PyPDF2 selesai.")
-            return output.getvalue()
-        except Exception as e:
-            self.logger.error(f"Gagal saat kompresi dengan PyPDF2: {e}")
-            return pdf_bytes
+            else:
+                removed_count += 1
+        msg = f"Berhasil menghapus {removed_count} halaman kosong." if removed_count else "Tidak ada halaman kosong yang terdeteksi."
+        self.logger.info(msg)
+        writer.write(output)
+
+    def compress_pdf_file(self, input_path, output_path, profile=None, image_dpi=None):
+        """
+        Mengompres file PDF melalui CompressionService bersama, sehingga batas
+        proses Ghostscript, profil, dan penyesuaian governor tetap berlaku.
+
+        Returns:
+            str: Path hasil tahap ini; input_path jika kompresi gagal atau tidak
+            memperkecil file.
+        """
+        # Diimpor di sini karena compression.py memakai helper dari modul ini.
+        from .compression import DEFAULT_PROFILE, shared_compression_service
+        path, _ = shared_compression_service(self.logger).compress_file(
+            input_path, output_path, profile=profile or DEFAULT_PROFILE, image_dpi=image_dpi
+        )
+        return path
 
     def save_pdf(self, pdf_bytes, path):
         """Menyimpan bytes PDF ke file."""
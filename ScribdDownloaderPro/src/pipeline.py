@@ -0,0 +1,439 @@
+import contextlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .compression import CompressionService
+from .downloader import Downloader
+from .metadata_fetcher import MetadataFetcher, embed_url_for
+from .pdf_processor import PDFProcessor, available_cpus, process_pool_context
+
+# Tells the workers of a stage that no more items will arrive.
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline, with its own workers and usage counters.
+
+    `func(item)` runs on one of `workers` threads. With `processes`, the
+    stage also owns a process pool of the same size and is called as
+    `func(item, pool)`, so it can hand CPU-bound work to
+    `pool.submit(...)` while the item itself stays in the parent.
+    """
+    def __init__(self, name, func, workers=1, processes=False):
+        if int(workers) < 1:
+            raise ValueError(f"Stage '{name}' needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = int(workers)
+        self.processes = processes
+        self.queue = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self.processed = 0
+            self.failed = 0
+            self.busy_seconds = 0.0
+            self.wait_seconds = 0.0
+            self.max_queue_depth = 0
+            self._depth_total = 0
+            self._depth_samples = 0
+
+    def _record_depth(self, depth):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def _record_item(self, waited, busy, failed):
+        with self._lock:
+            self.processed += 1
+            self.failed += int(failed)
+            self.wait_seconds += waited
+            self.busy_seconds += busy
+
+    def stats(self, elapsed):
+        """
+        Returns the counters of this stage.
+
+        `utilisation` is the share of worker time spent working; a stage near
+        1.0 with a deep queue is the bottleneck. `mean_wait_s` is how long
+        items sat in the stage's input queue.
+        """
+        with self._lock:
+            processed = self.processed
+            return {
+                "name": self.name,
+                "kind": "process" if self.processes else "thread",
+                "workers": self.workers,
+                "processed": processed,
+                "failed": self.failed,
+                "busy_s": round(self.busy_seconds, 2),
+                "utilisation": round(self.busy_seconds / (self.workers * elapsed), 3) if elapsed > 0 else 0.0,
+                "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+                "max_queue_depth": self.max_queue_depth,
+                "mean_queue_depth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+                "mean_wait_s": round(self.wait_seconds / processed, 2) if processed else 0.0,
+            }
+
+
+class StagedPipeline:
+    """
+    Runs items through a sequence of stages connected by bounded queues.
+
+    Each stage has its own workers, so different items are in different
+    stages at the same time: while one item is in a slow stage, the next one
+    already runs the stages before it. Bounded queues keep a fast stage from
+    running arbitrarily far ahead of a slow one.
+
+    Stage functions update the item in place. Returning False ends the
+    item's trip early (for example, when it was served from a cache);
+    raising marks it as failed and skips the remaining stages.
+    """
+    def __init__(self, logger, stages, queue_size=2, on_item_done=None):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            stages (list): The Stage objects, in order.
+            queue_size (int, optional): Capacity of the queue in front of every stage.
+            on_item_done (callable, optional): Called as `callback(item, error)`
+                when an item leaves the pipeline; `error` is None on success.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.logger = logger
+        self.stages = list(stages)
+        self.queue_size = max(1, int(queue_size))
+        self.on_item_done = on_item_done
+        self._lock = threading.Lock()
+        self._started = None
+        self._finished = None
+
+    def run(self, items):
+        """
+        Runs every item through the stages and blocks until all are done.
+
+        Returns:
+            list: `(item, error)` pairs in input order; `error` is the
+                exception that stopped the item, or None.
+        """
+        items = list(items)
+        errors = [None] * len(items)
+        for stage in self.stages:
+            stage._reset()
+            stage.queue = queue.Queue(maxsize=self.queue_size)
+        live_workers = [stage.workers for stage in self.stages]
+        self._started, self._finished = time.monotonic(), None
+
+        with contextlib.ExitStack() as stack:
+            pools = {}
+            for stage in self.stages:
+                if stage.processes:
+                    pools[stage.name] = stack.enter_context(
+                        ProcessPoolExecutor(max_workers=stage.workers, mp_context=process_pool_context())
+                    )
+
+            threads = []
+            for index, stage in enumerate(self.stages):
+                for n in range(stage.workers):
+                    thread = threading.Thread(
+                        target=self._work,
+                        args=(index, pools.get(stage.name), errors, live_workers),
+                        name=f"pipeline-{stage.name}-{n}",
+                        daemon=True
+                    )
+                    thread.start()
+                    threads.append(thread)
+
+            for position, item in enumerate(items):
+                self._put(0, (position, item, time.monotonic()))
+            for _ in range(self.stages[0].workers):
+                self.stages[0].queue.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        self._finished = time.monotonic()
+        return list(zip(items, errors))
+
+    def _put(self, index, entry):
+        stage = self.stages[index]
+        stage.queue.put(entry)
+        stage._record_depth(stage.queue.qsize())
+
+    def _work(self, index, pool, errors, live_workers):
+        """Worker loop of stage `index`; the last worker to stop closes the next stage's queue."""
+        stage = self.stages[index]
+        last_stage = index == len(self.stages) - 1
+        while True:
+            entry = stage.queue.get()
+            if entry is _DONE:
+                break
+            position, item, enqueued = entry
+            started = time.monotonic()
+            error = None
+            try:
+                forward = stage.func(item, pool) if stage.processes else stage.func(item)
+            except Exception as e:
+                self.logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                error = errors[position] = e
+                forward = False
+            stage._record_item(started - enqueued, time.monotonic() - started, error is not None)
+
+            if forward is not False and not last_stage:
+                self._put(index + 1, (position, item, time.monotonic()))
+            elif self.on_item_done:
+                try:
+                    self.on_item_done(item, error)
+                except Exception as e:
+                    self.logger.error(f"Pipeline completion callback failed: {e}")
+
+        with self._lock:
+            live_workers[index] -= 1
+            close_next = live_workers[index] == 0 and not last_stage
+        if close_next:
+            for _ in range(self.stages[index + 1].workers):
+                self.stages[index + 1].queue.put(_DONE)
+
+    def stats(self):
+        """
+        Returns per-stage queue depth and utilisation, during or after a run.
+
+        Returns:
+            dict: `elapsed_s` and one entry per stage (see Stage.stats).
+        """
+        if self._started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._finished or time.monotonic()) - self._started
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "queue_size": self.queue_size,
+            "stages": [stage.stats(elapsed) for stage in self.stages],
+        }
+
+
+def _clean_file(logger, workers, input_path, output_path):
+    """Blank page removal, run in a process of the clean stage."""
+    return PDFProcessor(logger, workers=workers).remove_blank_pages_file(input_path, output_path)
+
+
+def _compress_file(logger, gs_workers, input_path, output_path, profile, image_dpi):
+    """Compression, run in a process of the compress stage. Returns `(path, stats)`."""
+    return CompressionService(logger, workers=gs_workers).compress_file(
+        input_path, output_path, profile=profile, image_dpi=image_dpi
+    )
+
+
+class PipelineDocument:
+    """A document travelling through a DocumentPipeline."""
+    def __init__(self, entry, doc_id, downloader):
+        self.entry = entry
+        self.doc_id = doc_id
+        self.downloader = downloader
+        self.title = None
+        self.page_count = None
+        self.work_dir = None
+        self.current_path = None
+        self.output_path = None
+        self.error = None
+        self.started_at = None
+        self.duration_s = 0.0
+
+
+class DocumentPipeline:
+    """
+    Downloads documents with one worker pool per stage:
+
+        metadata (threads) -> render (browser pool slots) -> clean (processes)
+        -> compress (processes) -> save (one thread)
+
+    The next document renders while the previous one is cleaned and
+    compressed, so neither the browsers nor the CPUs wait on each other.
+    The clean and compress stages are left out when those options are off,
+    and for text output formats.
+    """
+    def __init__(self, logger, browser_pool, output_dir="downloads", session=None, cache=None, checkpoints=None,
+                 metadata_workers=4, clean_processes=1, compress_processes=1, queue_size=2,
+                 on_document_done=None, **download_options):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            browser_pool (BrowserPool): Browsers of the render stage; the stage
+                gets one thread per browser.
+            output_dir (str, optional): Directory the PDFs are saved to.
+            session (requests.Session, optional): Shared HTTP session for metadata.
+            cache (ResultCache, optional): Cache of finished downloads. Cached
+                documents leave the pipeline after the metadata stage.
+            checkpoints (CheckpointStore, optional): Resume documents from the
+                stage outputs of an earlier, failed run.
+            metadata_workers (int, optional): Threads fetching metadata.
+            clean_processes (int, optional): Processes removing blank pages.
+            compress_processes (int, optional): Processes compressing PDFs.
+            queue_size (int, optional): Documents waiting in front of each stage.
+            on_document_done (callable, optional): Called with every
+                PipelineDocument as soon as it is finished or failed.
+            **download_options: Downloader options (compress, clean,
+                load_strategy, clean_workers, chunk_size, tabs, compress_profile,
+                image_dpi, network, output_format).
+        """
+        self.logger = logger
+        self.browser_pool = browser_pool
+        self.output_dir = output_dir
+        self.session = session
+        self.cache = cache
+        self.checkpoints = checkpoints
+        self.on_document_done = on_document_done
+        self.download_options = download_options
+
+        stages = [
+            Stage("metadata", self._metadata, workers=metadata_workers),
+            Stage("render", self._render, workers=browser_pool.size),
+        ]
+        # Extracted text is saved as it is.
+        prints_pdf = download_options.get("output_format", "pdf") == "pdf"
+        if prints_pdf and download_options.get("clean"):
+            stages.append(Stage("clean", self._clean, workers=clean_processes, processes=True))
+        # Ghostscript processes each compress process may run for the segments of a document.
+        self.gs_workers = max(1, available_cpus() // max(1, compress_processes))
+        if prints_pdf and download_options.get("compress"):
+            stages.append(Stage("compress", self._compress, workers=compress_processes, processes=True))
+        stages.append(Stage("save", self._save, workers=1))
+        self.pipeline = StagedPipeline(logger, stages, queue_size=queue_size, on_item_done=self._finish)
+
+    def run(self, documents):
+        """
+        Downloads the documents.
+
+        Args:
+            documents (list): `(entry, doc_id)` pairs with valid document ids.
+
+        Returns:
+            list: One PipelineDocument per input, in input order.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        items = [
+            PipelineDocument(entry, doc_id, Downloader(
+                url_or_id=doc_id,
+                logger=self.logger,
+                output_dir=self.output_dir,
+                browser_pool=self.browser_pool,
+                cache=self.cache,
+                session=self.session,
+                checkpoints=self.checkpoints,
+                **self.download_options
+            ))
+            for entry, doc_id in documents
+        ]
+        return [item for item, _ in self.pipeline.run(items)]
+
+    def stats(self):
+        """Per-stage queue depth and utilisation (see StagedPipeline.stats)."""
+        return self.pipeline.stats()
+
+    @contextlib.contextmanager
+    def _timed(self, document, stage):
+        """
+        Records a stage as a span of the document's tracer. Memory is not
+        measured: the peak RSS is process-wide and the stages run concurrently.
+        """
+        span = None
+        try:
+            with document.downloader.tracer.span(stage) as span:
+                yield span
+        finally:
+            if span is not None:
+                document.downloader.stage_stats[stage] = {"seconds": round(span.duration, 2)}
+
+    def _metadata(self, document):
+        document.started_at = time.monotonic()
+        downloader = document.downloader
+        downloader._begin_run(document.doc_id)
+        if self.cache is not None:
+            entry = self.cache.get(downloader._cache_key(document.doc_id))
+            if entry:
+                self.logger.info(f"Cache hit for document {document.doc_id}")
+                document.output_path = downloader._deliver_cached(entry)
+                return False
+
+        with self._timed(document, "metadata"):
+            metadata = MetadataFetcher(
+                document.doc_id, self.logger, session=self.session, base_url=downloader.base_url
+            ).fetch()
+        document.title, document.page_count = downloader._apply_metadata(document.doc_id, metadata)
+        document.work_dir = downloader._create_work_dir(document.doc_id)
+
+    def _render(self, document):
+        downloader = document.downloader
+        document.current_path = downloader._resume_stage("render", None)
+        if document.current_path:
+            return
+        with self._timed(document, "render"):
+            handler = downloader._browser_handler(document.doc_id, document.page_count)
+            document.current_path = handler.get_pdf_from_url(
+                embed_url_for(document.doc_id, downloader.base_url),
+                output_path=os.path.join(document.work_dir, downloader.render_filename())
+            )
+        downloader._record_network_stats()
+        if not document.current_path:
+            raise RuntimeError(f"Failed to generate PDF of document {document.doc_id} from the browser")
+        downloader._record_stage("render", None, document.current_path)
+
+    def _clean(self, document, pool):
+        downloader = document.downloader
+        input_path = document.current_path
+        document.current_path = downloader._resume_stage("clean", input_path)
+        if document.current_path:
+            return
+        if downloader._has_expected_page_count(input_path):
+            self.logger.info(f"Document {document.doc_id} has exactly its pages, skipping blank page removal")
+            document.current_path = input_path
+            downloader.stage_stats["clean"] = {"skipped": True}
+            return
+        with self._timed(document, "clean"):
+            document.current_path = pool.submit(
+                _clean_file, self.logger, downloader.clean_workers,
+                input_path, os.path.join(document.work_dir, "cleaned.pdf")
+            ).result()
+        downloader._record_stage("clean", input_path, document.current_path)
+
+    def _compress(self, document, pool):
+        downloader = document.downloader
+        input_path = document.current_path
+        document.current_path = downloader._resume_stage("compress", input_path)
+        if document.current_path:
+            return
+        with self._timed(document, "compress"):
+            document.current_path, compression = pool.submit(
+                _compress_file, self.logger, self.gs_workers,
+                input_path, os.path.join(document.work_dir, "compressed.pdf"),
+                downloader.compress_profile, downloader.image_dpi
+            ).result()
+        downloader.stage_stats["compress"].update(compression)
+        downloader._record_stage("compress", input_path, document.current_path)
+
+    def _save(self, document):
+        downloader = document.downloader
+        with self._timed(document, "save"):
+            document.output_path = downloader._save(document.current_path, document.title)
+            if self.cache is not None:
+                self.cache.put(
+                    downloader._cache_key(document.doc_id),
+                    document.output_path,
+                    downloader._cache_metadata(document.doc_id, document.output_path)
+                )
+
+    def _finish(self, document, error):
+        if document.work_dir:
+            document.downloader._release_work_dir(
+                document.work_dir, succeeded=error is None and document.output_path is not None
+            )
+        document.error = error
+        document.downloader.tracer.write_trace()
+        if document.started_at is not None:
+            document.duration_s = round(time.monotonic() - document.started_at, 2)
+        if self.on_document_done:
+            self.on_document_done(document)
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+class _InFlight:
+    """A render in progress that other requests for the same key wait on, from threads or event loops."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+        self._lock = threading.Lock()
+        self._futures = []
+
+    async def wait_async(self):
+        """Waits for the render without holding a thread of the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.event.is_set():
+                return self.entry
+            self._futures.append((loop, future))
+        return await future
+
+    def finish(self, entry):
+        with self._lock:
+            self.entry = entry
+            self.event.set()
+            futures, self._futures = self._futures, []
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_resolve, future, entry)
+
+
+def _resolve(future, entry):
+    if not future.done():
+        future.set_result(entry)
+
+
+class ResultCache:
+    """
+    On-disk cache of finished downloads (PDF, text, JSON or Markdown) keyed
+    by document id and processing options.
+
+    Every entry is a `<key>` file, named without a format suffix so a cached
+    JSON result cannot clash with its sidecar, plus a `<key>.json` sidecar
+    with the document metadata (including the result's `extension`), its
+    creation time and its last use. Entries expire a
+    TTL after they were created, and the least recently used ones are evicted
+    once the cache grows past its size limit. The last use is kept in the
+    sidecar rather than in the file's mtime, because exported files are hard
+    links of the cached one. Concurrent requests for the same key inside one
+    process share a single render.
+    """
+    def __init__(self, cache_dir, logger, max_size_mb=2048, ttl_seconds=7 * 24 * 3600):
+        """
+        Initializes the cache.
+
+        Args:
+            cache_dir (str): Directory that holds the cached files.
+            logger (Logger): The logger instance for logging messages.
+            max_size_mb (int, optional): Total size of cached files before eviction.
+            ttl_seconds (int, optional): Age since creation after which an
+                entry is discarded.
+        """
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(doc_id, **options):
+        """
+        Builds the cache key of a document rendered with the given options.
+
+        Args:
+            doc_id (str): The Scribd document id.
+            **options: Every option that changes the produced file.
+
+        Returns:
+            str: A hex digest identifying the result.
+        """
+        payload = json.dumps({"doc_id": str(doc_id), **options}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base, base + ".json"
+
+    def get(self, key):
+        """
+        Looks up a cached result and marks it as recently used.
+
+        Returns:
+            dict: The entry metadata with its `path`, or None on a miss.
+        """
+        path, meta_path = self._paths(key)
+        entry = self._read_entry(meta_path)
+        if entry is None:
+            return None
+        if self._expired(entry, time.time()) or not os.path.exists(path):
+            self._remove(key)
+            return None
+        entry["last_used"] = time.time()
+        try:
+            self._write_entry(meta_path, entry)
+        except OSError:
+            pass
+        entry["path"] = path
+        return entry
+
+    def put(self, key, source_path, metadata):
+        """
+        Stores a finished download in the cache.
+
+        Args:
+            key (str): Key from `make_key`.
+            source_path (str): The file to cache; it is copied, not moved.
+            metadata (dict): JSON-serializable document metadata. Its
+                `extension` defaults to the one of `source_path`.
+
+        Returns:
+            dict: The stored entry, including its `path`.
+        """
+        path, meta_path = self._paths(key)
+        now = time.time()
+        entry = dict(metadata, created_at=now, last_used=now, size=os.path.getsize(source_path))
+        entry.setdefault("extension", os.path.splitext(source_path)[1])
+        self._link_or_copy(source_path, path)
+        self._write_entry(meta_path, entry)
+        self._evict()
+        entry["path"] = path
+        return entry
+
+    def get_or_create(self, key, producer):
+        """
+        Returns the cached entry for `key`, rendering it at most once.
+
+        If another thread is already producing the same key, this call waits
+        for it and returns its result instead of rendering again.
+
+        Args:
+            key (str): Key from `make_key`.
+            producer (callable): Returns `(path, metadata)` for a fresh
+                render, or None on failure.
+
+        Returns:
+            dict: The cache entry, or None if the render failed.
+        """
+        entry, flight, leader = self._join(key)
+        if entry:
+            return entry
+        if not leader:
+            self.logger.info("Same document is already being rendered, waiting for it...")
+            flight.event.wait()
+            return flight.entry
+
+        entry = None
+        try:
+            result = producer()
+            if result:
+                path, metadata = result
+                entry = self.put(key, path, metadata)
+        finally:
+            self._leave(key, flight, entry)
+        return entry
+
+    async def get_or_create_async(self, key, producer):
+        """
+        Variant of `get_or_create` for asyncio: `producer` is a coroutine
+        function, and a duplicate request waits on a future instead of a
+        thread. Requests on other threads or loops share the same render.
+        """
+        entry, flight, leader = await asyncio.to_thread(self._join, key)
+        if entry:
+            return entry
+        if not leader:
+            self.logger.info("Same document is already being rendered, waiting for it...")
+            return await flight.wait_async()
+
+        entry = None
+        try:
+            result = await producer()
+            if result:
+                path, metadata = result
+                entry = await asyncio.to_thread(self.put, key, path, metadata)
+        finally:
+            self._leave(key, flight, entry)
+        return entry
+
+    def _join(self, key):
+        """Returns `(entry, flight, leader)`: a cached entry, or the render to lead or wait on."""
+        with self._lock:
+            entry = self.get(key)
+            if entry:
+                return entry, None, False
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            return None, flight, leader
+
+    def _leave(self, key, flight, entry):
+        with self._lock:
+            self._inflight.pop(key, None)
+        flight.finish(entry)
+
+    def export(self, entry, output_path):
+        """Places a cached file at `output_path` (hard link when possible)."""
+        if os.path.exists(output_path) and os.path.samefile(entry["path"], output_path):
+            return output_path
+        self._link_or_copy(entry["path"], output_path)
+        return output_path
+
+    def _expired(self, entry, now):
+        return now - entry.get("created_at", 0) > self.ttl_seconds
+
+    @staticmethod
+    def _read_entry(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_entry(meta_path, entry):
+        tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_meta, meta_path)
+
+    def _link_or_copy(self, src, dst):
+        tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def _remove(self, key):
+        # "<key>.pdf" is where entries were stored before other formats.
+        for path in (*self._paths(key), os.path.join(self.cache_dir, key + ".pdf")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            entry = self._read_entry(os.path.join(self.cache_dir, name))
+            if entry is None:
+                continue
+            entries.append((entry.get("last_used", entry.get("created_at", 0)), entry.get("size", 0),
+                            name[:-5], self._expired(entry, now)))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, key, expired in sorted(entries):
+            if not expired and total <= self.max_size_bytes:
+                continue
+            self.logger.debug(f"Evicting cached result {key[:12]}")
+            self._remove(key)
+            total -= size
@@ -0,0 +1,241 @@
+import math
+import threading
+import time
+from .job_queue import Job, JobQueue
+from .metadata_fetcher import metadata_cache
+from .utils import get_document_id_from_url
+
+# Cost of a document whose page count is unknown.
+DEFAULT_JOB_PAGES = 50
+
+# Assumed render speed of one worker until the first jobs have finished.
+DEFAULT_PAGES_PER_SECOND = 1.0
+
+# Bounds of the Retry-After estimate, in seconds.
+MIN_RETRY_AFTER = 5
+MAX_RETRY_AFTER = 600
+
+
+def estimate_pages(url_or_id, cache=metadata_cache):
+    """
+    Cost of downloading a document: its page count from the metadata cache,
+    or DEFAULT_JOB_PAGES when it is not cached. Never fetches anything, so
+    it is safe to call in a request thread; the job refines its cost with
+    JobScheduler.refine_cost once the download has the metadata.
+    """
+    doc_id = get_document_id_from_url(url_or_id)
+    metadata = cache.get(doc_id) if doc_id else None
+    try:
+        return max(1, int(metadata["page_count"]))
+    except (KeyError, TypeError, ValueError):
+        return DEFAULT_JOB_PAGES
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when no more work is accepted; `retry_after` is in seconds."""
+    def __init__(self, retry_after):
+        super().__init__(f"The download queue is full, retry in {retry_after} s")
+        self.retry_after = retry_after
+
+
+class JobScheduler(JobQueue):
+    """
+    JobQueue that starts the cheapest waiting job first instead of the
+    oldest, and limits the work in flight by cost rather than by count.
+
+    The cost of a job is the number of pages it renders. Waiting jobs are
+    ordered by `cost - aging_pages_per_second * seconds_waited`, so a large
+    document overtaken by small ones moves up until it is next. A job
+    starts when a worker is free and its pages fit into
+    `max_pages_in_flight` next to the running ones; a job larger than the
+    whole budget runs alone. While the next job does not fit, nothing
+    overtakes it, so large documents cannot starve.
+
+    Past `max_queued` waiting jobs or `max_queued_pages` waiting pages,
+    submit raises QueueFull with an estimate of when to retry, instead of
+    accepting work the host cannot finish.
+
+    `set_workers`, `pause` and `resume` let a ConcurrencyGovernor adapt
+    the number of running jobs to memory and CPU pressure.
+    """
+    def __init__(self, logger, workers=2, max_pages_in_flight=1500, max_queued=50, max_queued_pages=20000,
+                 aging_pages_per_second=2.0, max_finished_jobs=500, max_workers=None):
+        """
+        Args:
+            logger (Logger): The logger instance for logging messages.
+            workers (int, optional): Number of jobs executed concurrently.
+            max_pages_in_flight (int, optional): Pages of all running jobs together.
+            max_queued (int, optional): Jobs that may wait for a worker.
+            max_queued_pages (int, optional): Pages of all waiting jobs together.
+            aging_pages_per_second (float, optional): How fast waiting lowers
+                the cost a job is ordered by.
+            max_finished_jobs (int, optional): Finished jobs kept for status
+                polling before the oldest ones are forgotten.
+            max_workers (int, optional): Upper bound for set_workers.
+                Defaults to `workers`.
+        """
+        self.max_workers = max(workers, max_workers or workers)
+        super().__init__(logger, workers=self.max_workers, max_finished_jobs=max_finished_jobs)
+        self.workers = workers
+        self.max_pages_in_flight = max_pages_in_flight
+        self.max_queued = max_queued
+        self.max_queued_pages = max_queued_pages
+        self.aging_pages_per_second = aging_pages_per_second
+        self._waiting = []
+        self._running = 0
+        self._running_costs = {}
+        self._pages_in_flight = 0
+        self._pages_per_second = None
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+        self._paused = False
+
+    def submit(self, func, cost=None, **params):
+        """
+        Enqueues `func(job, **params)` at the given cost and returns the job.
+
+        Args:
+            func (callable): Work to run. Its return value becomes the job result.
+            cost (int, optional): Pages the job renders, see estimate_pages.
+                Defaults to DEFAULT_JOB_PAGES. Capped at `max_queued_pages`,
+                so a large job is admitted once the queue has drained.
+            **params: Keyword arguments passed to `func` and kept on the job.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFull: The queue holds too many jobs or pages already.
+        """
+        cost = min(max(1, int(cost)) if cost else DEFAULT_JOB_PAGES, self.max_queued_pages)
+        job = Job(params)
+        job.update(estimated_pages=cost)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The job scheduler is shut down")
+            queued_pages = sum(entry[2] for entry in self._waiting)
+            if self._waiting and (len(self._waiting) >= self.max_queued
+                                  or queued_pages + cost > self.max_queued_pages):
+                retry_after = self._retry_after(queued_pages + cost)
+                self.logger.warning(
+                    f"Rejected a job of {cost} pages: {len(self._waiting)} jobs and "
+                    f"{queued_pages} pages waiting, retry in {retry_after} s"
+                )
+                raise QueueFull(retry_after)
+            self._jobs[job.id] = job
+            self._prune()
+            self._waiting.append((job, func, cost))
+            self._dispatch()
+        self.logger.info(f"Job {job.id} queued ({cost} pages)")
+        return job
+
+    def stats(self):
+        """Returns the JobQueue counts plus the pages waiting and in flight."""
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                queued_pages=sum(entry[2] for entry in self._waiting),
+                pages_in_flight=self._pages_in_flight,
+                max_pages_in_flight=self.max_pages_in_flight,
+                pages_per_second=round(self._pages_per_second, 2) if self._pages_per_second else None,
+                paused=self._paused,
+            )
+        return stats
+
+    def set_workers(self, workers):
+        """Changes the number of jobs running at once (1 to `max_workers`); running jobs are not stopped."""
+        with self._lock:
+            self.workers = max(1, min(self.max_workers, int(workers)))
+            self._dispatch()
+        return self.workers
+
+    def refine_cost(self, job, pages):
+        """
+        Replaces the estimated cost of a running job with its real page count,
+        e.g. once the download has fetched the metadata. A job that turned out
+        smaller frees page budget for the waiting ones.
+        """
+        try:
+            pages = max(1, int(pages))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            cost = self._running_costs.get(job.id)
+            if cost is None or cost == pages:
+                return
+            self._running_costs[job.id] = pages
+            self._pages_in_flight += pages - cost
+            job.update(estimated_pages=pages)
+            self._dispatch()
+
+    def pause(self):
+        """Stops starting waiting jobs; running jobs finish and new jobs are still queued."""
+        with self._lock:
+            self._paused = True
+
+    def resume(self):
+        """Starts waiting jobs again after `pause`."""
+        with self._lock:
+            self._paused = False
+            self._dispatch()
+
+    def shutdown(self, wait=False):
+        """Stops accepting jobs; waiting jobs are failed unless `wait` is set, which runs them first."""
+        with self._lock:
+            self._closed = True
+            if wait:
+                self._paused = False
+                self._dispatch()
+                while self._waiting or self._running:
+                    self._idle.wait()
+            for job, _, _ in self._waiting:
+                job.error = "The server shut down before the job started"
+                job.status = "failed"
+                job.finished_at = time.time()
+                job.update(stage="failed")
+            self._waiting.clear()
+        super().shutdown(wait=wait)
+
+    def _priority(self, entry, now):
+        job, _, cost = entry
+        return cost - self.aging_pages_per_second * (now - job.created_at)
+
+    def _dispatch(self):
+        """Starts waiting jobs while workers and page budget allow. Called with the lock held."""
+        now = time.time()
+        while self._waiting and self._running < self.workers and not self._paused:
+            entry = min(self._waiting, key=lambda entry: self._priority(entry, now))
+            cost = entry[2]
+            if self._running and self._pages_in_flight + cost > self.max_pages_in_flight:
+                break
+            self._waiting.remove(entry)
+            self._running += 1
+            self._running_costs[entry[0].id] = cost
+            self._pages_in_flight += cost
+            self._executor.submit(self._run_scheduled, *entry)
+
+    def _run_scheduled(self, job, func, cost):
+        try:
+            self._run(job, func)
+        finally:
+            with self._lock:
+                cost = self._running_costs.pop(job.id)
+                self._running -= 1
+                self._pages_in_flight -= cost
+                if job.status == "finished" and job.finished_at > job.started_at:
+                    self._record_speed(cost / (job.finished_at - job.started_at))
+                self._dispatch()
+                self._idle.notify_all()
+
+    def _record_speed(self, pages_per_second):
+        """Keeps a moving average of the pages per second one worker renders."""
+        if self._pages_per_second is None:
+            self._pages_per_second = pages_per_second
+        else:
+            self._pages_per_second = 0.8 * self._pages_per_second + 0.2 * pages_per_second
+
+    def _retry_after(self, queued_pages):
+        """Seconds until the running and `queued_pages` waiting pages are likely done."""
+        speed = (self._pages_per_second or DEFAULT_PAGES_PER_SECOND) * self.workers
+        seconds = math.ceil((queued_pages + self._pages_in_flight) / speed)
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, seconds))
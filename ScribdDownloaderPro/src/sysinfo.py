@@ -0,0 +1,251 @@
+import os
+
+PROC_ROOT = "/proc"
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# cgroup v1 reports "no limit" as a huge page-aligned number.
+_UNLIMITED = 1 << 60
+
+
+def _read_status_field(pid, field):
+    """
+    Reads a kB field (e.g. VmRSS) from /proc/<pid>/status.
+
+    Returns:
+        int: Value in bytes, or None when unavailable.
+    """
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "status")) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _children_map():
+    """Builds a {ppid: [pid, ...]} map from /proc."""
+    children = {}
+    try:
+        entries = os.listdir(PROC_ROOT)
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC_ROOT, entry, "stat")) as f:
+                stat = f.read()
+            # The command name may contain spaces, the fields after ')' do not.
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def is_supported():
+    """Returns True when process information can be read from /proc."""
+    return os.path.isdir(os.path.join(PROC_ROOT, "self"))
+
+
+def child_pids(pid=None):
+    """
+    Returns the direct children of a process.
+
+    Args:
+        pid (int, optional): Parent process. Defaults to the current process.
+
+    Returns:
+        set: The child PIDs (empty if /proc is unavailable).
+    """
+    pid = os.getpid() if pid is None else pid
+    return set(_children_map().get(pid, []))
+
+
+def process_tree_pids(pid):
+    """Returns the PID of a process and all of its descendants."""
+    children = _children_map()
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def process_tree_rss(pid):
+    """
+    Sums the resident memory of a process and all of its descendants.
+
+    Args:
+        pid (int): Root process of the tree.
+
+    Returns:
+        int: Total RSS in bytes, or None when /proc is unavailable.
+    """
+    if pid is None or not is_supported():
+        return None
+    total = 0
+    for member in process_tree_pids(pid):
+        rss = _read_status_field(member, "VmRSS")
+        if rss:
+            total += rss
+    return total
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident memory (VmHWM) of the current process.
+
+    Needs Linux 4.0+. The peak is process-wide, so concurrent work in other
+    threads is included in the next reading.
+
+    Returns:
+        bool: True when the counter was reset.
+    """
+    try:
+        with open(os.path.join(PROC_ROOT, "self", "clear_refs"), "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss(pid=None):
+    """
+    Returns the peak resident memory (VmHWM) of a process.
+
+    Args:
+        pid (int, optional): Process to inspect. Defaults to the current process.
+
+    Returns:
+        int: Peak RSS in bytes, or None when /proc is unavailable.
+    """
+    return _read_status_field(os.getpid() if pid is None else pid, "VmHWM")
+
+
+def children_peak_rss():
+    """
+    Returns the peak resident memory of the largest child process that has
+    been waited for (e.g. a finished Ghostscript run).
+
+    Returns:
+        int: Peak RSS in bytes, or None where `resource` is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+
+def _read_cgroup(*names):
+    """Contents of the first of `names` (relative to CGROUP_ROOT) that exists, or None."""
+    for name in names:
+        try:
+            with open(os.path.join(CGROUP_ROOT, name)) as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def _read_keyed(text):
+    """Parses "key value" lines (memory.stat, cpu.stat, /proc/meminfo) into a dict of ints."""
+    values = {}
+    for line in (text or "").splitlines():
+        parts = line.replace(":", " ").split()
+        if len(parts) >= 2:
+            try:
+                values[parts[0]] = int(parts[1])
+            except ValueError:
+                continue
+    return values
+
+
+def _meminfo():
+    try:
+        with open(os.path.join(PROC_ROOT, "meminfo")) as f:
+            return {key: value * 1024 for key, value in _read_keyed(f.read()).items()}
+    except OSError:
+        return {}
+
+
+def memory_usage():
+    """
+    Memory in use against the memory available to this container: the
+    cgroup's usage without reclaimable page cache (inactive files) against
+    its limit (cgroup v2, then v1), else the host's MemTotal - MemAvailable
+    against MemTotal.
+
+    Returns:
+        tuple: `(used_bytes, limit_bytes)`, or None when neither can be read.
+    """
+    meminfo = _meminfo()
+    host_total = meminfo.get("MemTotal")
+    try:
+        limit = int(_read_cgroup("memory.max", "memory/memory.limit_in_bytes"))
+        usage = int(_read_cgroup("memory.current", "memory/memory.usage_in_bytes"))
+    except (TypeError, ValueError):
+        limit = usage = None
+    if limit and limit < _UNLIMITED and usage is not None:
+        stat = _read_keyed(_read_cgroup("memory.stat", "memory/memory.stat"))
+        inactive = stat.get("total_inactive_file", stat.get("inactive_file", 0))
+        return max(0, usage - inactive), min(limit, host_total or limit)
+    if host_total and "MemAvailable" in meminfo:
+        return host_total - meminfo["MemAvailable"], host_total
+    return None
+
+
+def cpu_time():
+    """
+    CPU seconds used so far by this container's cgroup (v2, then v1), or
+    by the whole host from /proc/stat. Only differences between two
+    readings are meaningful.
+
+    Returns:
+        float: CPU seconds, or None when unavailable.
+    """
+    stat = _read_keyed(_read_cgroup("cpu.stat"))
+    if "usage_usec" in stat:
+        return stat["usage_usec"] / 1e6
+    usage = _read_cgroup("cpuacct/cpuacct.usage", "cpu,cpuacct/cpuacct.usage")
+    if usage and usage.isdigit():
+        return int(usage) / 1e9
+    try:
+        with open(os.path.join(PROC_ROOT, "stat")) as f:
+            fields = f.readline().split()
+        # user nice system idle iowait irq softirq steal: everything but idle and iowait.
+        busy = sum(int(value) for index, value in enumerate(fields[1:9]) if index not in (3, 4))
+        return busy / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cpu_limit():
+    """
+    CPUs this container may use: its cgroup CPU quota (v2, then v1), else
+    the CPUs in the process's affinity mask.
+
+    Returns:
+        float: Number of CPUs, possibly fractional.
+    """
+    quota = period = None
+    cpu_max = _read_cgroup("cpu.max")
+    if cpu_max:
+        parts = cpu_max.split()
+        if len(parts) == 2 and parts[0] != "max":
+            quota, period = parts
+    else:
+        quota = _read_cgroup("cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us")
+        period = _read_cgroup("cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us")
+    try:
+        if int(quota) > 0 and int(period) > 0:
+            return int(quota) / int(period)
+    except (TypeError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return float(len(os.sched_getaffinity(0)))
+    return float(os.cpu_count() or 1)
@@ -0,0 +1,163 @@
+import json
+import os
+from playwright.sync_api import sync_playwright
+from .browser_handler import BrowserHandler, BROWSER_LAUNCH_ARGS
+from .page_scripts import PAGE_TRACKER_JS, PAGE_WINDOW_CSS, PAGE_TEXT_JS, RELEASE_PAGES_JS
+
+# "pdf" prints the document; the others write the text of its text layers
+# (see TextExtractor) and never build a PDF.
+OUTPUT_FORMATS = ("pdf", "text", "json", "markdown")
+TEXT_FORMATS = OUTPUT_FORMATS[1:]
+
+FORMAT_EXTENSIONS = {"pdf": ".pdf", "text": ".txt", "json": ".json", "markdown": ".md"}
+
+# Pages loaded, read and released at a time.
+TEXT_WINDOW = 20
+
+
+class TextOutput:
+    """
+    Writes extracted pages to a file as they arrive, so no more than one
+    window of pages is ever held in memory.
+
+    - text: the text of every page, each followed by a form feed.
+    - markdown: a title heading and a "Page N" section per page.
+    - json: `{"title": ..., "pages": [...]}`, each page with its number,
+      size, text and text spans (`items`) with their boxes in CSS pixels.
+    """
+    def __init__(self, path, output_format, title=None):
+        if output_format not in TEXT_FORMATS:
+            raise ValueError(f"Unknown text format '{output_format}', expected one of {TEXT_FORMATS}")
+        self.path = path
+        self.output_format = output_format
+        self.title = title
+        self.pages = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        if self.output_format == "json":
+            self._file.write('{"title": ' + json.dumps(self.title, ensure_ascii=False) + ', "pages": [')
+        elif self.output_format == "markdown" and self.title:
+            self._file.write(f"# {self.title}\n\n")
+        return self
+
+    def write_page(self, page):
+        """Appends one page as returned by PAGE_TEXT_JS."""
+        number = page["index"] + 1
+        if self.output_format == "json":
+            record = {
+                "page": number,
+                "width": page["width"],
+                "height": page["height"],
+                "text": page["text"],
+                "items": page["items"],
+            }
+            self._file.write(("\n" if not self.pages else ",\n") + json.dumps(record, ensure_ascii=False))
+        elif self.output_format == "markdown":
+            self._file.write(f"## Page {number}\n\n" + (page["text"] + "\n\n" if page["text"] else ""))
+        else:
+            self._file.write(page["text"] + "\n\f")
+        self.pages += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.output_format == "json" and exc_type is None:
+                self._file.write("\n]}\n")
+        finally:
+            self._file.close()
+
+
+class TextExtractor(BrowserHandler):
+    """
+    Reads the text of the document straight from the viewer's text layers
+    instead of printing it.
+
+    Pages are loaded one window at a time, their text layers read in one
+    evaluate and written out, then the pages are released from the DOM.
+    Nothing is printed and no PDF is built, so the render costs only the
+    page loads. Scanned pages have no text layer and come out empty.
+    """
+    def __init__(self, logger, output_format="text", title=None, page_count=None, browser_pool=None,
+                 progress_callback=None, tracer=None, request_filter=None, window=TEXT_WINDOW):
+        """
+        Args:
+            output_format (str, optional): "text", "json" or "markdown".
+            title (str, optional): Document title written in the JSON and
+                Markdown output.
+            window (int, optional): Pages loaded and read at a time.
+        """
+        if output_format not in TEXT_FORMATS:
+            raise ValueError(f"Unknown text format '{output_format}', expected one of {TEXT_FORMATS}")
+        super().__init__(logger, page_count=page_count, browser_pool=browser_pool,
+                         progress_callback=progress_callback, tracer=tracer, request_filter=request_filter)
+        self.output_format = output_format
+        self.title = title
+        self.window = max(1, int(window))
+
+    def get_pdf_from_url(self, url, output_path=None):
+        """
+        Writes the text of the document at `url` into `output_path`. Keeps the
+        BrowserHandler name so the downloader can use either.
+
+        Returns:
+            str: `output_path`, or None on failure.
+        """
+        if not output_path:
+            raise ValueError("The text extractor writes to a file, pass output_path")
+
+        if self.browser_pool is not None:
+            try:
+                return self.browser_pool.run(self._extract_with_browser, url, output_path)
+            except Exception as e:
+                self.logger.error(f"Error in browser process: {e}")
+                return None
+
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+            try:
+                return self._extract_with_browser(browser, url, output_path)
+            finally:
+                browser.close()
+
+    def _extract_with_browser(self, browser, url, output_path):
+        """Loads, reads and releases one window of pages at a time, streaming the text to a file."""
+        part_path = output_path + ".part"
+        context = self._new_context(browser)
+        page = self.tracer.instrument_page(context.new_page())
+        try:
+            if not self._open_document(page, url):
+                return None
+            page.evaluate(PAGE_TRACKER_JS)
+            page.add_style_tag(content=PAGE_WINDOW_CSS)
+            total = self._document_page_total(page)
+            if not total:
+                self.logger.error("No page slots found in the viewer")
+                return None
+
+            with TextOutput(part_path, self.output_format, title=self.title) as output:
+                start = 0
+                while start < total:
+                    stop = min(start + self.window, total)
+                    self._load_page_window(page, start, stop)
+                    with self.tracer.span("extract") as span:
+                        pages = page.evaluate(PAGE_TEXT_JS, [start, stop])
+                        for info in pages:
+                            output.write_page(info)
+                        span.set(pages=len(pages))
+                    page.evaluate(RELEASE_PAGES_JS, stop)
+                    self._report_progress("extracting", pages_extracted=stop)
+                    start = stop
+                    # Documents without a known page count may reveal more slots as we go.
+                    total = max(total, self._document_page_total(page))
+
+            os.replace(part_path, output_path)
+            self.logger.info(f"Text of {output.pages} pages written as {self.output_format}")
+            return output_path
+        except Exception as e:
+            self.logger.error(f"Error in browser process: {e}")
+            return None
+        finally:
+            context.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
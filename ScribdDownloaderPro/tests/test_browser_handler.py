@@ -0,0 +1,90 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from src.browser_handler import BrowserHandler
+from src.logger import setup_logger
+from src.page_scripts import (
+    LOAD_STEP_JS, PAGE_TRACKER_JS, PENDING_PAGES_JS, REVISIT_PAGES_JS, TRACKER_SNAPSHOT_JS
+)
+
+
+class StalledPage:
+    """Page stub whose viewer reaches the bottom and then never renders another page."""
+    def __init__(self, rendered=3, total=10):
+        self.rendered = rendered
+        self.total = total
+        self.at_bottom = False
+        self.steps = 0
+
+    def evaluate(self, script, arg=None):
+        if script == PAGE_TRACKER_JS:
+            return None
+        if script == LOAD_STEP_JS:
+            self.steps += 1
+            self.at_bottom = True
+            return None
+        if script == TRACKER_SNAPSHOT_JS:
+            return {"rendered": self.rendered, "total": self.total, "pending": 0,
+                    "idle_ms": 5000, "at_bottom": self.at_bottom}
+        raise AssertionError("Unexpected script")
+
+    def wait_for_function(self, *args, **kwargs):
+        raise PlaywrightTimeoutError("no progress")
+
+
+class SlowPage:
+    """Page stub whose pages complete only after a number of revisits each."""
+    def __init__(self, visits_needed):
+        self.visits_needed = dict(visits_needed)
+        self.total = 10
+        self.revisits = []
+
+    def pending(self):
+        return [i for i, visits in sorted(self.visits_needed.items()) if visits > 0]
+
+    def evaluate(self, script, arg=None):
+        if script == PAGE_TRACKER_JS:
+            return None
+        if script == PENDING_PAGES_JS:
+            return {"total": self.total, "pending": self.pending()}
+        if script == REVISIT_PAGES_JS:
+            indices, _, _ = arg
+            self.revisits.append(list(indices))
+            for i in indices:
+                self.visits_needed[i] = max(0, self.visits_needed[i] - 1)
+            return [i for i in indices if self.visits_needed[i]]
+        raise AssertionError("Unexpected script")
+
+
+class EventDrivenLoadTest(unittest.TestCase):
+    def test_stops_after_stalled_steps(self):
+        handler = BrowserHandler(setup_logger(level="ERROR"))
+        page = StalledPage()
+        with handler.tracer.span("load") as span:
+            handler._event_driven_load(page, max_stalled_steps=2)
+        # One step to reach the bottom, then two without a new page.
+        self.assertEqual(page.steps, 3)
+        self.assertEqual(span.attrs["pages"], 3)
+
+
+class EnsureAllPagesRenderedTest(unittest.TestCase):
+    def test_retries_slow_pages_within_the_budget(self):
+        handler = BrowserHandler(setup_logger(level="ERROR"))
+        page = SlowPage({2: 1, 5: 3, 7: 1})
+        incomplete = handler._ensure_all_pages_rendered(page, batch_size=2)
+        self.assertEqual(incomplete, [])
+        self.assertEqual(page.revisits, [[2, 5], [7, 5], [5]])
+
+    def test_reports_pages_left_when_the_budget_is_spent(self):
+        handler = BrowserHandler(setup_logger(level="ERROR"))
+        page = SlowPage({4: 1})
+        self.assertEqual(handler._ensure_all_pages_rendered(page, budget_ms=0), [4])
+        self.assertEqual(page.revisits, [])
+
+
+if __name__ == "__main__":
+    unittest.main()